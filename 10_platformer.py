@@ -1,52 +1,31 @@
+import numpy as np
 import pyxel
+from tile_grid import TileKind, SpawnIndex, TileEditor
+from entity_store import EntityStore, EntityKind, NO_SLOT
+from spatial_hash import SpatialHash
+from level_cache import load_level_data
+from raycast import raycast_batch
+from nav_graph import NavGraph, JumpProfile, EdgeKind, NO_NODE
 
 # 定数定義
 TRANSPARENT_COLOR = 2  # 透明色として扱う色番号 (Pyxelのパレットにおける色番号)
 SCROLL_BORDER_X = 80   # プレイヤーが画面端に到達した際にスクロールを開始するX座標の境界
-TILE_FLOOR = (1, 0)    # 床タイルを表すタプル (タイルマップの(1,0)の位置にあるタイル)
-TILE_SPAWN1 = (0, 1)   # 敵1の出現位置を示すタイル
-TILE_SPAWN2 = (1, 1)   # 敵2の出現位置を示すタイル
-TILE_SPAWN3 = (2, 1)   # 敵3の出現位置を示すタイル
-WALL_TILE_X = 4        # 壁タイルとして扱うタイルマップのX座標の最小値 (これ以上のX座標を持つタイルは壁とみなす)
+ENTITY_CAPACITY = 256  # 敵と弾を合わせて同時に存在できる数 (プールの容量。満杯のときの弾は撃たれない)
+JUMP_SPEED = 6         # ジャンプの初速 (上向き。重力で速度を更新した後に設定するので、そのまま最初のフレームの上昇量になる)
+GRAVITY = 1            # 1フレームごとの落下速度の増加量
+MAX_FALL_SPEED = 3     # 落下速度の最大値
+# 敵1が経路に沿って跳ぶときの軌道 (プレイヤーと同じジャンプの初速・重力で、横は敵の移動速度の1ピクセル/フレーム)
+WALKER_JUMP = JumpProfile(JUMP_SPEED, GRAVITY, MAX_FALL_SPEED, 1)
 
 # グローバル変数
 scroll_x = 0  # スクロール量 (カメラのX座標)
 player = None # プレイヤーオブジェクト
-enemies = []  # 敵オブジェクトのリスト
-
-
-# 指定されたタイル座標のタイルデータを取得する関数
-def get_tile(tile_x, tile_y):
-    # pyxel.tilemap(0).pget(tile_x, tile_y) は、タイルマップ0番の(tile_x, tile_y)にあるピクセルデータを取得する
-    # タイルマップの各タイルは8x8ピクセルで構成されており、その左上隅のピクセルデータを取得することで、
-    # そのタイルがどの画像バンクのどの位置にあるかを示す情報（(u, v)座標）が得られる
-    return pyxel.tilemap(0).pget(tile_x, tile_y)
-
-
-# 衝突を検出する関数
-def detect_collision(x, y, dy):
-    # エンティティが占めるタイルの座標範囲を計算
-    # Pyxelのデフォルトのタイルサイズは8x8ピクセル
-    x1 = x // 8  # エンティティの左端が位置するタイルのX座標
-    y1 = y // 8  # エンティティの上端が位置するタイルのY座標
-    x2 = (x + 8 - 1) // 8 # エンティティの右端が位置するタイルのX座標
-    y2 = (y + 8 - 1) // 8 # エンティティの下端が位置するタイルのY座標
-
-    # エンティティが占める可能性のある領域内のソリッドなタイルとの衝突をチェック
-    for yi in range(y1, y2 + 1):
-        for xi in range(x1, x2 + 1):
-            # get_tileで取得したタイルの情報(u, v)のu座標がWALL_TILE_X以上であれば壁とみなす
-            if get_tile(xi, yi)[0] >= WALL_TILE_X:
-                return True # 衝突が見つかったらTrueを返す
-
-    # 下方向への移動中に床タイルとの衝突をチェック (着地判定)
-    # dy > 0 は下方向への移動中、y % 8 == 1 はタイルの境界にいることを示す (Pyxelの座標系による)
-    if dy > 0 and y % 8 == 1:
-        for xi in range(x1, x2 + 1):
-            # エンティティの足元にあるタイルが床タイル(TILE_FLOOR)であれば衝突とみなす
-            if get_tile(xi, y1 + 1) == TILE_FLOOR:
-                return True
-    return False # 衝突がなければFalseを返す
+entities = EntityStore(ENTITY_CAPACITY, fixed=True)  # 敵と弾 (種類ごとの属性を配列でまとめて保持する固定容量のプール)
+entity_hash = SpatialHash()  # 敵と弾の位置をタイル単位のセルに分けた空間ハッシュ (毎フレーム作り直す)
+tile_grid = None  # 衝突判定用タイルインデックス (リソースロード後に構築)
+spawn_index = None  # 敵の出現位置インデックス (リソースロード後に構築)
+tile_editor = None  # 実行中のタイル書き換え (壊せるブロックなど。tile_gridとspawn_indexの該当箇所だけ更新する)
+nav_graph = None  # 敵1がプレイヤーを追いかける経路探索用のナビゲーショングラフ (リソースロード後に構築)
 
 
 # 衝突したエンティティを押し戻す関数
@@ -57,33 +36,14 @@ def push_back(x, y, dx, dy):
     abs_dy = abs(dy) # Y方向の移動量の絶対値
 
     # 移動量の大きい軸から衝突判定を行うことで、より正確な押し戻しを実現
+    # 1ピクセルずつ衝突を調べる代わりに、通過するタイル列・行だけを調べて
+    # 衝突直前の位置を一度に求める (当たり判定は x 〜 x + 7 の8ピクセル幅)
     if abs_dx > abs_dy:
-        # X方向の押し戻し
-        sign = 1 if dx > 0 else -1 # 移動方向 (正:1, 負:-1)
-        for _ in range(abs_dx): # X方向の移動量分ループ
-            # 1ピクセルずつ移動を試み、衝突したらループを抜ける
-            if detect_collision(x + sign, y, dy):
-                break
-            x += sign # 衝突しなければ移動
-        # Y方向の押し戻し
-        sign = 1 if dy > 0 else -1
-        for _ in range(abs_dy):
-            if detect_collision(x, y + sign, dy):
-                break
-            y += sign
+        x = tile_grid.sweep_x(x, y, dx, dy, 0, 7) # X方向の押し戻し
+        y = tile_grid.sweep_y(x, y, dy, 0, 7) # Y方向の押し戻し
     else:
-        # Y方向の押し戻し
-        sign = 1 if dy > 0 else -1
-        for _ in range(abs_dy):
-            if detect_collision(x, y + sign, dy):
-                break
-            y += sign
-        # X方向の押し戻し
-        sign = 1 if dx > 0 else -1
-        for _ in range(abs_dx):
-            if detect_collision(x + sign, y, dy):
-                break
-            x += sign
+        y = tile_grid.sweep_y(x, y, dy, 0, 7) # Y方向の押し戻し
+        x = tile_grid.sweep_x(x, y, dx, dy, 0, 7) # X方向の押し戻し
     return x, y, dx, dy # 押し戻し後の座標と移動量を返す
 
 
@@ -93,16 +53,15 @@ def is_wall(x, y):
     tile_x = x // 8
     tile_y = y // 8
 
-    # 前景レイヤーのタイルをチェック
-    tile = get_tile(tile_x, tile_y)
-    if tile == TILE_FLOOR or tile[0] >= WALL_TILE_X:
+    # 前景レイヤーのタイルをチェック (床タイルまたは壁タイル)
+    kind = tile_grid.kind(tile_x, tile_y)
+    if kind == TileKind.THROUGH_FLOOR or kind == TileKind.WALL:
         return True
 
     # 背景レイヤーのタイルをチェック
     # pyxel.bltmのv=128に対応するため、タイルY座標に16を加算
-    # 背景の床も前景と同じTILE_FLOORと仮定
-    bg_tile = get_tile(tile_x, tile_y + 16)
-    if bg_tile == TILE_FLOOR:
+    # 背景の床も前景と同じすり抜け床 (TileKind.THROUGH_FLOOR) と仮定
+    if tile_grid.kind(tile_x, tile_y + 16) == TileKind.THROUGH_FLOOR:
         return True
 
     return False
@@ -111,31 +70,24 @@ def is_wall(x, y):
 # 敵を生成する関数
 # left_x, right_x: 敵を生成するX座標の範囲 (ピクセル単位)
 def spawn_enemy(left_x, right_x):
-    # ピクセル座標をタイル座標に変換
-    left_x = pyxel.ceil(left_x / 8) # 左端のタイルX座標 (切り上げ)
-    right_x = pyxel.floor(right_x / 8) # 右端のタイルX座標 (切り捨て)
-
-    # 指定された範囲のタイルを走査し、敵の出現タイルがあれば敵を生成
-    for x in range(left_x, right_x + 1):
-        for y in range(16): # Y座標は0から15まで (タイルマップの高さ)
-            tile = get_tile(x, y) # タイル情報を取得
-            if tile == TILE_SPAWN1: # TILE_SPAWN1であればEnemy1を生成
-                enemies.append(Enemy1(x * 8, y * 8))
-            elif tile == TILE_SPAWN2: # TILE_SPAWN2であればEnemy2を生成
-                enemies.append(Enemy2(x * 8, y * 8))
-            elif tile == TILE_SPAWN3: # TILE_SPAWN3であればEnemy3を生成
-                enemies.append(Enemy3(x * 8, y * 8))
-
-
-# リストからis_aliveがFalseの要素を削除する関数
-def cleanup_list(list):
-    i = 0
-    while i < len(list):
-        elem = list[i]
-        if elem.is_alive: # 生存していれば次の要素へ
-            i += 1
-        else: # 生存していなければリストから削除
-            list.pop(i)
+    # 出現位置インデックスから、X座標が範囲内でまだ出現していない出現位置を取り出す
+    # (ロード時にX座標順に並べてあるので、タイル列を走査せずに二分探索で求まる)
+    for point in spawn_index.take(left_x, right_x):
+        kind, x, y = point
+        if kind == TileKind.SPAWN1: # 敵1の出現タイルであればEnemy1を生成 (初期方向は左)
+            index = entities.acquire(EntityKind.ENEMY1, x, y, direction=-1)
+        elif kind == TileKind.SPAWN2: # 敵2の出現タイルであればEnemy2を生成 (初期方向は右)
+            index = entities.acquire(EntityKind.ENEMY2, x, y, direction=1)
+        else: # 敵3の出現タイルであればEnemy3を生成
+            index = entities.acquire(EntityKind.ENEMY3, x, y)
+        if index == NO_SLOT: # プールが満杯で生成できなければ、出現位置を未出現のまま残す
+            spawn_index.restore(point)
+
+
+# ストアから生存フラグがFalseの要素を削除する関数
+# 1つずつpopする代わりに、末尾の生存要素と入れ替えて詰める (O(要素数))
+def cleanup_list(store):
+    store.compact()
 
 
 class Player:
@@ -162,11 +114,11 @@ class Player:
             self.direction = 1
 
         # 重力による落下速度の更新 (最大速度3)
-        self.dy = min(self.dy + 1, 3)
+        self.dy = min(self.dy + GRAVITY, MAX_FALL_SPEED)
 
         # ジャンプの入力処理
         if pyxel.btnp(pyxel.KEY_SPACE):
-            self.dy = -6 # 上向きに速度を設定
+            self.dy = -JUMP_SPEED # 上向きに速度を設定
             pyxel.play(3, 8) # ジャンプ音を再生
 
         # 衝突判定と押し戻し処理
@@ -209,129 +161,190 @@ class Player:
         pyxel.blt(self.x, self.y, 0, u, 16, w, 8, TRANSPARENT_COLOR)
 
 
-class Enemy1:
-    # 敵1の初期化
-    def __init__(self, x, y):
-        self.x = x
-        self.y = y
-        self.dx = 0
-        self.dy = 0
-        self.direction = -1 # 初期方向は左
-        self.is_alive = True # 生存フラグ
-
-    # 敵1の状態を更新するメソッド
-    def update(self):
-        self.dx = self.direction # 移動方向を設定
-        self.dy = min(self.dy + 1, 3) # 重力による落下速度の更新
-
-        # 壁の検出と方向転換
-        # 左に進んでいて、左に壁がある場合、または右に進んでいて右に壁がある場合
-        if self.direction < 0 and is_wall(self.x - 1, self.y + 4): # 左に壁があるか
-            self.direction = 1 # 右に方向転換
-        elif self.direction > 0 and is_wall(self.x + 8, self.y + 4): # 右に壁があるか
-            self.direction = -1 # 左に方向転換
+# 敵1・敵2に共通の、配列演算でまとめて行う更新
+# 移動方向を速度に設定し、重力による落下速度を更新する (最大速度3)
+def apply_walker_gravity():
+    n = entities.count
+    walker = ((entities.kind[:n] == EntityKind.ENEMY1) | (entities.kind[:n] == EntityKind.ENEMY2)) & entities.alive[:n]
+    entities.dx[:n][walker] = entities.direction[:n][walker]
+    entities.dy[:n][walker] = np.minimum(entities.dy[:n][walker] + GRAVITY, MAX_FALL_SPEED)
+
+
+# 添字iの敵を衝突判定と押し戻しで移動させる関数 (敵1・敵2共通)
+def move_walker(i):
+    x, y, dx, dy = push_back(int(entities.x[i]), int(entities.y[i]), int(entities.dx[i]), int(entities.dy[i]))
+    entities.x[i] = x
+    entities.y[i] = y
+
+
+# 添字iの敵を、ナビゲーショングラフの経路に沿ってゴールのノードへ向かわせる関数
+# 足場の上にいないとき、経路が無いとき、すでにゴールにいるときは何もせずFalseを返す
+# (経路はキャッシュされるので、経路に沿って進む間は辞書を引くだけ)
+def follow_path(i, x, y, goal):
+    # 足場の上に立っている敵はY座標がタイルの境界に揃っている (すり抜け床を降りている途中は立っていない)
+    if goal == NO_NODE or entities.dy[i] <= 0 or y % 8 != 0 or not (is_wall(x, y + 8) or is_wall(x + 7, y + 8)):
+        return False
+    start = nav_graph.locate(x, y) # 敵がいるノード
+    step = nav_graph.next_step(start, goal) if start != NO_NODE else None # 次に通る辺
+    if step is None:
+        return False
+    if step.kind == EdgeKind.JUMP or step.kind == EdgeKind.DROP:
+        # 踏み切り・すり抜けは、ノードのタイルにぴったり重なってから行う (グラフの軌道はタイルの中央から跳ぶ)
+        if x % 8 != 0:
+            entities.direction[i] = 1 if x < nav_graph.node_x[start] * 8 else -1
+            return True
+        if step.kind == EdgeKind.JUMP:
+            entities.dy[i] = -JUMP_SPEED # プレイヤーと同じ初速で跳ぶ
+        else:
+            entities.y[i] = y + 1 # すり抜け床の中に1ピクセル入ると、下に落ちる
+    target_x = nav_graph.node_x[step.target] * 8 # 次のノードのX座標
+    if target_x != x:
+        entities.direction[i] = 1 if target_x > x else -1
+    return True
 
-        # 衝突判定と押し戻し処理
-        self.x, self.y, self.dx, self.dy = push_back(self.x, self.y, self.dx, self.dy)
 
-    # 敵1を描画するメソッド
-    def draw(self):
+class Enemy1:
+    # 生存している全ての敵1の状態を更新するメソッド
+    # (速度と重力はapply_walker_gravityで更新済み)
+    @staticmethod
+    def update_all():
+        goal = nav_graph.locate(player.x, player.y) # プレイヤーがいる (空中なら着地する) ノード
+        for i in entities.indices(EntityKind.ENEMY1):
+            x = int(entities.x[i])
+            y = int(entities.y[i])
+            # プレイヤーへの経路があれば経路に沿って進む
+            if follow_path(i, x, y, goal):
+                move_walker(i)
+                continue
+            # 経路が無いときは壁の検出と方向転換
+            # 左に進んでいて、左に壁がある場合、または右に進んでいて右に壁がある場合
+            if entities.direction[i] < 0 and is_wall(x - 1, y + 4): # 左に壁があるか
+                entities.direction[i] = 1 # 右に方向転換
+            elif entities.direction[i] > 0 and is_wall(x + 8, y + 4): # 右に壁があるか
+                entities.direction[i] = -1 # 左に方向転換
+
+            # 衝突判定と押し戻し処理
+            move_walker(i)
+
+    # 全ての敵1を描画するメソッド
+    @staticmethod
+    def draw_all():
         # アニメーションフレームを計算
         u = pyxel.frame_count // 4 % 2 * 8
-        # 向きに応じて画像を反転
-        w = 8 if self.direction > 0 else -8
-        # 敵1の描画 (画像バンク0、uはアニメーションフレーム、vは24)
-        pyxel.blt(self.x, self.y, 0, u, 24, w, 8, TRANSPARENT_COLOR)
+        for i in entities.indices(EntityKind.ENEMY1):
+            # 向きに応じて画像を反転
+            w = 8 if entities.direction[i] > 0 else -8
+            # 敵1の描画 (画像バンク0、uはアニメーションフレーム、vは24)
+            pyxel.blt(entities.x[i], entities.y[i], 0, u, 24, w, 8, TRANSPARENT_COLOR)
 
 
 class Enemy2:
-    # 敵2の初期化
-    def __init__(self, x, y):
-        self.x = x
-        self.y = y
-        self.dx = 0
-        self.dy = 0
-        self.direction = 1 # 初期方向は右
-        self.is_alive = True
-
-    # 敵2の状態を更新するメソッド
-    def update(self):
-        self.dx = self.direction
-        self.dy = min(self.dy + 1, 3)
-
-        # 足元に壁があるか、または足元が途切れている場合の方向転換
-        if is_wall(self.x, self.y + 8) or is_wall(self.x + 7, self.y + 8):
-            # 左に進んでいて、左に壁があるか、または左の足元が途切れている場合
-            if self.direction < 0 and (
-                is_wall(self.x - 1, self.y + 4) or not is_wall(self.x - 1, self.y + 8)
-            ):
-                self.direction = 1 # 右に方向転換
-            # 右に進んでいて、右に壁があるか、または右の足元が途切れている場合
-            elif self.direction > 0 and (
-                is_wall(self.x + 8, self.y + 4) or not is_wall(self.x + 7, self.y + 8)
-            ):
-                self.direction = -1 # 左に方向転換
-        self.x, self.y, self.dx, self.dy = push_back(self.x, self.y, self.dx, self.dy)
-
-    # 敵2を描画するメソッド
-    def draw(self):
+    # 生存している全ての敵2の状態を更新するメソッド
+    # (速度と重力はapply_walker_gravityで更新済み)
+    @staticmethod
+    def update_all():
+        for i in entities.indices(EntityKind.ENEMY2):
+            x = int(entities.x[i])
+            y = int(entities.y[i])
+            # 足元に壁があるか、または足元が途切れている場合の方向転換
+            if is_wall(x, y + 8) or is_wall(x + 7, y + 8):
+                # 左に進んでいて、左に壁があるか、または左の足元が途切れている場合
+                if entities.direction[i] < 0 and (
+                    is_wall(x - 1, y + 4) or not is_wall(x - 1, y + 8)
+                ):
+                    entities.direction[i] = 1 # 右に方向転換
+                # 右に進んでいて、右に壁があるか、または右の足元が途切れている場合
+                elif entities.direction[i] > 0 and (
+                    is_wall(x + 8, y + 4) or not is_wall(x + 7, y + 8)
+                ):
+                    entities.direction[i] = -1 # 左に方向転換
+            move_walker(i)
+
+    # 全ての敵2を描画するメソッド
+    @staticmethod
+    def draw_all():
         # アニメーションフレームを計算 (Enemy1とは異なる画像を使用)
         u = pyxel.frame_count // 4 % 2 * 8 + 16
-        # 向きに応じて画像を反転
-        w = 8 if self.direction > 0 else -8
-        # 敵2の描画 (画像バンク0、uはアニメーションフレーム、vは24)
-        pyxel.blt(self.x, self.y, 0, u, 24, w, 8, TRANSPARENT_COLOR)
+        for i in entities.indices(EntityKind.ENEMY2):
+            # 向きに応じて画像を反転
+            w = 8 if entities.direction[i] > 0 else -8
+            # 敵2の描画 (画像バンク0、uはアニメーションフレーム、vは24)
+            pyxel.blt(entities.x[i], entities.y[i], 0, u, 24, w, 8, TRANSPARENT_COLOR)
 
 
 class Enemy3:
-    # 敵3の初期化
-    def __init__(self, x, y):
-        self.x = x
-        self.y = y
-        self.time_to_fire = 0 # 弾を発射するまでの時間
-        self.is_alive = True
-
-    # 敵3の状態を更新するメソッド
-    def update(self):
-        self.time_to_fire -= 1 # 発射までの時間を減らす
-        if self.time_to_fire <= 0: # 発射時間になったら
-            dx = player.x - self.x # プレイヤーとのX方向の距離
-            dy = player.y - self.y # プレイヤーとのY方向の距離
-            sq_dist = dx * dx + dy * dy # プレイヤーとの距離の2乗
-            if sq_dist < 60 ** 2: # プレイヤーが一定範囲内 (60ピクセル以内) にいれば
-                dist = pyxel.sqrt(sq_dist) # 距離を計算
-                # プレイヤーに向かって弾を発射
-                enemies.append(Enemy3Bullet(self.x, self.y, dx / dist, dy / dist))
-                self.time_to_fire = 60 # 次の発射までの時間をリセット (60フレーム = 1秒)
-
-    # 敵3を描画するメソッド
-    def draw(self):
+    # 生存している全ての敵3の状態を更新するメソッド
+    @staticmethod
+    def update_all():
+        shooters = entities.indices(EntityKind.ENEMY3)
+        entities.timer[shooters] -= 1 # 発射までの時間を減らす
+        # プレイヤーから一定範囲内 (60ピクセル以内) にいる要素を空間ハッシュで取り出す
+        near = entity_hash.query_radius(player.x, player.y, 60)
+        near = near[entities.kind[near] == EntityKind.ENEMY3]
+        fire = near[entities.timer[near] <= 0] # 範囲内で発射時間になった敵3
+        # 敵3とプレイヤーの中心を結ぶ線分が壁に当たる敵3は撃たない (見えるようになったらすぐ撃つ)
+        sight = raycast_batch(tile_grid, entities.x[fire] + 4, entities.y[fire] + 4, player.x + 4, player.y + 4)
+        fire = fire[sight >= 1.0]
+        dx = player.x - entities.x[fire] # プレイヤーとのX方向の距離
+        dy = player.y - entities.y[fire] # プレイヤーとのY方向の距離
+        dist = np.sqrt(dx * dx + dy * dy) # 距離を計算
+        # プレイヤーに向かって弾を発射
+        # (弾はプールから取り出す。満杯なら NO_SLOT が返り、その弾は撃たれない)
+        for i, bullet_dx, bullet_dy in zip(fire, dx / dist, dy / dist):
+            entities.acquire(EntityKind.BULLET, entities.x[i], entities.y[i], bullet_dx, bullet_dy)
+        entities.timer[fire] = 60 # 次の発射までの時間をリセット (60フレーム = 1秒)
+
+    # 全ての敵3を描画するメソッド
+    @staticmethod
+    def draw_all():
         # アニメーションフレームを計算
         u = pyxel.frame_count // 8 % 2 * 8
-        # 敵3の描画 (画像バンク0、uはアニメーションフレーム、vは32)
-        pyxel.blt(self.x, self.y, 0, u, 32, 8, 8, TRANSPARENT_COLOR)
+        for i in entities.indices(EntityKind.ENEMY3):
+            # 敵3の描画 (画像バンク0、uはアニメーションフレーム、vは32)
+            pyxel.blt(entities.x[i], entities.y[i], 0, u, 32, 8, 8, TRANSPARENT_COLOR)
 
 
 class Enemy3Bullet:
-    # 敵3の弾の初期化
-    def __init__(self, x, y, dx, dy):
-        self.x = x
-        self.y = y
-        self.dx = dx # X方向の速度
-        self.dy = dy # Y方向の速度
-        self.is_alive = True # 生存フラグ
-
-    # 弾の状態を更新するメソッド
-    def update(self):
-        self.x += self.dx # X座標を更新
-        self.y += self.dy # Y座標を更新
-
-    # 弾を描画するメソッド
-    def draw(self):
+    # 全ての弾の状態を配列演算でまとめて更新するメソッド (等速直線運動、壁に当たったら消える)
+    @staticmethod
+    def update_all():
+        bullets = entities.indices(EntityKind.BULLET)
+        x = entities.x[bullets] + 4 # 弾の中心
+        y = entities.y[bullets] + 4
+        # このフレームの移動で通過するタイルだけを調べ、壁に入る弾を消す
+        hit = raycast_batch(tile_grid, x, y, x + entities.dx[bullets], y + entities.dy[bullets]) < 1.0
+        entities.alive[bullets[hit]] = False
+        entities.x[bullets] += entities.dx[bullets] # X座標を更新
+        entities.y[bullets] += entities.dy[bullets] # Y座標を更新
+
+    # 全ての弾を描画するメソッド
+    @staticmethod
+    def draw_all():
         # アニメーションフレームを計算
         u = pyxel.frame_count // 2 % 2 * 8 + 16
-        # 弾の描画 (画像バンク0、uはアニメーションフレーム、vは32)
-        pyxel.blt(self.x, self.y, 0, u, 32, 8, 8, TRANSPARENT_COLOR)
+        for i in entities.indices(EntityKind.BULLET):
+            # 弾の描画 (画像バンク0、uはアニメーションフレーム、vは32)
+            pyxel.blt(entities.x[i], entities.y[i], 0, u, 32, 8, 8, TRANSPARENT_COLOR)
+
+
+# 生存している敵・弾の現在位置で空間ハッシュを作り直す関数
+def rebuild_entity_hash():
+    n = entities.count
+    entity_hash.rebuild(entities.x[:n], entities.y[:n], entities.alive[:n])
+
+
+# プレイヤーと生存している敵・弾の距離が一定以下かどうかを判定する関数
+# (空間ハッシュでプレイヤーの周囲のセルだけを調べる)
+def player_hit():
+    return len(entity_hash.query_aabb(player.x, player.y, 6, 6)) > 0
+
+
+# 画面外に出た敵・弾の生存フラグをFalseにする関数
+def kill_offscreen():
+    n = entities.count
+    x = entities.x[:n]
+    outside = (x < scroll_x - 8) | (x > scroll_x + 160) | (entities.y[:n] > 160)
+    entities.alive[:n] &= ~outside
 
 
 class App:
@@ -342,6 +355,22 @@ class App:
         # リソースファイル"assets/platformer.pyxres"をロード
         pyxel.load("assets/platformer.pyxres")
 
+        # 衝突判定・敵出現判定用のタイル種別配列と敵の出現タイルを、リソースの隣のキャッシュから読み込む
+        # (キャッシュが無いか、リソースが変わっていたときだけタイルマップを走査して作り直す)
+        level_data = load_level_data("assets/platformer.pyxres")
+        global tile_grid # グローバル変数tile_gridを使用
+        tile_grid = level_data.grid
+        global spawn_index # グローバル変数spawn_indexを使用
+        # 敵の出現位置 (Y座標は0から15まで = 画面の高さ)
+        spawn_index = SpawnIndex(tile_grid, 16, level_data.spawn_points)
+        global tile_editor # グローバル変数tile_editorを使用
+        # ゲーム中のタイルの書き換えは pyxel.tilemap(0).pset ではなく tile_editor.set_tile で行う
+        tile_editor = TileEditor(tile_grid, pyxel.tilemap(0), spawn_index)
+        global nav_graph # グローバル変数nav_graphを使用
+        # 敵1の経路探索用のグラフ (Y座標は0から15まで。タイルが書き換えられたら作り直す)
+        nav_graph = NavGraph(tile_grid, 16, WALKER_JUMP)
+        nav_graph.attach(tile_editor)
+
         # 敵の出現タイルを透明にする (ゲーム中に見えないようにする)
         # pyxel.image(0).rect(x, y, w, h, col)
         # 画像バンク0の(0, 8)から幅24、高さ8の範囲を透明色で塗りつぶす
@@ -361,18 +390,21 @@ class App:
             pyxel.quit()
 
         player.update() # プレイヤーの状態を更新
-
-        # 敵の更新とプレイヤーとの衝突判定
-        for enemy in enemies:
-            # プレイヤーと敵の距離が一定以下であればゲームオーバー
-            if abs(player.x - enemy.x) < 6 and abs(player.y - enemy.y) < 6:
-                game_over() # ゲームオーバー処理を呼び出し
-                return # update処理を終了
-            enemy.update() # 敵の状態を更新
-            # 敵が画面外に出たら生存フラグをFalseにする
-            if enemy.x < scroll_x - 8 or enemy.x > scroll_x + 160 or enemy.y > 160:
-                enemy.is_alive = False
-        cleanup_list(enemies) # 生存していない敵をリストから削除
+        rebuild_entity_hash() # 敵・弾の位置から空間ハッシュを作り直す
+
+        # プレイヤーと敵・弾の距離が一定以下であればゲームオーバー
+        if player_hit():
+            game_over() # ゲームオーバー処理を呼び出し
+            return # update処理を終了
+
+        # 敵の更新 (種類ごとにまとめて処理)
+        Enemy3.update_all() # 敵3の発射 (発射された弾はこのフレームから動く)
+        Enemy3Bullet.update_all() # 弾の移動
+        apply_walker_gravity() # 敵1・敵2の速度と重力
+        Enemy1.update_all()
+        Enemy2.update_all()
+        kill_offscreen() # 画面外に出た敵・弾の生存フラグをFalseにする
+        cleanup_list(entities) # 生存していない敵をストアから削除
 
     # アプリケーションの描画を行うメソッド (毎フレーム呼び出される)
     def draw(self):
@@ -394,22 +426,27 @@ class App:
         # キャラクターの描画
         pyxel.camera(scroll_x, 0) # カメラをスクロール量に合わせて設定
         player.draw() # プレイヤーを描画
-        for enemy in enemies:
-            enemy.draw() # 敵を描画
+        # 敵・弾を種類ごとに描画
+        Enemy1.draw_all()
+        Enemy2.draw_all()
+        Enemy3.draw_all()
+        Enemy3Bullet.draw_all()
 
 
 # ゲームオーバー時の処理
 def game_over():
-    global scroll_x, enemies # グローバル変数scroll_xとenemiesを使用
+    global scroll_x # グローバル変数scroll_xを使用
     scroll_x = 0 # スクロール量をリセット
     player.x = 0 # プレイヤーのX座標をリセット
     player.y = 0 # プレイヤーのY座標をリセット
     player.dx = 0 # プレイヤーのX速度をリセット
     player.dy = 0 # プレイヤーのY速度をリセット
-    enemies = [] # 敵リストをクリア
+    entities.clear() # 敵・弾をすべて削除
+    spawn_index.reset() # すべての出現位置を未出現に戻す
     spawn_enemy(0, 127) # 新しい敵を生成
     pyxel.play(3, 9) # ゲームオーバー音を再生
 
 
-# アプリケーションの開始
-App()
+# アプリケーションの開始 (ベンチマークなどからimportされたときは起動しない)
+if __name__ == "__main__":
+    App()
@@ -0,0 +1,244 @@
+# coding: utf-8
+# コーディングルール:
+# - すべての変数・関数・戻り値に型アノテーションを必ず付与すること
+# - 定数宣言時は"HOGHOGE"のような文字列は使わない。必ず HOGEHOGE = 1 みたいに宣言する。たくさんある時は enum にする
+# - 1関数につき30行以内を目安に分割
+# - コメントは日本語で記述
+# - 関数宣言したら、関数の機能、引数がある時は引数名と、なんの値を受け取っているかをコメントで書く
+
+# 同じマップ上の N 体のプレイヤーを、NumPy配列で一斉に1フレームずつ進めるバッチ物理エンジン
+# Player.update と同じ規則（すり抜け床・コヨーテタイム・ジャンプ・押し戻し・スクロール）を全員に配列演算で適用する。
+# パリティチェック（スカラーのPlayerとフレームごとに一致するか）をコマンドラインから実行できる:
+#   python batch_player.py --agents 256 --frames 2000
+
+import argparse
+import sys
+import time
+import numpy as np
+from typing import List
+from player import Player, CameraManager, Direction, FloorState, HIT_LEFT, HIT_RIGHT, SPRITE_SIZE, \
+    SCROLL_BORDER_X, MAX_SCROLL_X, PLAYER_START_X, PLAYER_START_Y, FOOT_COLLISION_INSET_LEFT, \
+    FOOT_COLLISION_INSET_RIGHT, RUN_SPEED, JUMP_SPEED, GRAVITY, MAX_FALL_SPEED
+from tile_grid import TileGrid, TileKind, TILE_SIZE
+from input_source import ScriptedInput, Key, PRESS_SHIFT
+from simulation import HeadlessSimulation, random_inputs, DEFAULT_RESOURCE_PATH
+
+NO_MISMATCH = -1  # パリティチェックで不一致がなかったことを表すフレーム番号
+
+# パリティチェックで比べる属性（BatchPlayerの配列名 = Playerの属性名）
+COMPARED_FIELDS = ("x", "y", "dx", "dy", "direction", "is_on_ground", "jump_count", "jump_start_y",
+                   "is_jumping", "floor_state", "was_on_ground", "coyote_timer")
+
+# 入力ビットフィールドの配列から、キーが押されているかの真偽配列を取り出す
+# bits: 各プレイヤーの入力ビットフィールドの配列
+# key: 判定するキー
+def held(bits: np.ndarray, key: Key) -> np.ndarray:
+    return (bits >> key & 1).astype(np.bool_)
+
+# 入力ビットフィールドの配列から、キーをこのフレームで押したかの真偽配列を取り出す
+# bits: 各プレイヤーの入力ビットフィールドの配列
+# key: 判定するキー
+def pressed(bits: np.ndarray, key: Key) -> np.ndarray:
+    return (bits >> (key + PRESS_SHIFT) & 1).astype(np.bool_)
+
+# === バッチ物理エンジン ===
+class BatchPlayer:
+    # N体のプレイヤーの状態を属性ごとのNumPy配列で持ち、Player.update と同じ規則で一斉に進めるクラス
+    # タイルの種別は TileGrid から作った2次元配列を添字で引くだけで、pyxelは使わない
+    def __init__(self, grid: TileGrid, count: int, start_x: int = PLAYER_START_X, start_y: int = PLAYER_START_Y):
+        # grid: 衝突判定に使うタイルインデックス
+        # count: プレイヤーの数
+        # start_x, start_y: 全員の初期座標
+        # grid.cells をコピーせずに参照する（TileEditor でのタイルの書き換えがそのまま反映される）
+        self.kinds: np.ndarray = np.frombuffer(grid.cells, dtype=np.uint8).reshape(grid.height, grid.width)
+        template: Player = Player(start_x, start_y, CameraManager(), ScriptedInput())  # 調整用の定数の取得元
+        self.max_jumps: int = template.max_jumps
+        self.max_jump_height: int = template.max_jump_height
+        self.coyote_time_max: int = template.COYOTE_TIME_MAX
+        self.x: np.ndarray = np.full(count, start_x, dtype=np.int64)
+        self.y: np.ndarray = np.full(count, start_y, dtype=np.int64)
+        self.dx: np.ndarray = np.zeros(count, dtype=np.int64)
+        self.dy: np.ndarray = np.zeros(count, dtype=np.int64)
+        self.direction: np.ndarray = np.full(count, Direction.RIGHT.value, dtype=np.int8)
+        self.is_on_ground: np.ndarray = np.zeros(count, dtype=np.bool_)
+        self.jump_count: np.ndarray = np.zeros(count, dtype=np.int64)
+        self.jump_start_y: np.ndarray = np.zeros(count, dtype=np.int64)
+        self.is_jumping: np.ndarray = np.zeros(count, dtype=np.bool_)
+        self.skip_jump: np.ndarray = np.zeros(count, dtype=np.bool_)
+        self.floor_state: np.ndarray = np.full(count, FloorState.NOT_FLOOR.value, dtype=np.int8)
+        self.was_on_ground: np.ndarray = np.zeros(count, dtype=np.bool_)
+        self.coyote_timer: np.ndarray = np.zeros(count, dtype=np.int64)
+        self.scroll_x: np.ndarray = np.zeros(count, dtype=np.int64)
+
+    def kind(self, tile_x: np.ndarray, tile_y: np.ndarray) -> np.ndarray:
+        # タイル座標の配列に対するタイル種別の配列を返す（範囲外はEMPTY）
+        # tile_x, tile_y: タイル座標の配列
+        height: int
+        width: int
+        height, width = self.kinds.shape
+        inside: np.ndarray = (tile_x >= 0) & (tile_x < width) & (tile_y >= 0) & (tile_y < height)
+        kinds: np.ndarray = self.kinds[np.clip(tile_y, 0, height - 1), np.clip(tile_x, 0, width - 1)]
+        return np.where(inside, kinds, TileKind.EMPTY)
+
+    def detect_collision(self, x: np.ndarray, y: np.ndarray, y_vector: np.ndarray) -> np.ndarray:
+        # CollisionDetector.detect_collision の配列版（当たり判定の幅は高々2タイル列・2タイル行）
+        # x, y: 判定する左上座標の配列
+        # y_vector: Y方向の移動量の配列（下方向のときだけすり抜け床と衝突する）
+        left: np.ndarray = (x + HIT_LEFT) // TILE_SIZE
+        right: np.ndarray = (x + HIT_RIGHT) // TILE_SIZE
+        top: np.ndarray = y // TILE_SIZE
+        bottom: np.ndarray = (y + SPRITE_SIZE - 1) // TILE_SIZE
+        hit: np.ndarray = np.zeros(len(x), dtype=np.bool_)
+        for column in (left, right):
+            for row in (top, bottom):
+                hit |= self.kind(column, row) == TileKind.WALL
+        on_floor_edge: np.ndarray = (y_vector > 0) & (y % TILE_SIZE == 1)
+        for column in (left, right):
+            hit |= on_floor_edge & (self.kind(column, top + 1) == TileKind.THROUGH_FLOOR)
+        return hit
+
+    def _floor_state(self) -> np.ndarray:
+        # Player._get_floor_state の配列版（左足側のタイルを優先して床状態を決める）
+        row: np.ndarray = (self.y + SPRITE_SIZE) // TILE_SIZE
+        state: np.ndarray = np.full(len(self.x), FloorState.NOT_FLOOR.value, dtype=np.int8)
+        decided: np.ndarray = np.zeros(len(self.x), dtype=np.bool_)
+        for column in ((self.x + FOOT_COLLISION_INSET_LEFT) // TILE_SIZE,
+                       (self.x + SPRITE_SIZE - 1 - FOOT_COLLISION_INSET_RIGHT) // TILE_SIZE):
+            kind: np.ndarray = self.kind(column, row)
+            through: np.ndarray = ~decided & (kind == TileKind.THROUGH_FLOOR)
+            wall: np.ndarray = ~decided & (kind == TileKind.WALL)
+            state[through] = FloorState.ON_THROUGH_FLOOR.value
+            state[wall] = FloorState.ON_FLOOR.value
+            decided |= through | wall
+        return state
+
+    def _push_back_x(self, active: np.ndarray) -> None:
+        # MovementHandler._push_back_x の配列版。1ピクセルずつ進め、衝突したプレイヤーはそこで止める
+        # active: この軸の押し戻しを行うプレイヤーの真偽配列
+        sign: np.ndarray = np.sign(self.dx)
+        moving: np.ndarray = active & (sign != 0)
+        for pixel in range(int(np.abs(self.dx).max(initial=0))):
+            moving &= pixel < np.abs(self.dx)
+            moving &= ~self.detect_collision(self.x + sign, self.y, self.dy)
+            self.x += np.where(moving, sign, 0)
+
+    def _push_back_y(self, active: np.ndarray) -> None:
+        # MovementHandler._push_back_y の配列版。1ピクセルずつ進め、衝突したプレイヤーはそこで止める
+        # active: この軸の押し戻しを行うプレイヤーの真偽配列
+        sign: np.ndarray = np.sign(self.dy)
+        moving: np.ndarray = active & (sign != 0)
+        for pixel in range(int(np.abs(self.dy).max(initial=0))):
+            moving &= pixel < np.abs(self.dy)
+            moving &= ~self.detect_collision(self.x, self.y + sign, self.dy)
+            self.y += np.where(moving, sign, 0)
+
+    def _push_back(self) -> None:
+        # MovementHandler.push_back の配列版。移動量の大きい軸から押し戻す
+        x_first: np.ndarray = np.abs(self.dx) > np.abs(self.dy)
+        self._push_back_x(x_first)
+        self._push_back_y(np.ones(len(self.x), dtype=np.bool_))
+        self._push_back_x(~x_first)
+        np.maximum(self.x, 0, out=self.x)
+
+    def step(self, bits: np.ndarray) -> None:
+        # 全員を1フレーム進める（Player.update と同じ順序）
+        # bits: 各プレイヤーの今フレームの入力ビットフィールドの配列
+        self.was_on_ground = self.is_on_ground
+        self.floor_state = self._floor_state()
+        self.is_on_ground = self.detect_collision(self.x, self.y + 1, np.ones(len(self.x), dtype=np.int64))
+        self.coyote_timer = np.where(self.is_on_ground, self.coyote_time_max, np.maximum(self.coyote_timer - 1, 0))
+        self.skip_jump = self.is_on_ground & (self.floor_state == FloorState.ON_THROUGH_FLOOR.value) \
+            & held(bits, Key.DOWN) & pressed(bits, Key.SPACE)
+        self.y += self.skip_jump
+        landed: np.ndarray = self.is_on_ground & ~self.was_on_ground
+        self.jump_count[landed] = 0
+        self.is_jumping[landed] = False
+        self._handle_input_and_jump(bits)
+        self.dy = np.where(self.dy < MAX_FALL_SPEED, np.minimum(self.dy + GRAVITY, MAX_FALL_SPEED), self.dy)
+        self._push_back()
+        self.dy[self.is_on_ground & (self.dy > 0)] = 0
+        np.maximum(self.y, 0, out=self.y)
+        self._update_scroll()
+        self.skip_jump[:] = False
+
+    def _handle_input_and_jump(self, bits: np.ndarray) -> None:
+        # 左右移動の入力とジャンプ処理（Player._handle_input_and_movement と _handle_jump の配列版）
+        # bits: 各プレイヤーの今フレームの入力ビットフィールドの配列
+        left: np.ndarray = held(bits, Key.LEFT)
+        right: np.ndarray = ~left & held(bits, Key.RIGHT)
+        self.direction[left] = Direction.LEFT.value
+        self.direction[right] = Direction.RIGHT.value
+        self.dx = (right.astype(np.int64) - left) * RUN_SPEED
+        can_jump: np.ndarray = self.is_on_ground | (self.jump_count < self.max_jumps)
+        jump: np.ndarray = can_jump & pressed(bits, Key.SPACE) & ~self.skip_jump \
+            & (self.is_on_ground | (self.coyote_timer > 0))
+        starting: np.ndarray = jump & ~self.is_jumping
+        self.jump_start_y[starting] = self.y[starting]
+        self.is_jumping |= starting
+        self.jump_count += starting
+        rising: np.ndarray = jump & self.is_jumping & (self.jump_start_y - self.y < self.max_jump_height)
+        self.dy[rising] = -JUMP_SPEED
+        self.is_jumping &= held(bits, Key.SPACE)
+
+    def _update_scroll(self) -> None:
+        # CameraManager.update_scroll の配列版
+        right: np.ndarray = self.x > self.scroll_x + SCROLL_BORDER_X
+        left: np.ndarray = ~right & (self.x < self.scroll_x + SCROLL_BORDER_X // 2)
+        self.scroll_x = np.where(right, np.minimum(self.x - SCROLL_BORDER_X, MAX_SCROLL_X), self.scroll_x)
+        self.scroll_x = np.where(left, np.maximum(self.x - SCROLL_BORDER_X // 2, 0), self.scroll_x)
+
+# === パリティチェック ===
+# 配列の i 番目のプレイヤーと、スカラーのPlayerの状態が一致するか
+# batch: バッチ物理エンジン
+# index: 比べるプレイヤーの添字
+# simulation: 比べるスカラーのシミュレーション
+def matches(batch: BatchPlayer, index: int, simulation: HeadlessSimulation) -> bool:
+    player: Player = simulation.player
+    for name in COMPARED_FIELDS:
+        value: object = getattr(player, name)
+        if int(getattr(batch, name)[index]) != int(getattr(value, "value", value)):
+            return False
+    return int(batch.scroll_x[index]) == simulation.camera_manager.scroll_x
+
+# ランダム入力でN体のバッチとN個のスカラーのシミュレーションを並べて進め、最初に状態がずれたフレームを返す
+# grid: 衝突判定に使うタイルインデックス
+# agents: プレイヤーの数
+# frames: 進めるフレーム数
+# seed: 最初のプレイヤーの乱数シード（i番目は seed + i）
+def parity_check(grid: TileGrid, agents: int, frames: int, seed: int = 0) -> int:
+    inputs: np.ndarray = np.array([random_inputs(frames, seed + index) for index in range(agents)], dtype=np.int64)
+    batch: BatchPlayer = BatchPlayer(grid, agents)
+    simulations: List[HeadlessSimulation] = [HeadlessSimulation(grid) for _ in range(agents)]
+    for frame in range(frames):
+        batch.step(inputs[:, frame])
+        for index, simulation in enumerate(simulations):
+            simulation.step_bits(int(inputs[index, frame]))
+            if not matches(batch, index, simulation):
+                return frame
+    return NO_MISMATCH
+
+# コマンドライン: スカラーのPlayerとのパリティチェックと、バッチでの処理速度の計測
+def main() -> None:
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description="Vectorized multi-agent Player physics")
+    parser.add_argument("--resource", default=DEFAULT_RESOURCE_PATH, help=".pyxres file")
+    parser.add_argument("--agents", type=int, default=64, help="number of players checked against Player")
+    parser.add_argument("--frames", type=int, default=2000, help="frames to simulate")
+    parser.add_argument("--seed", type=int, default=0, help="random input seed")
+    parser.add_argument("--bench-agents", type=int, default=4096, help="number of players for the speed run")
+    args: argparse.Namespace = parser.parse_args()
+    grid: TileGrid = TileGrid.from_resource(args.resource)
+    mismatch: int = parity_check(grid, args.agents, args.frames, args.seed)
+    print("parity ok" if mismatch == NO_MISMATCH else f"parity MISMATCH at frame {mismatch}")
+    inputs: np.ndarray = np.array([random_inputs(args.frames, args.seed + index) for index in range(args.bench_agents)],
+                                  dtype=np.int64)
+    batch: BatchPlayer = BatchPlayer(grid, args.bench_agents)
+    start: float = time.perf_counter()
+    for frame in range(args.frames):
+        batch.step(inputs[:, frame])
+    elapsed: float = time.perf_counter() - start
+    print(f"agents={args.bench_agents} frames={args.frames} time={elapsed:.3f}s "
+          f"agent_fps={args.bench_agents * args.frames / elapsed:.0f}")
+    sys.exit(0 if mismatch == NO_MISMATCH else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+# coding: utf-8
+# コーディングルール:
+# - すべての変数・関数・戻り値に型アノテーションを必ず付与すること
+# - 定数宣言時は"HOGHOGE"のような文字列は使わない。必ず HOGEHOGE = 1 みたいに宣言する。たくさんある時は enum にする
+# - 1関数につき30行以内を目安に分割
+# - コメントは日本語で記述
+# - 関数宣言したら、関数の機能、引数がある時は引数名と、なんの値を受け取っているかをコメントで書く
+
+# 記録ファイル(.mvr)の一括再生による回帰チェック
+# Playerの物理定数を変えたときに、ディレクトリ内の全記録をワーカープロセスに分けてヘッドレス再生し、
+# 記録されている毎フレームのチェックサムと再生結果を比べて、最初にずれたフレームと全体の処理速度を表示する。
+# チェックサムのない古い記録（形式バージョン2）はキーフレームと比べるので、ずれたフレームはキーフレーム単位になる。
+# どちらもない記録（形式バージョン1）は比べるものがないので、ok ではなく unverified と表示する。
+#   python batch_replay.py recordings/ --workers 8
+
+import argparse
+import os
+import sys
+import time
+from enum import IntEnum
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, NamedTuple, Tuple
+from recording import Recording, Replayer, pack_keyframe, unpack_keyframe, trajectory_point, KEYFRAME_SIZE, \
+    TrajectoryPoint, NO_DIVERGENCE
+from simulation import HeadlessSimulation, DEFAULT_RESOURCE_PATH
+from tile_grid import TileGrid
+
+RECORDING_EXTENSION = ".mvr"  # 対象とする記録ファイルの拡張子
+
+# 記録と再生結果を比べた方法
+class Verification(IntEnum):
+    CHECKSUM = 0   # 毎フレームのチェックサム（ずれたフレームは正確）
+    KEYFRAME = 1   # 各キーフレーム（ずれたフレームはキーフレーム単位）
+    NONE = 2       # 比べるものがない（再生しただけで、一致したかは分からない）
+
+# 1つの記録の再生結果
+class ReplayResult(NamedTuple):
+    path: str                      # 記録ファイルのパス
+    frames: int                    # 再生したフレーム数
+    divergence_frame: int          # 最初に記録とずれたフレーム番号（なければNO_DIVERGENCE）
+    verification: Verification     # 記録と比べた方法
+    final: TrajectoryPoint         # 再生後の最終状態 (x, y, dy, jump_count, scroll_x)
+    recorded_final: TrajectoryPoint | None  # 記録されている最終状態（最終キーフレームがなければNone）
+
+# ワーカープロセスごとに一度だけ読み込むタイルインデックス
+_worker_grid: TileGrid | None = None
+
+# ワーカープロセスの初期化。タイルマップと衝突判定データを読み込み、全記録の再生で使い回す
+# resource_path: .pyxres ファイルのパス
+def init_worker(resource_path: str) -> None:
+    global _worker_grid
+    _worker_grid = TileGrid.from_resource(resource_path)
+
+# 1つの記録を再生し、毎フレームのチェックサム（なければ各キーフレーム）で記録された状態と比較する
+# （ワーカープロセスで実行）
+# path: 記録ファイルのパス
+def replay_file(path: str) -> ReplayResult:
+    recording: Recording = Recording.load(path)
+    replayer: Replayer = Replayer(recording, _worker_grid)
+    verification: Verification = _verification(recording)
+    divergence_frame: int = NO_DIVERGENCE
+    if verification == Verification.CHECKSUM:
+        divergence_frame = replayer.verify()
+    elif verification == Verification.KEYFRAME:
+        divergence_frame = _keyframe_divergence(replayer)
+    simulation: HeadlessSimulation = replayer.run()
+    return ReplayResult(path, recording.frame_count(), divergence_frame, verification,
+                        trajectory_point(simulation), _recorded_final(recording))
+
+# 記録と再生結果を比べる方法を決める（チェックサム → キーフレーム → なし の順に使えるものを選ぶ）
+# recording: 対象の記録
+def _verification(recording: Recording) -> Verification:
+    if len(recording.checksums) == recording.frame_count():
+        return Verification.CHECKSUM
+    return Verification.KEYFRAME if recording.keyframes else Verification.NONE
+
+# 各キーフレームまで再生して記録された状態と比べ、最初にずれたキーフレームのフレーム番号を返す
+# replayer: 先頭から再生する再生器
+def _keyframe_divergence(replayer: Replayer) -> int:
+    recording: Recording = replayer.recording
+    simulation: HeadlessSimulation = replayer.simulation
+    for frame, offset in recording.keyframes:
+        simulation.run(recording.inputs[simulation.frame_count:frame])
+        recorded: bytes = recording.data[offset:offset + KEYFRAME_SIZE]
+        if pack_keyframe(simulation.player, simulation.camera_manager) != recorded:
+            return frame
+    return NO_DIVERGENCE
+
+# 記録の最終キーフレームが表す最終状態を取り出す（最終キーフレームがなければNone）
+# recording: 対象の記録
+def _recorded_final(recording: Recording) -> TrajectoryPoint | None:
+    if not recording.keyframes or recording.keyframes[-1][0] != recording.frame_count():
+        return None
+    simulation: HeadlessSimulation = HeadlessSimulation(_worker_grid)
+    unpack_keyframe(recording.data, recording.keyframes[-1][1], simulation.player, simulation.camera_manager)
+    return trajectory_point(simulation)
+
+# ディレクトリ内の記録ファイルを名前順に列挙する
+# directory: 記録ファイルのあるディレクトリ
+def find_recordings(directory: str) -> List[str]:
+    names: List[str] = sorted(name for name in os.listdir(directory) if name.endswith(RECORDING_EXTENSION))
+    return [os.path.join(directory, name) for name in names]
+
+# 全記録をワーカープロセスに分けて再生する。戻り値: (各記録の結果, 経過秒数)
+# paths: 記録ファイルのパス一覧
+# resource_path: .pyxres ファイルのパス
+# workers: ワーカープロセス数
+def run_batch(paths: List[str], resource_path: str, workers: int) -> Tuple[List[ReplayResult], float]:
+    start: float = time.perf_counter()
+    chunksize: int = max(1, len(paths) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(resource_path,)) as executor:
+        results: List[ReplayResult] = list(executor.map(replay_file, paths, chunksize=chunksize))
+    return results, time.perf_counter() - start
+
+# 各記録の結果と全体の処理速度を表示する
+# results: 各記録の結果
+# elapsed: 経過秒数
+def print_report(results: List[ReplayResult], elapsed: float) -> None:
+    for result in results:
+        status: str = "ok" if result.verification != Verification.NONE else "unverified"
+        if result.divergence_frame != NO_DIVERGENCE:
+            exact: bool = result.verification == Verification.CHECKSUM
+            status = f"DIVERGED {'at' if exact else 'by'} frame {result.divergence_frame}"
+        line: str = f"{os.path.basename(result.path)}: frames={result.frames} {status} final={result.final}"
+        if result.recorded_final is not None and result.recorded_final != result.final:
+            line += f" recorded_final={result.recorded_final}"
+        print(line)
+    frames: int = sum(result.frames for result in results)
+    diverged: int = sum(result.divergence_frame != NO_DIVERGENCE for result in results)
+    unverified: int = sum(result.verification == Verification.NONE for result in results)
+    print(f"recordings={len(results)} diverged={diverged} unverified={unverified} frames={frames} "
+          f"time={elapsed:.3f}s throughput={frames / max(elapsed, 1e-9):.0f} fps")
+
+# コマンドライン: ディレクトリ内の全記録を並列に再生して結果を表示する
+def main() -> None:
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description="Replay a directory of recordings")
+    parser.add_argument("directory", help="directory containing .mvr recordings")
+    parser.add_argument("--resource", default=DEFAULT_RESOURCE_PATH, help=".pyxres file")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="number of worker processes")
+    args: argparse.Namespace = parser.parse_args()
+    paths: List[str] = find_recordings(args.directory)
+    if not paths:
+        sys.exit(f"no {RECORDING_EXTENSION} files in {args.directory}")
+    results: List[ReplayResult]
+    elapsed: float
+    results, elapsed = run_batch(paths, args.resource, args.workers)
+    print_report(results, elapsed)
+    # ずれた記録があれば終了コード1（CIでの回帰検出用）
+    sys.exit(1 if any(result.divergence_frame != NO_DIVERGENCE for result in results) else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,370 @@
+# coding: utf-8
+# コーディングルール:
+# - すべての変数・関数・戻り値に型アノテーションを必ず付与すること
+# - 定数宣言時は"HOGHOGE"のような文字列は使わない。必ず HOGEHOGE = 1 みたいに宣言する。たくさんある時は enum にする
+# - 1関数につき30行以内を目安に分割
+# - コメントは日本語で記述
+# - 関数宣言したら、関数の機能、引数がある時は引数名と、なんの値を受け取っているかをコメントで書く
+
+# 衝突判定・押し戻し・Player.update と 10_platformer.py のホットパスのマイクロベンチマーク
+# ヘッドレスで決まった入力・座標を流し、1回あたりのナノ秒（とシナリオはfps）を表示してJSONに保存する。
+# 保存済みのベースラインと比べて、しきい値を超えて遅くなった項目があれば終了コード1を返す。
+# 計測の前に、高速化した実装が元の実装と同じ結果になるか（BatchPlayer と Player のパリティ）を確認し、
+# ずれていれば計測せずに終了コード1を返す。
+#   python benchmarks.py --output bench.json
+#   python benchmarks.py --baseline bench.json --threshold 0.1
+
+import argparse
+import copy
+import importlib
+import json
+import random
+import sys
+import time
+import numpy as np
+from types import ModuleType
+from typing import Callable, Dict, List, NamedTuple, Tuple
+from player import CollisionDetector, MovementHandler, CameraManager, Player, PlayerState
+from simulation import HeadlessSimulation, random_inputs, DEFAULT_RESOURCE_PATH
+from tile_grid import TileGrid, SpawnIndex, TILE_SIZE
+from input_source import Key, PRESS_SHIFT
+from entity_store import EntityKind, EntityStore
+from raycast import raycast_batch
+from nav_graph import NavGraph
+from batch_player import parity_check, NO_MISMATCH
+
+NS_PER_SECOND = 1_000_000_000  # 1秒あたりのナノ秒
+SAMPLE_COUNT = 20000           # 衝突判定・押し戻しのベンチマークで使う座標の数
+DEFAULT_REPEAT = 5             # 各ベンチマークの繰り返し回数（最速の回を採用）
+DEFAULT_THRESHOLD = 0.10       # ベースラインより何割遅くなったら回帰とみなすか
+SCENARIO_RUNS = 200            # シナリオを最初からやり直して流す回数
+DEEPCOPY_COUNT = 2000          # deepcopy との比較で deepcopy を呼ぶ回数
+STORE_SIZE = 256               # cleanup_list のベンチマークで使う要素数
+RAY_COUNT = 500                # レイキャストのバッチのベンチマークで同時に調べるレイ（弾）の数
+STORM_SHOOTERS = 48            # 弾幕のベンチマークでプレイヤーを囲む敵3の数
+STORM_FRAMES = 600             # 弾幕のベンチマークで流すフレーム数
+STORM_PLAYER = (60, 40)        # 弾幕のベンチマークでのプレイヤーの位置（空中の開けた場所）
+NAV_ROWS = 16                  # ナビゲーショングラフの対象の行数（10_platformer.py と同じ画面の高さ）
+NAV_QUERIES = 2000             # 経路探索のベンチマークで問い合わせるノードの組の数
+PARITY_AGENTS = 16             # 計測前のパリティチェックで比べるプレイヤーの数
+PARITY_FRAMES = 600            # 計測前のパリティチェックで進めるフレーム数
+PLATFORMER_MODULE = "10_platformer"  # 10_platformer.py のモジュール名
+
+# 1つのベンチマークの結果
+class BenchResult(NamedTuple):
+    ops: int              # 計測した操作（呼び出し・フレーム）の回数
+    seconds: float        # かかった時間（秒）
+    frames: bool          # 操作が1フレームの更新ならTrue（fpsも表示する）
+
+# 1つのシナリオ（開始位置と、各フレームの入力ビットフィールド）
+class Scenario(NamedTuple):
+    start_x: int
+    start_y: int
+    inputs: List[int]
+
+# 入力ビットフィールドを作る
+# held: 押されているキー
+# pressed: このフレームで押されたキー
+def bits(held: Tuple[Key, ...] = (), pressed: Tuple[Key, ...] = ()) -> int:
+    value: int = 0
+    for key in held:
+        value |= 1 << key
+    for key in pressed:
+        value |= 1 << (key + PRESS_SHIFT)
+    return value
+
+# my_resource.pyxres のマップ上で、代表的な動きを再現するシナリオ
+SCENARIOS: Dict[str, Scenario] = {
+    # 地面を右に走り続けて壁に押し付ける
+    "wall_run": Scenario(100, 112, [bits((Key.RIGHT,))] * 60),
+    # 空中から落下してすり抜け床(TILE_FLOOR)に着地する
+    "floor_landing": Scenario(136, 0, [0] * 30),
+    # すり抜け床の上で下＋ジャンプを押して下に降りる
+    "through_floor_drop": Scenario(136, 32, [bits((Key.DOWN,)), bits((Key.DOWN, Key.SPACE), (Key.SPACE,))]
+                                   + [bits((Key.DOWN, Key.SPACE))] * 28),
+    # 壁のない地面を走る速度(RUN_SPEED)で右へ走り続ける（壁の手前で止まらない長さ）
+    "ground_run": Scenario(0, 112, [bits((Key.RIGHT,))] * 60),
+}
+
+# 乱数で衝突判定・押し戻し用の座標と移動量を作る
+# grid: 対象のタイルインデックス
+# seed: 乱数シード
+def random_moves(grid: TileGrid, seed: int = 0) -> List[Tuple[int, int, int, int]]:
+    rng: random.Random = random.Random(seed)
+    width: int = grid.width * TILE_SIZE
+    height: int = 16 * TILE_SIZE
+    return [(rng.randrange(width), rng.randrange(height), rng.randint(-2, 2), rng.randint(-7, 3))
+            for _ in range(SAMPLE_COUNT)]
+
+# 引数の組ごとに関数を呼び出し、かかった時間（秒）を返す
+# function: 計測する関数
+# arguments: 引数の組の一覧
+def time_calls(function: Callable[..., object], arguments: List[tuple]) -> float:
+    start: int = time.perf_counter_ns()
+    for args in arguments:
+        function(*args)
+    return (time.perf_counter_ns() - start) / NS_PER_SECOND
+
+# CollisionDetector.detect_collision のベンチマーク
+# grid: 対象のタイルインデックス
+def bench_detect_collision(grid: TileGrid) -> BenchResult:
+    CollisionDetector.load_grid(grid)
+    moves: List[tuple] = [(x, y, dy) for x, y, _, dy in random_moves(grid)]
+    return BenchResult(len(moves), time_calls(CollisionDetector.detect_collision, moves), False)
+
+# MovementHandler.push_back のベンチマーク
+# grid: 対象のタイルインデックス
+def bench_push_back(grid: TileGrid) -> BenchResult:
+    CollisionDetector.load_grid(grid)
+    handler: MovementHandler = MovementHandler(CameraManager())
+    moves: List[tuple] = random_moves(grid)
+    return BenchResult(len(moves), time_calls(handler.push_back, moves), False)
+
+# シナリオを流す Player.update のベンチマークを作る
+# scenario: 流すシナリオ
+def scenario_bench(scenario: Scenario) -> Callable[[TileGrid], BenchResult]:
+    def bench(grid: TileGrid) -> BenchResult:
+        seconds: float = 0.0
+        for _ in range(SCENARIO_RUNS):
+            simulation: HeadlessSimulation = HeadlessSimulation(grid, scenario.start_x, scenario.start_y)
+            start: int = time.perf_counter_ns()
+            simulation.run(scenario.inputs)
+            seconds += (time.perf_counter_ns() - start) / NS_PER_SECOND
+        return BenchResult(SCENARIO_RUNS * len(scenario.inputs), seconds, True)
+    return bench
+
+# ランダム入力で少し進めたプレイヤーを返す（スナップショットのベンチマーク用）
+# grid: 対象のタイルインデックス
+def warmed_up_player(grid: TileGrid) -> Player:
+    simulation: HeadlessSimulation = HeadlessSimulation(grid)
+    simulation.run(random_inputs(300, 0))
+    return simulation.player
+
+# Player.snapshot のベンチマーク
+# grid: 対象のタイルインデックス
+def bench_player_snapshot(grid: TileGrid) -> BenchResult:
+    player: Player = warmed_up_player(grid)
+    return BenchResult(SAMPLE_COUNT, time_calls(player.snapshot, [()] * SAMPLE_COUNT), False)
+
+# Player.restore のベンチマーク
+# grid: 対象のタイルインデックス
+def bench_player_restore(grid: TileGrid) -> BenchResult:
+    player: Player = warmed_up_player(grid)
+    state: PlayerState = player.snapshot()
+    return BenchResult(SAMPLE_COUNT, time_calls(player.restore, [(state,)] * SAMPLE_COUNT), False)
+
+# Player.checksum（1フレーム分の状態をチェックサムに畳み込む）のベンチマーク
+# grid: 対象のタイルインデックス
+def bench_player_checksum(grid: TileGrid) -> BenchResult:
+    player: Player = warmed_up_player(grid)
+    return BenchResult(SAMPLE_COUNT, time_calls(player.checksum, [(index,) for index in range(SAMPLE_COUNT)]), False)
+
+# 比較用: copy.deepcopy で Player を丸ごと複製するベンチマーク
+# grid: 対象のタイルインデックス
+def bench_player_deepcopy(grid: TileGrid) -> BenchResult:
+    player: Player = warmed_up_player(grid)
+    return BenchResult(DEEPCOPY_COUNT, time_calls(copy.deepcopy, [(player,)] * DEEPCOPY_COUNT), False)
+
+# 10_platformer.py をウィンドウを開かずに読み込み、タイルインデックスと出現位置インデックスを設定する
+# grid: 対象のタイルインデックス
+def load_platformer(grid: TileGrid) -> ModuleType:
+    platformer: ModuleType = importlib.import_module(PLATFORMER_MODULE)
+    platformer.tile_grid = grid
+    platformer.spawn_index = SpawnIndex(grid, 16)
+    platformer.nav_graph = NavGraph(grid, 16, platformer.WALKER_JUMP)
+    return platformer
+
+# 10_platformer.py の push_back のベンチマーク
+# grid: 対象のタイルインデックス
+def bench_platformer_push_back(grid: TileGrid) -> BenchResult:
+    platformer: ModuleType = load_platformer(grid)
+    moves: List[tuple] = random_moves(grid)
+    return BenchResult(len(moves), time_calls(platformer.push_back, moves), False)
+
+# 10_platformer.py の is_wall のベンチマーク
+# grid: 対象のタイルインデックス
+def bench_platformer_is_wall(grid: TileGrid) -> BenchResult:
+    platformer: ModuleType = load_platformer(grid)
+    points: List[tuple] = [(x, y) for x, y, _, _ in random_moves(grid)]
+    return BenchResult(len(points), time_calls(platformer.is_wall, points), False)
+
+# 10_platformer.py の spawn_enemy のベンチマーク（2ピクセルずつスクロールしてマップの端まで進む）
+# grid: 対象のタイルインデックス
+def bench_platformer_spawn_enemy(grid: TileGrid) -> BenchResult:
+    platformer: ModuleType = load_platformer(grid)
+    steps: List[tuple] = [(scroll_x + 128, scroll_x + 129) for scroll_x in range(0, grid.width * TILE_SIZE, 2)]
+    seconds: float = 0.0
+    for _ in range(SCENARIO_RUNS // 20):
+        platformer.entities.clear()
+        platformer.spawn_index.reset()
+        seconds += time_calls(platformer.spawn_enemy, steps)
+    platformer.entities.clear()
+    return BenchResult(SCENARIO_RUNS // 20 * len(steps), seconds, False)
+
+# 10_platformer.py の cleanup_list のベンチマーク（半分が死んだストアを詰める）
+# grid: 対象のタイルインデックス
+def bench_platformer_cleanup_list(grid: TileGrid) -> BenchResult:
+    platformer: ModuleType = load_platformer(grid)
+    store: EntityStore = platformer.entities
+    rng: random.Random = random.Random(0)
+    seconds: float = 0.0
+    for _ in range(SCENARIO_RUNS * 5):
+        store.clear()
+        for index in range(STORE_SIZE):
+            store.add(EntityKind(index % 4), index, index)
+            store.alive[index] = rng.random() < 0.5
+        seconds += time_calls(platformer.cleanup_list, [(store,)])
+    store.clear()
+    return BenchResult(SCENARIO_RUNS * 5, seconds, False)
+
+# 10_platformer.py の弾幕のベンチマーク（プレイヤーを囲む敵3が撃ち続け、弾がプールから出入りし続ける）
+# grid: 対象のタイルインデックス
+def bench_platformer_bullet_storm(grid: TileGrid) -> BenchResult:
+    platformer: ModuleType = load_platformer(grid)
+    platformer.entities.clear()
+    platformer.player = platformer.Player(*STORM_PLAYER)
+    platformer.scroll_x = 0
+    rng: random.Random = random.Random(0)
+    for _ in range(STORM_SHOOTERS):
+        index: int = platformer.entities.acquire(EntityKind.ENEMY3, STORM_PLAYER[0] + rng.uniform(-40, 40),
+                                                 STORM_PLAYER[1] + rng.uniform(-40, 40))
+        platformer.entities.timer[index] = rng.randrange(60)
+    start: int = time.perf_counter_ns()
+    for _ in range(STORM_FRAMES):
+        platformer.rebuild_entity_hash()
+        platformer.Enemy3.update_all()
+        platformer.Enemy3Bullet.update_all()
+        platformer.kill_offscreen()
+        platformer.cleanup_list(platformer.entities)
+    seconds: float = (time.perf_counter_ns() - start) / NS_PER_SECOND
+    platformer.entities.clear()
+    return BenchResult(STORM_FRAMES, seconds, True)
+
+# TileGrid.raycast のベンチマーク（画面内の2点を結ぶ視線判定程度の長さの線分）
+# grid: 対象のタイルインデックス
+def bench_raycast(grid: TileGrid) -> BenchResult:
+    rays: List[tuple] = [(x, y, x + dx * 16, y + dy * 8) for x, y, dx, dy in random_moves(grid)]
+    return BenchResult(len(rays), time_calls(grid.raycast, rays), False)
+
+# raycast_batch のベンチマーク（1フレーム分の移動を調べる弾 RAY_COUNT 個をまとめて調べる。1レイを1回と数える）
+# grid: 対象のタイルインデックス
+def bench_raycast_batch(grid: TileGrid) -> BenchResult:
+    moves: np.ndarray = np.array(random_moves(grid)[:RAY_COUNT], dtype=np.float64)
+    x, y = moves[:, 0], moves[:, 1]
+    frames: List[tuple] = [(grid, x, y, x + moves[:, 2], y + moves[:, 3])] * (SCENARIO_RUNS * 5)
+    return BenchResult(len(frames) * RAY_COUNT, time_calls(raycast_batch, frames), False)
+
+# 経路探索のベンチマーク用に、ナビゲーショングラフとランダムなノードの組を作る
+# grid: 対象のタイルインデックス
+def nav_queries(grid: TileGrid) -> Tuple[NavGraph, List[tuple]]:
+    graph: NavGraph = NavGraph(grid, NAV_ROWS)
+    rng: random.Random = random.Random(0)
+    nodes: int = len(graph.node_x)
+    return graph, [(rng.randrange(nodes), rng.randrange(nodes)) for _ in range(NAV_QUERIES)]
+
+# NavGraph.find_path のキャッシュに無い問い合わせ（A*で探索する）のベンチマーク
+# grid: 対象のタイルインデックス
+def bench_nav_search(grid: TileGrid) -> BenchResult:
+    graph, pairs = nav_queries(grid)
+    return BenchResult(len(pairs), time_calls(graph.find_path, pairs), False)
+
+# NavGraph.find_path のキャッシュ済みの問い合わせ（経路に沿って進む敵が毎フレーム行うもの）のベンチマーク
+# grid: 対象のタイルインデックス
+def bench_nav_cached(grid: TileGrid) -> BenchResult:
+    graph, pairs = nav_queries(grid)
+    for source, target in pairs:
+        graph.find_path(source, target)
+    return BenchResult(len(pairs) * 10, time_calls(graph.find_path, pairs * 10), False)
+
+# ベンチマークの一覧（名前 → タイルインデックスを受け取って計測する関数）
+BENCHMARKS: Dict[str, Callable[[TileGrid], BenchResult]] = {
+    "detect_collision": bench_detect_collision,
+    "push_back": bench_push_back,
+    **{f"player_update/{name}": scenario_bench(scenario) for name, scenario in SCENARIOS.items()},
+    "player/snapshot": bench_player_snapshot,
+    "player/restore": bench_player_restore,
+    "player/checksum": bench_player_checksum,
+    "player/deepcopy": bench_player_deepcopy,
+    "platformer/push_back": bench_platformer_push_back,
+    "platformer/is_wall": bench_platformer_is_wall,
+    "platformer/spawn_enemy": bench_platformer_spawn_enemy,
+    "platformer/cleanup_list": bench_platformer_cleanup_list,
+    "platformer/bullet_storm": bench_platformer_bullet_storm,
+    "raycast/single": bench_raycast,
+    "raycast/batch": bench_raycast_batch,
+    "nav/search": bench_nav_search,
+    "nav/cached": bench_nav_cached,
+}
+
+# ベンチマークをrepeat回実行し、最速の回の結果を {"ns_per_op", ("fps")} の辞書で返す
+# bench: 計測する関数
+# grid: 対象のタイルインデックス
+# repeat: 繰り返し回数
+def run_benchmark(bench: Callable[[TileGrid], BenchResult], grid: TileGrid, repeat: int) -> Dict[str, float]:
+    best: BenchResult = min((bench(grid) for _ in range(repeat)), key=lambda result: result.seconds / result.ops)
+    ns_per_op: float = best.seconds * NS_PER_SECOND / best.ops
+    result: Dict[str, float] = {"ns_per_op": round(ns_per_op, 1)}
+    if best.frames:
+        result["fps"] = round(NS_PER_SECOND / ns_per_op)
+    return result
+
+# ベースラインと比べ、しきい値を超えて遅くなった項目の説明を返す
+# results: 今回の結果
+# baseline: ベースラインの結果
+# threshold: 許容する遅くなる割合（0.1なら10%）
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            threshold: float) -> List[str]:
+    regressions: List[str] = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio: float = result["ns_per_op"] / baseline[name]["ns_per_op"]
+        print(f"  {name:<36} {ratio:6.2f}x baseline")
+        if ratio > 1 + threshold:
+            regressions.append(f"{name}: {baseline[name]['ns_per_op']} -> {result['ns_per_op']} ns/op")
+    return regressions
+
+# 計測の前の正しさの確認。戻り値: 失敗した確認の説明の一覧（すべて通れば空）
+# grid: 対象のタイルインデックス
+def run_checks(grid: TileGrid) -> List[str]:
+    failures: List[str] = []
+    mismatch: int = parity_check(grid, PARITY_AGENTS, PARITY_FRAMES)
+    if mismatch != NO_MISMATCH:
+        failures.append(f"batch_player parity: BatchPlayer differs from Player at frame {mismatch}")
+    return failures
+
+# コマンドライン: 正しさを確認してからベンチマークを実行して表示・保存し、ベースラインと比較する
+def main() -> None:
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description="MoveRec microbenchmarks")
+    parser.add_argument("--resource", default=DEFAULT_RESOURCE_PATH, help=".pyxres file")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="runs per benchmark (fastest is kept)")
+    parser.add_argument("--filter", default="", help="only run benchmarks whose name contains this text")
+    parser.add_argument("--output", metavar="FILE", help="write results as JSON")
+    parser.add_argument("--baseline", metavar="FILE", help="compare against a previous JSON result")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown before a benchmark counts as a regression (0.1 = 10%%)")
+    args: argparse.Namespace = parser.parse_args()
+    grid: TileGrid = TileGrid.from_resource(args.resource)
+    failures: List[str] = run_checks(grid)
+    for failure in failures:
+        print(f"CHECK FAILED {failure}")
+    if failures:
+        sys.exit(1)
+    results: Dict[str, Dict[str, float]] = {}
+    for name, bench in BENCHMARKS.items():
+        if args.filter in name:
+            results[name] = run_benchmark(bench, grid, args.repeat)
+            fps: str = f" {results[name]['fps']:>9} fps" if "fps" in results[name] else ""
+            print(f"{name:<36} {results[name]['ns_per_op']:>10.1f} ns/op{fps}")
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions: List[str] = compare(results, json.load(file), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
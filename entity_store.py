@@ -0,0 +1,151 @@
+# coding: utf-8
+# コーディングルール:
+# - すべての変数・関数・戻り値に型アノテーションを必ず付与すること
+# - 定数宣言時は"HOGHOGE"のような文字列は使わない。必ず HOGEHOGE = 1 みたいに宣言する。たくさんある時は enum にする
+# - 1関数につき30行以内を目安に分割
+# - コメントは日本語で記述
+# - 関数宣言したら、関数の機能、引数がある時は引数名と、なんの値を受け取っているかをコメントで書く
+
+import numpy as np
+from enum import IntEnum
+from typing import NamedTuple
+
+# エンティティの種類
+class EntityKind(IntEnum):
+    ENEMY1 = 0   # 壁で折り返して歩く敵
+    ENEMY2 = 1   # 足場の端で折り返して歩く敵
+    ENEMY3 = 2   # プレイヤーに向けて弾を撃つ敵
+    BULLET = 3   # 敵3の弾
+
+INITIAL_CAPACITY = 64  # 配列の初期容量
+NO_SLOT = -1           # 固定容量のストアが満杯で acquire できなかったときの添字
+
+# プールとしての使用状況
+class PoolStats(NamedTuple):
+    live: int        # 生存している要素の数
+    high_water: int  # 同時に使った枠の数の最大値
+    exhausted: int   # 満杯で acquire できなかった回数
+    capacity: int    # 容量
+
+# === エンティティストア ===
+class EntityStore:
+    # 敵と弾を「1つの属性につき1本のNumPy配列」(Struct of Arrays)で保持するクラス
+    # 先頭 count 個が有効な要素。種類ごとの単純な更新は配列演算でまとめて行い、
+    # 死んだ要素は末尾の生存要素と入れ替えて詰める（swap-remove）
+    # fixed=True なら固定容量のプールとして acquire / release で枠を使い回し、使用状況を stats で返す
+    COLUMNS = ("x", "y", "dx", "dy", "direction", "kind", "alive", "timer")
+
+    def __init__(self, capacity: int = INITIAL_CAPACITY, fixed: bool = False):
+        # capacity: 配列の初期容量（fixed が False なら足りなくなったら倍に広げる）
+        # fixed: Trueなら容量を固定したプールとして使う（ゲーム中に配列を作り直さない）
+        self.count: int = 0
+        self.fixed: bool = fixed
+        self.high_water: int = 0  # count の最大値
+        self.exhausted: int = 0   # 満杯で acquire できなかった回数
+        self.x: np.ndarray = np.zeros(capacity, dtype=np.float64)        # X座標
+        self.y: np.ndarray = np.zeros(capacity, dtype=np.float64)        # Y座標
+        self.dx: np.ndarray = np.zeros(capacity, dtype=np.float64)       # X方向の速度
+        self.dy: np.ndarray = np.zeros(capacity, dtype=np.float64)       # Y方向の速度
+        self.direction: np.ndarray = np.zeros(capacity, dtype=np.int8)   # 向き (1:右, -1:左)
+        self.kind: np.ndarray = np.zeros(capacity, dtype=np.int8)        # 種類 (EntityKind)
+        self.alive: np.ndarray = np.zeros(capacity, dtype=np.bool_)      # 生存フラグ
+        self.timer: np.ndarray = np.zeros(capacity, dtype=np.int32)      # 発射までの時間など
+
+    def add(self, kind: EntityKind, x: float, y: float, dx: float = 0, dy: float = 0, direction: int = 0) -> int:
+        # エンティティを末尾に追加し、その添字を返す（固定容量なら容量を広げずに acquire で取り出す）
+        # kind: 種類
+        # x, y: 座標
+        # dx, dy: 速度
+        # direction: 向き
+        if self.fixed:
+            return self.acquire(kind, x, y, dx, dy, direction)
+        if self.count == len(self.x):
+            self._grow()
+        return self._append(kind, x, y, dx, dy, direction)
+
+    def _append(self, kind: EntityKind, x: float, y: float, dx: float, dy: float, direction: int) -> int:
+        # 末尾の空き枠（容量に余裕があること）に要素を追加し、その添字を返す
+        # kind, x, y, dx, dy, direction: add と同じ
+        index: int = self.count
+        self.count += 1
+        self.high_water = max(self.high_water, self.count)
+        self._reset(index, kind, x, y, dx, dy, direction)
+        return index
+
+    def _reset(self, index: int, kind: EntityKind, x: float, y: float, dx: float, dy: float, direction: int) -> None:
+        # 枠 index のすべての属性を設定し直して生存状態にする
+        # index: 枠の添字
+        # kind, x, y, dx, dy, direction: add と同じ
+        self.x[index] = x
+        self.y[index] = y
+        self.dx[index] = dx
+        self.dy[index] = dy
+        self.direction[index] = direction
+        self.kind[index] = kind
+        self.alive[index] = True
+        self.timer[index] = 0
+
+    def acquire(self, kind: EntityKind, x: float, y: float, dx: float = 0, dy: float = 0, direction: int = 0) -> int:
+        # プールから枠を1つ取り出して初期化し、その添字を返す（生成の代わりに枠の値を設定し直す）
+        # 固定容量で末尾に空きがなければ、まだ詰めていない死んだ枠をその場で使い回す（他の要素は動かさない）
+        # それもなければ NO_SLOT を返し、exhausted を数える
+        # kind, x, y, dx, dy, direction: add と同じ
+        if not self.fixed:
+            return self.add(kind, x, y, dx, dy, direction)
+        if self.count < len(self.x):
+            return self._append(kind, x, y, dx, dy, direction)
+        dead: np.ndarray = np.flatnonzero(~self.alive[:self.count])
+        if len(dead) == 0:
+            self.exhausted += 1
+            return NO_SLOT
+        index: int = int(dead[0])
+        self._reset(index, kind, x, y, dx, dy, direction)
+        return index
+
+    def release(self, index: int) -> None:
+        # 枠をプールに返す（次の compact で詰められるか、acquire で使い回される）
+        # index: 返す要素の添字
+        self.alive[index] = False
+
+    def stats(self) -> PoolStats:
+        # プールとしての使用状況を返す
+        return PoolStats(int(np.count_nonzero(self.alive[:self.count])), self.high_water, self.exhausted, len(self.x))
+
+    def _grow(self) -> None:
+        # すべての配列の容量を倍にする
+        for name in self.COLUMNS:
+            column: np.ndarray = getattr(self, name)
+            grown: np.ndarray = np.zeros(len(column) * 2, dtype=column.dtype)
+            grown[:len(column)] = column
+            setattr(self, name, grown)
+
+    def mask(self, kind: EntityKind) -> np.ndarray:
+        # 有効範囲のうち、指定の種類で生存している要素の真偽配列
+        # kind: 種類
+        count: int = self.count
+        return (self.kind[:count] == kind) & self.alive[:count]
+
+    def indices(self, kind: EntityKind) -> np.ndarray:
+        # 指定の種類で生存している要素の添字配列
+        # kind: 種類
+        return np.flatnonzero(self.mask(kind))
+
+    def compact(self) -> None:
+        # 死んだ要素を、末尾側の生存要素を移して埋める（swap-remove）。O(要素数)
+        count: int = self.count
+        dead: np.ndarray = np.flatnonzero(~self.alive[:count])
+        if len(dead) == 0:
+            return
+        new_count: int = count - len(dead)
+        holes: np.ndarray = dead[dead < new_count]                          # 残す範囲にある穴
+        movers: np.ndarray = new_count + np.flatnonzero(self.alive[new_count:count])  # 穴を埋める生存要素
+        for name in self.COLUMNS:
+            column: np.ndarray = getattr(self, name)
+            column[holes] = column[movers]
+        self.alive[new_count:count] = False
+        self.count = new_count
+
+    def clear(self) -> None:
+        # すべての要素を削除する（容量はそのまま）
+        self.alive[:self.count] = False
+        self.count = 0
@@ -0,0 +1,115 @@
+# coding: utf-8
+# コーディングルール:
+# - すべての変数・関数・戻り値に型アノテーションを必ず付与すること
+# - 定数宣言時は"HOGHOGE"のような文字列は使わない。必ず HOGEHOGE = 1 みたいに宣言する。たくさんある時は enum にする
+# - 1関数につき30行以内を目安に分割
+# - コメントは日本語で記述
+# - 関数宣言したら、関数の機能、引数がある時は引数名と、なんの値を受け取っているかをコメントで書く
+
+# リソースファイル(.pyxres)の変更を監視して、タイルマップの変わったタイルだけをゲームに反映するホットリロード
+# 監視と読み込み・差分計算はバックグラウンドのスレッドで行い、メインスレッドはフレームの合間に
+# 差分を受け取って TileEditor で書き換えるだけ（衝突判定・出現位置も変わったタイルの分だけ更新される）。
+# 画像バンク・サウンドの変更は反映しない（タイルマップのみ）。
+
+import os
+import queue
+import threading
+import time
+import tomllib
+import zipfile
+from typing import List, NamedTuple, Tuple
+from tile_grid import TileEditor, load_resource_tiles
+
+POLL_INTERVAL = 0.5  # ファイルの更新を確認する間隔（秒）
+MS_PER_SECOND = 1000
+
+# 1タイル分の変更 (タイルX, タイルY, 新しいタイル画像座標)
+TileChange = Tuple[int, int, Tuple[int, int]]
+
+# 1回のリロードの結果
+class Reload(NamedTuple):
+    changes: List[TileChange]  # 変わったタイル
+    parse_ms: float            # 読み込みと差分計算にかかった時間（ミリ秒）
+
+# タイルマップの2つの版を比べて、変わったタイルの一覧を返す（重なる範囲だけを比べる）
+# old_rows, new_rows: 各行の[u0, v0, u1, v1, ...]リスト
+def diff_tiles(old_rows: List[List[int]], new_rows: List[List[int]]) -> List[TileChange]:
+    changes: List[TileChange] = []
+    for tile_y, (old_row, new_row) in enumerate(zip(old_rows, new_rows)):
+        if old_row == new_row:
+            continue
+        for index in range(0, min(len(old_row), len(new_row)), 2):
+            if old_row[index] != new_row[index] or old_row[index + 1] != new_row[index + 1]:
+                changes.append((index // 2, tile_y, (new_row[index], new_row[index + 1])))
+    return changes
+
+# === 監視スレッド ===
+class ResourceWatcher:
+    # バックグラウンドのスレッドで .pyxres の更新時刻を監視し、変わったらタイルマップを読み直して
+    # 前の版との差分をキューに入れるクラス。メインスレッドは poll / apply で差分を受け取る
+    def __init__(self, path: str, tilemap_index: int = 0, interval: float = POLL_INTERVAL):
+        # path: 監視する .pyxres ファイルのパス
+        # tilemap_index: 差分を取るタイルマップ番号
+        # interval: 更新を確認する間隔（秒）
+        self.path: str = path
+        self.tilemap_index: int = tilemap_index
+        self.interval: float = interval
+        self.stamp: Tuple[int, int] = self._stamp()
+        self.rows: List[List[int]] = load_resource_tiles(path, tilemap_index)[2]
+        self.reloads: queue.Queue[Reload] = queue.Queue()
+        self.stop_event: threading.Event = threading.Event()
+        self.thread: threading.Thread = threading.Thread(target=self._run, name="resource-watcher", daemon=True)
+        self.thread.start()
+
+    def _stamp(self) -> Tuple[int, int]:
+        # ファイルの (更新時刻ns, サイズ)。読めなければ (0, 0)
+        try:
+            status: os.stat_result = os.stat(self.path)
+        except OSError:
+            return 0, 0
+        return status.st_mtime_ns, status.st_size
+
+    def _run(self) -> None:
+        # 監視スレッドの本体。止められるまで一定間隔で更新を確認する
+        while not self.stop_event.wait(self.interval):
+            stamp: Tuple[int, int] = self._stamp()
+            if stamp != self.stamp and self._reload():
+                self.stamp = stamp
+
+    def _reload(self) -> bool:
+        # タイルマップを読み直して差分をキューに入れる。戻り値: 読めたらTrue（書き込み途中なら次の確認で再試行）
+        start: float = time.perf_counter()
+        try:
+            rows: List[List[int]] = load_resource_tiles(self.path, self.tilemap_index)[2]
+        except (OSError, KeyError, IndexError, ValueError, zipfile.BadZipFile, tomllib.TOMLDecodeError):
+            return False
+        changes: List[TileChange] = diff_tiles(self.rows, rows)
+        self.rows = rows
+        if changes:
+            self.reloads.put(Reload(changes, (time.perf_counter() - start) * MS_PER_SECOND))
+        return True
+
+    def poll(self) -> List[Reload]:
+        # 監視スレッドが用意したリロード結果をすべて取り出す（待たない）
+        reloads: List[Reload] = []
+        while True:
+            try:
+                reloads.append(self.reloads.get_nowait())
+            except queue.Empty:
+                return reloads
+
+    def apply(self, editor: TileEditor) -> int:
+        # 用意されたリロード結果を TileEditor で反映する（フレームの合間にメインスレッドから呼ぶ）
+        # editor: タイルマップ・衝突判定・出現位置を書き換える TileEditor
+        # 戻り値: 書き換えたタイルの数
+        count: int = 0
+        for reload in self.poll():
+            for tile_x, tile_y, tile in reload.changes:
+                editor.set_tile(tile_x, tile_y, tile)
+            count += len(reload.changes)
+        return count
+
+    def close(self) -> None:
+        # 監視スレッドを止める
+        self.stop_event.set()
+        self.thread.join()
@@ -0,0 +1,91 @@
+# coding: utf-8
+# コーディングルール:
+# - すべての変数・関数・戻り値に型アノテーションを必ず付与すること
+# - 定数宣言時は"HOGHOGE"のような文字列は使わない。必ず HOGEHOGE = 1 みたいに宣言する。たくさんある時は enum にする
+# - 1関数につき30行以内を目安に分割
+# - コメントは日本語で記述
+# - 関数宣言したら、関数の機能、引数がある時は引数名と、なんの値を受け取っているかをコメントで書く
+
+import pyxel
+from typing import Protocol, Dict
+from enum import IntEnum
+
+# プレイヤー操作に使うキー（値は入力ビットフィールドのビット位置）
+class Key(IntEnum):
+    LEFT = 0
+    RIGHT = 1
+    DOWN = 2
+    SPACE = 3
+
+# 入力ビットフィールドの構成
+# 下位4ビット: そのキーが押されているか（btn）
+# 上位4ビット: そのキーがこのフレームで押されたか（btnp、押した瞬間のエッジ）
+PRESS_SHIFT = 4       # 押した瞬間ビットのシフト量
+HELD_MASK = 0x0F      # 押されているビットのマスク
+
+# Keyとpyxelのキーコードの対応
+PYXEL_KEYS: Dict[Key, int] = {
+    Key.LEFT: pyxel.KEY_LEFT,
+    Key.RIGHT: pyxel.KEY_RIGHT,
+    Key.DOWN: pyxel.KEY_DOWN,
+    Key.SPACE: pyxel.KEY_SPACE,
+}
+
+# === 入力ソース ===
+class InputSource(Protocol):
+    # Playerが入力を読むためのインターフェース（pyxelのbtn/btnpに相当）
+    def btn(self, key: Key) -> bool:
+        # key: 判定するキー。押されていればTrue
+        ...
+
+    def btnp(self, key: Key) -> bool:
+        # key: 判定するキー。このフレームで押された瞬間ならTrue
+        ...
+
+class PyxelInput:
+    # pyxelのキーボード入力をそのまま返す入力ソース（通常のゲーム実行用）
+    def btn(self, key: Key) -> bool:
+        # key: 判定するキー
+        return pyxel.btn(PYXEL_KEYS[key])
+
+    def btnp(self, key: Key) -> bool:
+        # key: 判定するキー
+        return pyxel.btnp(PYXEL_KEYS[key])
+
+    def read_bits(self) -> int:
+        # 現在フレームの入力状態を入力ビットフィールドにまとめて返す
+        bits: int = 0
+        for key in Key:
+            if pyxel.btn(PYXEL_KEYS[key]):
+                bits |= 1 << key
+            if pyxel.btnp(PYXEL_KEYS[key]):
+                bits |= 1 << (key + PRESS_SHIFT)
+        return bits
+
+class ScriptedInput:
+    # プログラムから入力ビットフィールドを設定する入力ソース（ヘッドレス実行・リプレイ用）
+    def __init__(self):
+        # 入力なしの状態で初期化
+        self.bits: int = 0
+
+    def set_bits(self, bits: int) -> None:
+        # 今フレームの入力ビットフィールドをそのまま設定する
+        # bits: 押されているビット（下位4ビット）と押された瞬間ビット（上位4ビット）
+        self.bits = bits
+
+    def hold(self, *keys: Key) -> None:
+        # 今フレームに押されているキーを設定する。押された瞬間ビットは前フレームとの差分から求める
+        # keys: 押されているキー
+        held: int = 0
+        for key in keys:
+            held |= 1 << key
+        pressed: int = held & ~self.bits & HELD_MASK
+        self.bits = held | (pressed << PRESS_SHIFT)
+
+    def btn(self, key: Key) -> bool:
+        # key: 判定するキー
+        return bool(self.bits >> key & 1)
+
+    def btnp(self, key: Key) -> bool:
+        # key: 判定するキー
+        return bool(self.bits >> (key + PRESS_SHIFT) & 1)
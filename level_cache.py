@@ -0,0 +1,159 @@
+# coding: utf-8
+# コーディングルール:
+# - すべての変数・関数・戻り値に型アノテーションを必ず付与すること
+# - 定数宣言時は"HOGHOGE"のような文字列は使わない。必ず HOGEHOGE = 1 みたいに宣言する。たくさんある時は enum にする
+# - 1関数につき30行以内を目安に分割
+# - コメントは日本語で記述
+# - 関数宣言したら、関数の機能、引数がある時は引数名と、なんの値を受け取っているかをコメントで書く
+
+# タイルマップから作る派生データ（タイル種別・敵の出現位置）のディスクキャッシュ
+# リソースファイルの隣に "<リソース名>.cache" として保存し、リソースの内容のハッシュと形式バージョンが
+# 一致すればメモリマップで読み込む（タイルマップの走査をしない）。一致しなければ作り直して保存する。
+#   python level_cache.py --repeat 20    # 作り直し（コールドスタート）とキャッシュ読み込みの時間を表示
+#                                        # （リソースを一時ディレクトリに複製して計測するので、本物のキャッシュは消さない）
+#
+# ファイル形式（リトルエンディアン）:
+#   ヘッダ: マジック"MVLC", 形式バージョン(u16), タイルマップ番号(u16), リソースのハッシュ(16バイト),
+#           幅(u16), 高さ(u16), 出現位置の数(u32)
+#   タイル種別: 幅×高さ バイト（行優先）
+#   出現位置: (種別, X, Y) を i32 で3つずつ（X座標→Y座標順、ピクセル単位）
+
+import argparse
+import hashlib
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+import time
+from array import array
+from typing import List, NamedTuple, Tuple
+from tile_grid import TileGrid, TileKind, SpawnPoint, collect_spawn_points
+from simulation import DEFAULT_RESOURCE_PATH
+
+CACHE_MAGIC = b"MVLC"              # キャッシュファイルのマジック
+CACHE_FORMAT_VERSION = 2           # キャッシュファイルの形式バージョン（形式や分類規則を変えたら上げる）
+CACHE_HEADER_FORMAT = "<4sHH16sHHI"
+CACHE_HEADER_SIZE = struct.calcsize(CACHE_HEADER_FORMAT)
+CACHE_SUFFIX = ".cache"            # キャッシュファイル名の接尾辞
+DIGEST_SIZE = 16                   # リソースのハッシュのバイト数
+SPAWN_FIELDS = 3                   # 出現位置1つあたりの値の数 (種別, X, Y)
+MS_PER_SECOND = 1000
+
+# タイルマップから作る派生データ
+class LevelData(NamedTuple):
+    grid: TileGrid                          # 衝突判定用のタイル種別
+    spawn_points: List[SpawnPoint]          # 敵の出現位置（全行、X座標→Y座標順）
+
+# リソースファイルに対応するキャッシュファイルのパス
+# resource_path: .pyxres ファイルのパス
+def cache_path(resource_path: str) -> str:
+    return resource_path + CACHE_SUFFIX
+
+# リソースファイルの内容のハッシュ
+# resource_path: .pyxres ファイルのパス
+def resource_digest(resource_path: str) -> bytes:
+    with open(resource_path, "rb") as file:
+        return hashlib.blake2b(file.read(), digest_size=DIGEST_SIZE).digest()
+
+# リソースファイルのタイルマップを走査して派生データを作る
+# resource_path: .pyxres ファイルのパス
+# tilemap_index: 対象のタイルマップ番号
+def build_level_data(resource_path: str, tilemap_index: int = 0) -> LevelData:
+    grid: TileGrid = TileGrid.from_resource(resource_path, tilemap_index)
+    return LevelData(grid, collect_spawn_points(grid, grid.height))
+
+# 派生データをキャッシュファイルに書き出す（一時ファイルに書いてから置き換える）
+# path: キャッシュファイルのパス
+# digest: リソースのハッシュ
+# tilemap_index: 対象のタイルマップ番号
+# data: 書き出す派生データ
+def write_cache(path: str, digest: bytes, tilemap_index: int, data: LevelData) -> None:
+    spawns: array = array("i", [value for point in data.spawn_points for value in point])
+    temporary: str = path + ".tmp"
+    with open(temporary, "wb") as file:
+        file.write(struct.pack(CACHE_HEADER_FORMAT, CACHE_MAGIC, CACHE_FORMAT_VERSION, tilemap_index, digest,
+                               data.grid.width, data.grid.height, len(data.spawn_points)))
+        file.write(data.grid.cells)
+        file.write(spawns.tobytes())
+    os.replace(temporary, path)
+
+# キャッシュファイルをメモリマップで読み込む。ハッシュ・バージョンが違う、壊れている、無い場合はNone
+# path: キャッシュファイルのパス
+# digest: 現在のリソースのハッシュ
+# tilemap_index: 対象のタイルマップ番号
+def read_cache(path: str, digest: bytes, tilemap_index: int) -> LevelData | None:
+    try:
+        with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            magic, version, index, cached_digest, width, height, spawn_count = \
+                struct.unpack_from(CACHE_HEADER_FORMAT, data)
+            if (magic, version, index, cached_digest) != (CACHE_MAGIC, CACHE_FORMAT_VERSION, tilemap_index, digest):
+                return None
+            cells_end: int = CACHE_HEADER_SIZE + width * height
+            if len(data) != cells_end + spawn_count * SPAWN_FIELDS * 4:
+                return None
+            grid: TileGrid = TileGrid(width, height, bytearray(data[CACHE_HEADER_SIZE:cells_end]))
+            spawns: array = array("i", data[cells_end:])
+    except (OSError, ValueError, struct.error):
+        return None
+    points: List[SpawnPoint] = [(TileKind(spawns[i]), spawns[i + 1], spawns[i + 2])
+                                for i in range(0, len(spawns), SPAWN_FIELDS)]
+    return LevelData(grid, points)
+
+# 派生データを読み込む。キャッシュが有効ならそれを使い、無効なら作り直してキャッシュを保存する
+# resource_path: .pyxres ファイルのパス
+# tilemap_index: 対象のタイルマップ番号
+def load_level_data(resource_path: str, tilemap_index: int = 0) -> LevelData:
+    digest: bytes = resource_digest(resource_path)
+    path: str = cache_path(resource_path)
+    data: LevelData | None = read_cache(path, digest, tilemap_index)
+    if data is not None:
+        return data
+    data = build_level_data(resource_path, tilemap_index)
+    try:
+        write_cache(path, digest, tilemap_index, data)
+    except OSError:
+        pass  # 書き込めない場所でもゲームは起動できるようにする（次回も作り直す）
+    return data
+
+# 作り直し（キャッシュなし）とキャッシュ読み込みのそれぞれにかかる時間を計測して表示する
+# リソースを一時ディレクトリに複製して計測するので、元のリソースの隣のキャッシュには触れない
+# resource_path: .pyxres ファイルのパス
+# repeat: 計測の回数（最も速い回を表示）
+def measure(resource_path: str, repeat: int) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        copied: str = os.path.join(directory, os.path.basename(resource_path))
+        shutil.copyfile(resource_path, copied)
+        cold, hit = _time_loads(copied, repeat)
+    print(f"cold start (scan + write cache) {min(cold) * MS_PER_SECOND:8.2f} ms")
+    print(f"cache hit  (hash + mmap read)   {min(hit) * MS_PER_SECOND:8.2f} ms  "
+          f"({min(cold) / min(hit):.1f}x faster)")
+
+# キャッシュを消してからの読み込みと、キャッシュがある状態での読み込みをrepeat回ずつ計測する
+# 戻り値: (作り直しの秒数の一覧, キャッシュ読み込みの秒数の一覧)
+# resource_path: 計測に使う（複製した）.pyxres ファイルのパス
+# repeat: 計測の回数
+def _time_loads(resource_path: str, repeat: int) -> Tuple[List[float], List[float]]:
+    cold: List[float] = []
+    hit: List[float] = []
+    for _ in range(repeat):
+        if os.path.exists(cache_path(resource_path)):
+            os.remove(cache_path(resource_path))
+        start: float = time.perf_counter()
+        load_level_data(resource_path)
+        cold.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        load_level_data(resource_path)
+        hit.append(time.perf_counter() - start)
+    return cold, hit
+
+# キャッシュの計測のエントリポイント
+def main() -> None:
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description="derived level data cache")
+    parser.add_argument("--resource", default=DEFAULT_RESOURCE_PATH, help="path to the .pyxres file")
+    parser.add_argument("--repeat", type=int, default=10, help="measurement runs (the fastest is shown)")
+    args: argparse.Namespace = parser.parse_args()
+    measure(args.resource, args.repeat)
+
+if __name__ == "__main__":
+    main()
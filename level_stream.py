@@ -0,0 +1,260 @@
+# coding: utf-8
+# コーディングルール:
+# - すべての変数・関数・戻り値に型アノテーションを必ず付与すること
+# - 定数宣言時は"HOGHOGE"のような文字列は使わない。必ず HOGEHOGE = 1 みたいに宣言する。たくさんある時は enum にする
+# - 1関数につき30行以内を目安に分割
+# - コメントは日本語で記述
+# - 関数宣言したら、関数の機能、引数がある時は引数名と、なんの値を受け取っているかをコメントで書く
+
+# 固定幅の縦帯（チャンク）に分けたレベルファイル(.mvl)と、カメラの位置に合わせてチャンクを読み込むストリーマー
+# レベルファイルはメモリマップで開き、カメラの少し先のチャンクだけをリングバッファに読み込んで、
+# 後ろに流れたチャンクは捨てる。レベルがどれだけ長くても使うメモリは一定。
+#   python level_stream.py convert level.mvl --rows 16 --repeat 100
+#   python level_stream.py scan level.mvl
+#   python main.py --level level.mvl
+#
+# ファイル形式（リトルエンディアン）:
+#   ヘッダ: マジック"MVLV", 形式バージョン(u16), チャンク幅(u16, タイル), 高さ(u16, タイル), 幅(u32, タイル)
+#   チャンク: [タイル種別 高さ×チャンク幅 バイト][タイル画像 (u, v) 高さ×チャンク幅×2 バイト] をチャンク数だけ並べる
+#   （最後のチャンクの幅に満たない部分は空タイル）
+
+import argparse
+import mmap
+import struct
+import time
+import pyxel
+from typing import BinaryIO, Callable, List, Tuple
+from tile_grid import TileGrid, TileKind, TILE_SIZE, load_resource_tiles
+from player import CameraManager
+from simulation import DEFAULT_RESOURCE_PATH
+
+LEVEL_MAGIC = b"MVLV"             # レベルファイルのマジック
+LEVEL_FORMAT_VERSION = 1          # レベルファイルの形式バージョン
+LEVEL_HEADER_FORMAT = "<4sHHHI"   # マジック, 形式バージョン, チャンク幅, 高さ, 幅
+LEVEL_HEADER_SIZE = struct.calcsize(LEVEL_HEADER_FORMAT)
+CHUNK_WIDTH = 16                  # 既定のチャンク幅（タイル単位）
+RESIDENT_CHUNKS = 4               # 既定でリングバッファに置くチャンク数
+SCREEN_COLUMNS = 16               # 画面の幅（タイル単位）
+IMAGE_BYTES_PER_TILE = 2          # タイル画像 (u, v) のバイト数
+
+# タイル座標からタイル画像座標(u, v)を返す関数の型
+TileSource = Callable[[int, int], Tuple[int, int]]
+
+# === レベルファイルの書き出し ===
+# タイルを1チャンクずつレベルファイルに書き出す
+# path: 書き出すファイルのパス
+# width, height: レベルの大きさ（タイル単位）
+# tile_at: (tile_x, tile_y) のタイル画像座標を返す関数
+# chunk_width: チャンク幅（タイル単位）
+def write_level(path: str, width: int, height: int, tile_at: TileSource, chunk_width: int = CHUNK_WIDTH) -> None:
+    with open(path, "wb") as file:
+        file.write(struct.pack(LEVEL_HEADER_FORMAT, LEVEL_MAGIC, LEVEL_FORMAT_VERSION, chunk_width, height, width))
+        for first_column in range(0, width, chunk_width):
+            _write_chunk(file, first_column, min(chunk_width, width - first_column), height, tile_at, chunk_width)
+
+def _write_chunk(file: BinaryIO, first_column: int, columns: int, height: int, tile_at: TileSource,
+                 chunk_width: int) -> None:
+    # 1チャンク分のタイル種別とタイル画像を書き出す
+    # file: 書き出し先
+    # first_column: チャンクの先頭の列（タイル単位）
+    # columns: レベル内に収まる列数（残りは空タイルで埋める）
+    # height: 行数
+    # tile_at: タイル画像座標を返す関数
+    # chunk_width: チャンク幅
+    kinds: bytearray = bytearray(height * chunk_width)
+    images: bytearray = bytearray(height * chunk_width * IMAGE_BYTES_PER_TILE)
+    for tile_y in range(height):
+        for offset in range(columns):
+            tile: Tuple[int, int] = tile_at(first_column + offset, tile_y)
+            index: int = tile_y * chunk_width + offset
+            kinds[index] = TileGrid.classify(tile)
+            images[index * IMAGE_BYTES_PER_TILE:(index + 1) * IMAGE_BYTES_PER_TILE] = bytes(tile)
+    file.write(kinds)
+    file.write(images)
+
+# .pyxres のタイルマップをレベルファイルに変換する
+# resource_path: 元の .pyxres ファイル
+# level_path: 書き出すレベルファイル
+# rows: 上から何行を使うか（0ならタイルマップの高さ全体）
+# repeat: タイルマップを横に何回繰り返すか（長いレベルの確認用）
+# chunk_width: チャンク幅（タイル単位）
+def convert_resource(resource_path: str, level_path: str, rows: int = 0, repeat: int = 1,
+                     chunk_width: int = CHUNK_WIDTH) -> None:
+    width: int
+    height: int
+    tile_rows: List[List[int]]
+    width, height, tile_rows = load_resource_tiles(resource_path, 0)
+    height = min(rows, height) if rows > 0 else height
+
+    def tile_at(tile_x: int, tile_y: int) -> Tuple[int, int]:
+        # 繰り返したレベル上のタイル座標を元のタイルマップの座標に戻して返す
+        column: int = tile_x % width
+        return tile_rows[tile_y][column * 2], tile_rows[tile_y][column * 2 + 1]
+
+    write_level(level_path, width * repeat, height, tile_at, chunk_width)
+
+# === ストリーミング用の衝突判定インデックス ===
+class StreamedGrid(TileGrid):
+    # レベル全体の幅を持ちながら、読み込み済みの列だけをリングバッファ(cells)に保持する TileGrid
+    # 列 tile_x は cells の tile_x % window_columns 列目に入る。読み込まれていない列は空(EMPTY)として扱う
+    # （batch_player / player_env のように cells を直接読むものには使えない）
+    def __init__(self, width: int, height: int, window_columns: int):
+        # width, height: レベル全体の大きさ（タイル単位）
+        # window_columns: リングバッファの列数
+        super().__init__(width, height, bytearray(height * window_columns))
+        self.window_columns: int = window_columns
+        self.first_column: int = 0  # 読み込み済みの最初の列
+        self.end_column: int = 0    # 読み込み済みの最後の列 + 1
+
+    def kind(self, tile_x: int, tile_y: int) -> int:
+        # 指定タイル座標の種別を返す。読み込まれていない列・範囲外はEMPTY
+        # tile_x, tile_y: レベル上のタイル座標
+        if self.first_column <= tile_x < self.end_column and 0 <= tile_y < self.height:
+            return self.cells[tile_y * self.window_columns + tile_x % self.window_columns]
+        return TileKind.EMPTY
+
+    def set_kind(self, tile_x: int, tile_y: int, kind: TileKind) -> int:
+        # 指定タイル座標の種別を書き換え、書き換え前の種別を返す
+        # 読み込まれていない列は書き換えない（次に読み込んだときはファイルの内容に戻る）
+        # tile_x, tile_y: レベル上のタイル座標
+        # kind: 新しい種別
+        old_kind: int = self.kind(tile_x, tile_y)
+        if self.first_column <= tile_x < self.end_column and 0 <= tile_y < self.height:
+            self.cells[tile_y * self.window_columns + tile_x % self.window_columns] = kind
+        return old_kind
+
+# === ストリーマー ===
+class LevelStreamer:
+    # レベルファイルをメモリマップで開き、スクロール量に合わせてチャンクを読み込み・破棄するクラス
+    # CameraManager に attach すると、スクロール量が変わるたびに update が呼ばれる
+    def __init__(self, path: str, resident_chunks: int = RESIDENT_CHUNKS, with_tilemap: bool = False):
+        # path: レベルファイルのパス
+        # resident_chunks: リングバッファに置くチャンク数（画面と前後1チャンクずつが入る数以上）
+        # with_tilemap: Trueなら描画用のpyxelタイルマップ（リングバッファ）も作る
+        self.file: BinaryIO = open(path, "rb")
+        self.data: mmap.mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.chunk_width, height, width = struct.unpack_from(LEVEL_HEADER_FORMAT, self.data)
+        if magic != LEVEL_MAGIC or version != LEVEL_FORMAT_VERSION:
+            raise ValueError(f"not a level file (version {LEVEL_FORMAT_VERSION}): {path}")
+        if resident_chunks < (SCREEN_COLUMNS + 3 * self.chunk_width - 2) // self.chunk_width + 1:
+            raise ValueError(f"resident_chunks={resident_chunks} is too small for chunk width {self.chunk_width}")
+        self.chunk_count: int = -(-width // self.chunk_width)
+        self.kind_bytes: int = height * self.chunk_width  # 1チャンクのタイル種別のバイト数
+        self.grid: StreamedGrid = StreamedGrid(width, height, self.chunk_width * resident_chunks)
+        self.tilemap: pyxel.Tilemap | None = None
+        if with_tilemap:
+            self.tilemap = pyxel.Tilemap(self.grid.window_columns, height, 0)
+        self.first_chunk: int = 0  # 読み込み済みの最初のチャンク
+        self.end_chunk: int = 0    # 読み込み済みの最後のチャンク + 1
+        self.loads: int = 0        # 読み込んだチャンクの延べ数
+
+    def attach(self, camera_manager: CameraManager) -> None:
+        # カメラのスクロールに合わせて読み込むようにし、最大スクロール量をレベルの幅に合わせる
+        # camera_manager: スクロール量を通知するカメラ
+        camera_manager.max_scroll_x = max(self.grid.width - SCREEN_COLUMNS, 0) * TILE_SIZE
+        camera_manager.scroll_listener = self.update
+        self.update(camera_manager.scroll_x)
+
+    def update(self, scroll_x: int) -> None:
+        # 画面と前後1チャンク分の列を読み込み、範囲から外れたチャンクを捨てる
+        # scroll_x: カメラのスクロール量（ピクセル）
+        column: int = scroll_x // TILE_SIZE
+        first: int = max((column - self.chunk_width) // self.chunk_width, 0)
+        end: int = min((column + SCREEN_COLUMNS + self.chunk_width - 1) // self.chunk_width + 1, self.chunk_count)
+        for chunk in range(self.first_chunk, self.end_chunk):
+            if not first <= chunk < end:
+                self._release(chunk)
+        for chunk in range(first, end):
+            if not self.first_chunk <= chunk < self.end_chunk:
+                self._load(chunk)
+        self.first_chunk, self.end_chunk = first, end
+        self.grid.first_column = first * self.chunk_width
+        self.grid.end_column = min(end * self.chunk_width, self.grid.width)
+
+    def _chunk_offset(self, chunk: int) -> int:
+        # チャンクのファイル内の位置（バイト）
+        # chunk: チャンク番号
+        return LEVEL_HEADER_SIZE + chunk * self.kind_bytes * (1 + IMAGE_BYTES_PER_TILE)
+
+    def _load(self, chunk: int) -> None:
+        # チャンクのタイル種別をリングバッファにコピーし、描画用タイルマップにも書き込む
+        # chunk: 読み込むチャンク番号
+        offset: int = self._chunk_offset(chunk)
+        slot: int = chunk * self.chunk_width % self.grid.window_columns
+        window: int = self.grid.window_columns
+        for tile_y in range(self.grid.height):
+            source: int = offset + tile_y * self.chunk_width
+            self.grid.cells[tile_y * window + slot:tile_y * window + slot + self.chunk_width] = \
+                self.data[source:source + self.chunk_width]
+        if self.tilemap is not None:
+            self._load_images(offset + self.kind_bytes, slot)
+        self.loads += 1
+
+    def _load_images(self, offset: int, slot: int) -> None:
+        # チャンクのタイル画像を描画用タイルマップのslot列目から書き込む
+        # offset: チャンクのタイル画像のファイル内の位置
+        # slot: 書き込む先頭の列
+        images: memoryview = memoryview(self.data)[offset:offset + self.kind_bytes * IMAGE_BYTES_PER_TILE]
+        for index in range(self.kind_bytes):
+            tile_y, column = divmod(index, self.chunk_width)
+            self.tilemap.pset(slot + column, tile_y, (images[index * 2], images[index * 2 + 1]))
+        images.release()
+
+    def _release(self, chunk: int) -> None:
+        # 捨てたチャンクのファイルのページをOSに返す（リングバッファの列は次の読み込みで上書きされる）
+        # chunk: 捨てるチャンク番号
+        if not hasattr(mmap, "MADV_DONTNEED"):
+            return
+        start: int = self._chunk_offset(chunk) // mmap.PAGESIZE * mmap.PAGESIZE
+        end: int = self._chunk_offset(chunk + 1)
+        self.data.madvise(mmap.MADV_DONTNEED, start, end - start)
+
+    def draw(self, scroll_x: int, width: int, height: int, colkey: int) -> None:
+        # 描画用タイルマップ（リングバッファ）を画面に描く。リングの端をまたぐときは2回に分ける
+        # scroll_x: スクロール量（ピクセル）
+        # width, height: 描画する大きさ（ピクセル）
+        # colkey: 透明色
+        ring_width: int = self.grid.window_columns * TILE_SIZE
+        map_x: int = scroll_x % ring_width
+        first_width: int = min(width, ring_width - map_x)
+        pyxel.bltm(0, 0, self.tilemap, map_x, 0, first_width, height, colkey)
+        if first_width < width:
+            pyxel.bltm(first_width, 0, self.tilemap, 0, 0, width - first_width, height, colkey)
+
+    def close(self) -> None:
+        # メモリマップとファイルを閉じる
+        self.data.close()
+        self.file.close()
+
+# レベルの端から端までスクロールさせ、チャンクの読み込み回数と時間を表示する
+# path: レベルファイルのパス
+def scan(path: str) -> None:
+    streamer: LevelStreamer = LevelStreamer(path)
+    start: float = time.perf_counter()
+    for scroll_x in range(0, streamer.grid.width * TILE_SIZE, TILE_SIZE):
+        streamer.update(scroll_x)
+    elapsed: float = time.perf_counter() - start
+    print(f"width {streamer.grid.width} tiles  chunks {streamer.chunk_count}  loads {streamer.loads}  "
+          f"resident cells {len(streamer.grid.cells)} bytes  {elapsed * 1e6 / max(streamer.loads, 1):.1f} us/load")
+    streamer.close()
+
+# レベルファイルの変換・確認のエントリポイント
+def main() -> None:
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description="chunked level files")
+    commands = parser.add_subparsers(dest="command", required=True)
+    convert: argparse.ArgumentParser = commands.add_parser("convert", help="convert a .pyxres tilemap")
+    convert.add_argument("level")
+    convert.add_argument("--resource", default=DEFAULT_RESOURCE_PATH, help="source .pyxres file")
+    convert.add_argument("--rows", type=int, default=0, help="rows to keep (0 keeps the full height)")
+    convert.add_argument("--repeat", type=int, default=1, help="repeat the tilemap horizontally")
+    convert.add_argument("--chunk-width", type=int, default=CHUNK_WIDTH)
+    check: argparse.ArgumentParser = commands.add_parser("scan", help="stream a level from end to end")
+    check.add_argument("level")
+    args: argparse.Namespace = parser.parse_args()
+    if args.command == "convert":
+        convert_resource(args.resource, args.level, args.rows, args.repeat, args.chunk_width)
+    else:
+        scan(args.level)
+
+if __name__ == "__main__":
+    main()
@@ -12,40 +12,174 @@
 # w : スプライトの幅
 # h : スプライトの高さ
 
+import argparse
+import atexit
+import time
 import pyxel
 from player import Player, CameraManager
-from typing import NoReturn
+from simulation import Simulation
+from tile_grid import TileGrid, TileEditor
+from input_source import PyxelInput, ScriptedInput, HELD_MASK
+from recording import InputRecorder, DEFAULT_KEYFRAME_INTERVAL
+from profiler import FrameProfiler, Section, NS_PER_US
+from timestep import FixedTimestep
+from level_stream import LevelStreamer
+from hot_reload import ResourceWatcher
+from level_cache import load_level_data
+from telemetry import TelemetryWriter
+from typing import Dict, List, NoReturn
 
 WIN_WIDTH: int = 128  # ウィンドウ幅
 WIN_HEIGHT: int = 128  # ウィンドウ高さ
 TRANSPARENT_COLOR: int = 0  # 透明色として扱う色番号
+FPS: int = 30  # フレームレート（描画）
+# シミュレーションレート（1秒あたりのPlayer.update回数）。Playerの物理定数は1ステップあたりの値なので、
+# 描画と同じにしておく（変えるとゲームの速さが変わる）
+SIM_RATE: int = FPS
+HUD_REFRESH_FRAMES: int = 15  # プロファイラHUDの集計を更新する間隔（フレーム数）
+HUD_LINE_HEIGHT: int = 7  # プロファイラHUDの1行の高さ
+HUD_TEXT_COLOR: int = 7  # プロファイラHUDの文字色
+DEFAULT_PROFILE_CSV: str = "profile.csv"  # プロファイル結果の既定の書き出し先
+RESOURCE_FILE: str = "my_resource.pyxres"  # リソースファイル
+
+# Playerのメソッドと計測区間の対応（プロファイラ用）
+PLAYER_SECTIONS: Dict[str, Section] = {
+    "update": Section.PLAYER_UPDATE,
+    "_update_floor_state": Section.FLOOR_STATE,
+    "_handle_through_floor_action": Section.THROUGH_FLOOR,
+    "_handle_landing_reset": Section.LANDING_RESET,
+    "_handle_input_and_movement": Section.INPUT_MOVE,
+    "_handle_jump": Section.JUMP,
+    "_handle_gravity_and_move": Section.GRAVITY_MOVE,
+    "_handle_boundary_limits": Section.BOUNDARY,
+}
 
 class App:
     # アプリケーション全体を管理するクラス
-    def __init__(self) -> None:
+    def __init__(self, record_path: str | None = None, keyframe_interval: int = DEFAULT_KEYFRAME_INTERVAL,
+                 profile: bool = False, profile_csv: str = DEFAULT_PROFILE_CSV,
+                 level_path: str | None = None, watch: bool = False, telemetry_path: str | None = None) -> None:
         # Appの初期化処理。Pyxelの初期化、リソースロード、プレイヤー生成、メインループ開始。
-        pyxel.init(WIN_WIDTH, WIN_HEIGHT, title="Move Rec", display_scale=4, fps=30)
-        pyxel.load("my_resource.pyxres")
-        
-        # カメラマネージャーを作成
-        self.camera_manager: CameraManager = CameraManager()
-        # プレイヤーを初期位置(60,60)に配置、カメラマネージャーを渡す
-        self.player: Player = Player(60, 60, self.camera_manager)
-        
+        # record_path: 入力を記録するファイルのパス（Noneなら記録しない）
+        # keyframe_interval: 記録にキーフレームを挟む間隔（フレーム数）
+        # profile: Trueなら起動時からフレームの処理時間を計測してHUDを表示する
+        # profile_csv: 計測結果を書き出すCSVファイルのパス
+        # level_path: チャンク分割したレベルファイル(.mvl)のパス（Noneならタイルマップ0番をそのまま使う）
+        # watch: Trueならリソースファイルの変更を監視し、変わったタイルをゲーム中に反映する
+        # telemetry_path: 毎フレームのプレイヤーの状態を書き出すトレースのディレクトリ（Noneなら書き出さない）
+        grid: TileGrid = self._setup("Move Rec", level_path)
+
+        # シミュレーション本体（カメラマネージャー・プレイヤー・衝突判定）を作成
+        self.simulation: Simulation = Simulation(grid, self.frame_input)
+        self.camera_manager: CameraManager = self.simulation.camera_manager
+        if self.streamer is not None:
+            self.streamer.attach(self.camera_manager)
+
+        # リソースファイルのホットリロード（読み込みと差分計算は監視スレッド、反映は update の先頭で行う）
+        self.tile_editor: TileEditor = TileEditor(grid, pyxel.tilemap(0))
+        if watch:
+            self.watcher = ResourceWatcher(RESOURCE_FILE)
+        # プレイヤーは初期位置(60,60)に配置済み
+        self.player: Player = self.simulation.player
+
+        if record_path is not None:
+            self.recorder = InputRecorder(record_path, self.simulation, SIM_RATE, keyframe_interval)
+            # ウィンドウを閉じる・Escキーなど Q 以外で終了したときも記録を閉じる
+            # （pyxel.run は戻らずにプロセスを終了するが、その前に atexit の処理を呼ぶ。close は二重に呼んでもよい）
+            atexit.register(self.recorder.close)
+        # テレメトリ: 列ごとのバッファに貯め、ファイルへの書き込みは別スレッドで行う
+        if telemetry_path is not None:
+            self.telemetry = TelemetryWriter(telemetry_path)
+            atexit.register(self.telemetry.close)  # 記録と同じく Q 以外で終了したときも残りの行を書き出す
+
+        # 固定タイムステップ: 実時間に合わせて1描画フレームあたり必要な回数だけシミュレーションを進める
+        # （描画が遅れてもゲームの速さは変わらず、遅れた分はまとめて進めて追いつく）
+        self.timestep: FixedTimestep = FixedTimestep(SIM_RATE)
+        self.pending_press: int = 0  # まだステップに渡していない「押した瞬間」ビット
+
+        # フレームの処理時間計測（Pキーで計測とHUD表示を切り替え、OキーでCSVに書き出す）
+        self.profile_csv = profile_csv
+        self._attach_profiler()
+        self.profiler.set_enabled(profile)
+
         pyxel.run(self.update, self.draw)
 
+    def _setup(self, title: str, level_path: str | None = None) -> TileGrid:
+        # App と NetplayApp で共通の初期化。Pyxelの初期化、リソースロード、入力、任意機能（記録・テレメトリ・
+        # ホットリロード）の既定値、プロファイラを用意し、衝突判定用のタイルインデックスを返す
+        # title: ウィンドウのタイトル
+        # level_path: チャンク分割したレベルファイル(.mvl)のパス（Noneならタイルマップ0番をそのまま使う）
+        pyxel.init(WIN_WIDTH, WIN_HEIGHT, title=title, display_scale=4, fps=FPS)
+        pyxel.load(RESOURCE_FILE)
+
+        # キーボード入力を毎フレーム入力ビットフィールドに変換してからPlayerに渡す
+        # （記録した値とPlayerが読んだ値が必ず一致するようにするため）
+        self.keyboard: PyxelInput = PyxelInput()
+        self.frame_input: ScriptedInput = ScriptedInput()
+
+        # 任意機能は使うときだけ作る（使わないときはNoneのまま）
+        self.recorder: InputRecorder | None = None
+        self.telemetry: TelemetryWriter | None = None
+        self.watcher: ResourceWatcher | None = None
+
+        # Pキーの計測HUD（計測区間の登録は呼び出し側で行う）
+        self.profiler: FrameProfiler = FrameProfiler()
+        self.profile_csv: str = DEFAULT_PROFILE_CSV
+        self.hud_lines: List[str] = []
+
+        # レベルファイルを指定したときは、カメラの位置に合わせてチャンクを読み込みながら遊ぶ
+        # それ以外は衝突判定用のタイルインデックスをリソースの隣のキャッシュから読み込む（リソースが変わったときだけ作り直す）
+        self.streamer: LevelStreamer | None = None
+        if level_path is not None:
+            self.streamer = LevelStreamer(level_path, with_tilemap=True)
+            return self.streamer.grid
+        return load_level_data(RESOURCE_FILE).grid
+
     def update(self) -> None:
-        # 毎フレーム呼ばれる更新処理。Qキーで終了、プレイヤーの状態更新。
+        # 毎フレーム呼ばれる更新処理。Qキーで終了、リソースのリロード反映、プロファイラの操作、フレームの更新。
         if self._should_quit():
+            self._close_recorder()
             pyxel.quit()
-        self.player.update()
+        if self.watcher is not None:
+            self.watcher.apply(self.tile_editor)
+        self._handle_profiler_keys()
+        self.profiler.next_frame()
+        self._update_frame()
+
+    def _update_frame(self) -> None:
+        # 1描画フレーム分の更新。経過時間に応じた回数だけ、入力の記録とプレイヤーの状態更新を行う
+        # 押した瞬間のビットは最初のステップにだけ渡す（ステップが0回なら次のフレームに持ち越す）
+        bits: int = self.keyboard.read_bits()
+        self.pending_press |= bits & ~HELD_MASK
+        for _ in range(self.timestep.advance(time.perf_counter())):
+            step_bits: int = (bits & HELD_MASK) | self.pending_press
+            self.pending_press = 0
+            self.frame_input.set_bits(step_bits)
+            if self.recorder is not None:
+                self.recorder.record(step_bits)
+            self.simulation.step()
+            if self.telemetry is not None:
+                self.telemetry.record(self.simulation.frame_count, self.player, self.camera_manager.scroll_x)
+
+    def _close_recorder(self) -> None:
+        # 入力記録とテレメトリを書き出して閉じる
+        if self.recorder is not None:
+            self.recorder.close()
+        if self.telemetry is not None:
+            self.telemetry.close()
 
     def _should_quit(self) -> bool:
         # Qキーが押されたか判定。戻り値: Trueなら終了
         return pyxel.btnp(pyxel.KEY_Q)
 
     def draw(self) -> None:
-        # 毎フレーム呼ばれる描画処理。背景・マップ・プレイヤー描画。
+        # 毎フレーム呼ばれる描画処理。フレームの描画と、計測中ならプロファイラHUD。
+        self._draw_frame()
+        if self.profiler.enabled:
+            self._draw_profiler_hud()
+
+    def _draw_frame(self) -> None:
+        # 1フレーム分の描画。背景・マップ・プレイヤー描画。
         self._draw_background()
         self._draw_map()
         self._draw_characters()
@@ -56,7 +190,7 @@ class App:
 
     def _draw_map(self) -> None:
         # タイルマップを描画する（スクロール対応）
-        scroll_x = self.camera_manager.get_scroll_x()
+        scroll_x: int = self.camera_manager.get_scroll_x()
         
         # カメラをリセット（背景描画用）
         self.camera_manager.reset_camera()
@@ -65,18 +199,66 @@ class App:
         # 10_platformer.pyを参考に背景を少し遅くスクロールさせる
         pyxel.bltm(0, 0, 0, (scroll_x // 4) % WIN_WIDTH, WIN_HEIGHT, WIN_WIDTH, WIN_HEIGHT)
         
-        # メインのタイルマップの描画
-        pyxel.bltm(0, 0, 0, scroll_x, 0, WIN_WIDTH, WIN_HEIGHT, TRANSPARENT_COLOR)
+        # メインのタイルマップの描画（ストリーミング中は読み込み済みのチャンクから描く）
+        if self.streamer is not None:
+            self.streamer.draw(scroll_x, WIN_WIDTH, WIN_HEIGHT, TRANSPARENT_COLOR)
+        else:
+            pyxel.bltm(0, 0, 0, scroll_x, 0, WIN_WIDTH, WIN_HEIGHT, TRANSPARENT_COLOR)
 
     def _draw_characters(self) -> None:
         # キャラクターを描画する（カメラ座標系で描画）
         self.camera_manager.set_camera()
-        self.player.draw()
+        self.player.draw(pyxel.frame_count)
+
+    def _attach_profiler(self) -> None:
+        # プロファイラに計測対象のメソッドを登録する
+        self.profiler.attach(self, "_update_frame", Section.APP_UPDATE)
+        self.profiler.attach(self, "_draw_frame", Section.APP_DRAW)
+        self.profiler.attach(self, "_draw_map", Section.DRAW_MAP)
+        self.profiler.attach(self, "_draw_characters", Section.DRAW_CHARACTERS)
+        for name, section in PLAYER_SECTIONS.items():
+            self.profiler.attach(self.player, name, section)
+
+    def _handle_profiler_keys(self) -> None:
+        # Pキーで計測とHUD表示を切り替え、Oキーで計測結果をCSVに書き出す
+        if pyxel.btnp(pyxel.KEY_P):
+            self.profiler.set_enabled(not self.profiler.enabled)
+            self.hud_lines = []
+        if pyxel.btnp(pyxel.KEY_O):
+            self.profiler.dump_csv(self.profile_csv)
+
+    def _draw_profiler_hud(self) -> None:
+        # 区間ごとの処理時間の p50 / p99（マイクロ秒）を画面左上に表示する
+        # 集計はHUD_REFRESH_FRAMESフレームごとに行い、その間は前回の結果を表示する
+        if not self.hud_lines or pyxel.frame_count % HUD_REFRESH_FRAMES == 0:
+            self.hud_lines = ["SECTION         P50US P99US"]
+            for section in Section:
+                p50, p99 = self.profiler.percentiles(section)
+                self.hud_lines.append(f"{section.name[:15]:<15} {p50 // NS_PER_US:>5} {p99 // NS_PER_US:>5}")
+        self.camera_manager.reset_camera()
+        pyxel.rect(0, 0, WIN_WIDTH, HUD_LINE_HEIGHT * len(self.hud_lines), 0)
+        for line_number, line in enumerate(self.hud_lines):
+            pyxel.text(1, 1 + line_number * HUD_LINE_HEIGHT, line, HUD_TEXT_COLOR)
 
 # アプリケーションのエントリポイント
 # 戻り値: なし（NoReturn）
 def main() -> NoReturn:
-    App()
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description="Move Rec")
+    parser.add_argument("--record", metavar="FILE", help="record inputs to FILE")
+    parser.add_argument("--keyframe-interval", type=int, default=DEFAULT_KEYFRAME_INTERVAL,
+                        help="frames between state snapshots in the recording")
+    parser.add_argument("--profile", action="store_true", help="start with frame timing and the HUD enabled")
+    parser.add_argument("--profile-csv", metavar="FILE", default=DEFAULT_PROFILE_CSV,
+                        help="file written when O is pressed (frame timings in ns)")
+    parser.add_argument("--level", metavar="FILE", help="stream a chunked level file (see level_stream.py)")
+    parser.add_argument("--watch", action="store_true",
+                        help=f"reload changed tiles while running when {RESOURCE_FILE} is saved")
+    parser.add_argument("--telemetry", metavar="DIR", help="write per-frame player state to DIR (see telemetry.py)")
+    args: argparse.Namespace = parser.parse_args()
+    if args.watch and args.level is not None:
+        parser.error("--watch cannot be combined with --level")
+    App(args.record, args.keyframe_interval, args.profile, args.profile_csv, args.level, args.watch,
+        args.telemetry)
     raise SystemExit
 
 if __name__ == "__main__":
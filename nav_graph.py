@@ -0,0 +1,354 @@
+# coding: utf-8
+# コーディングルール:
+# - すべての変数・関数・戻り値に型アノテーションを必ず付与すること
+# - 定数宣言時は"HOGHOGE"のような文字列は使わない。必ず HOGEHOGE = 1 みたいに宣言する。たくさんある時は enum にする
+# - 1関数につき30行以内を目安に分割
+# - コメントは日本語で記述
+# - 関数宣言したら、関数の機能、引数がある時は引数名と、なんの値を受け取っているかをコメントで書く
+
+# タイルマップから一度だけ作る経路探索用のナビゲーショングラフと、結果をキャッシュするA*探索
+# ノードは「立てるタイル」（壁・すり抜け床の真上の空きタイル）、辺は歩く・落ちる・ジャンプ・すり抜け床を降りるの4種類。
+# ジャンプで届く範囲は、ジャンプの初速・重力・落下速度の上限・横移動の速度から放物線をシミュレーションして決める。
+# 探索結果は (始点ノード, 終点ノード) をキーに保存し、経路の途中のノードから同じ終点への経路も同時に登録するので、
+# 経路に沿って進む間は辞書を引くだけで次の辺が分かる。TileEditor でタイルが変わるとキャッシュを捨て、次の探索の前に作り直す。
+#   python nav_graph.py --rows 16 --queries 2000    # グラフの構築時間と、探索・キャッシュ済みの問い合わせ時間を表示
+
+import argparse
+import heapq
+import random
+import time
+from array import array
+from enum import IntEnum
+from typing import Dict, List, NamedTuple, Tuple
+from tile_grid import TileGrid, TileKind, TileEditor, TILE_SIZE
+from player import RUN_SPEED, JUMP_SPEED, GRAVITY, MAX_FALL_SPEED
+from simulation import DEFAULT_RESOURCE_PATH
+
+NO_NODE = -1              # ノードが無いことを表す番号
+JUMP_DROP_TILES = 4       # ジャンプの辺を作る、着地点が踏み切り位置より低い段数の上限（それより下は落下の辺で扱う）
+WALK_COST = 1.0           # 1タイル歩く辺のコスト
+FALL_COST_PER_ROW = 0.5   # 落下・すり抜けの辺で1段下がるごとに加えるコスト
+JUMP_COST = 2.0           # ジャンプの辺に加えるコスト（横の移動量と上がる段数に足す）
+CACHE_LIMIT = 8192        # 保存する経路の数の上限（超えたら全部捨てる）
+MS_PER_SECOND = 1000
+US_PER_SECOND = 1_000_000
+
+# 辺の種類
+class EdgeKind(IntEnum):
+    WALK = 0   # 同じ高さの隣のタイルへ歩く
+    FALL = 1   # 足場の端から隣の列へ歩き出して落ちる
+    JUMP = 2   # ジャンプして別の足場に乗る
+    DROP = 3   # すり抜け床を下に降りる
+
+# ジャンプの軌道を決める物理定数（ピクセル/フレーム）
+class JumpProfile(NamedTuple):
+    launch_speed: int    # 踏み切ったフレームの上昇量
+    gravity: int         # 1フレームごとの上昇量の減り
+    max_fall_speed: int  # 落下速度の上限
+    run_speed: int       # 空中の横移動の速度
+
+# グラフの辺（ノードごとの出ていく辺の一覧に入れる）
+class Edge(NamedTuple):
+    target: int        # 行き先のノード
+    kind: EdgeKind     # 辺の種類
+    cost: float        # 辺のコスト（横に進むタイル数以上。A*のヒューリスティックが過大評価にならないようにする）
+
+# player.py の Player のジャンプ（ジャンプした瞬間の速度は同じフレームの重力で1減ってから移動する）
+PLAYER_JUMP = JumpProfile(JUMP_SPEED - GRAVITY, GRAVITY, MAX_FALL_SPEED, RUN_SPEED)
+
+# ジャンプの軌道を、踏み切ってから踏み切り位置より JUMP_DROP_TILES 段下まで落ちるまでの
+# 各フレームの (横移動量, 上昇量) ピクセルの一覧で返す（横に進み続けた場合）
+# profile: ジャンプの軌道を決める物理定数
+def jump_arc(profile: JumpProfile) -> List[Tuple[int, int]]:
+    arc: List[Tuple[int, int]] = []
+    x: int = 0
+    rise: int = 0
+    speed: int = profile.launch_speed
+    while rise > -JUMP_DROP_TILES * TILE_SIZE:
+        x += profile.run_speed
+        rise += speed
+        speed = max(speed - profile.gravity, -profile.max_fall_speed)
+        arc.append((x, rise))
+    return arc
+
+# 軌道のうち、踏み切り位置より rise 段上（負なら下）の足場に着地するフレームの番号
+# （下り始めてから初めてその高さ以下になるフレーム。その高さまで上がらなければ -1）
+# arc: jump_arc の軌道
+# rise: 着地する足場の段数
+def landing_frame(arc: List[Tuple[int, int]], rise: int) -> int:
+    for frame in range(1, len(arc)):
+        if arc[frame][1] <= rise * TILE_SIZE and arc[frame][1] < arc[frame - 1][1]:
+            return frame
+    return -1
+
+# 踏み切り位置より rise 段上（負なら下）の足場に、横に何タイル先まで届くかを返す
+# （着地するフレームまでの横移動量を、踏み切りのタイルの中央から体の中心が乗るタイルに換算する）
+# arc: jump_arc の軌道
+def jump_reach(arc: List[Tuple[int, int]]) -> Dict[int, int]:
+    apex: int = max(height for _, height in arc)
+    return {rise: (arc[landing_frame(arc, rise)][0] + TILE_SIZE // 2) // TILE_SIZE
+            for rise in range(-JUMP_DROP_TILES, apex // TILE_SIZE + 1)}
+
+# 1つのジャンプの辺の候補（踏み切りのタイルからの相対位置で表す）
+class JumpMove(NamedTuple):
+    offset: int                        # 着地する足場までの横のタイル数（負なら左）
+    rise: int                          # 着地する足場までの段数（負なら下）
+    solid_cells: List[Tuple[int, int]]  # 壁があると塞がれるタイル（上昇中に体が重なるタイル）
+    floor_cells: List[Tuple[int, int]]  # 壁かすり抜け床があると塞がれるタイル（下降中に体が重なるタイル）
+
+# 踏み切りのタイルの中央から、着地するタイルの中央に着いたら横移動をやめる軌道で跳んだときに
+# 着地までに体（8x8）が重なるタイルを、踏み切りのタイルからの相対位置で返す（着地するタイルまで届かなければNone）
+# arc: jump_arc の軌道
+# offset, rise: 着地する足場までの横のタイル数（負なら左）と段数（負なら下）
+def jump_move(arc: List[Tuple[int, int]], offset: int, rise: int) -> JumpMove | None:
+    goal: int = abs(offset) * TILE_SIZE
+    frame: int = landing_frame(arc, rise)
+    if arc[frame][0] < goal - TILE_SIZE // 2:
+        return None
+    solid: Dict[Tuple[int, int], None] = {}
+    floor: Dict[Tuple[int, int], None] = {}
+    for index in range(frame):
+        x: int = min(arc[index][0], goal) * (1 if offset >= 0 else -1)
+        y: int = -arc[index][1]
+        cells: Dict[Tuple[int, int], None] = floor if index > 0 and arc[index][1] < arc[index - 1][1] else solid
+        for row in range(y // TILE_SIZE, (y + TILE_SIZE - 1) // TILE_SIZE + 1):
+            for column in range(x // TILE_SIZE, (x + TILE_SIZE - 1) // TILE_SIZE + 1):
+                cells[(column, row)] = None
+    return JumpMove(offset, rise, [cell for cell in solid if cell not in floor], list(floor))
+
+# ジャンプの辺の候補をすべて作る（隣へ歩けば着くもの・その場で跳んで同じ高さか下に着くものは除く）
+# arc: jump_arc の軌道
+def jump_moves(arc: List[Tuple[int, int]]) -> List[JumpMove]:
+    moves: List[JumpMove] = []
+    for rise, reach in jump_reach(arc).items():
+        for offset in range(-reach, reach + 1):
+            if (rise == 0 and abs(offset) <= 1) or (offset == 0 and rise <= 0):
+                continue
+            move: JumpMove | None = jump_move(arc, offset, rise)
+            if move is not None:
+                moves.append(move)
+    return moves
+
+class NavGraph:
+    # タイルインデックスの上から rows 行を対象にしたナビゲーショングラフ。ノードは行→列順に番号を付け、
+    # node_x / node_y にタイル座標、edges に出ていく辺の一覧を持つ。タイルが変わったら dirty にして次の探索の前に作り直す
+    def __init__(self, grid: TileGrid, rows: int, profile: JumpProfile = PLAYER_JUMP):
+        # grid: 対象のタイルインデックス
+        # rows: 対象にする行数（10_platformer.py のように下半分を背景に使うマップでは画面の高さ）
+        # profile: ジャンプの軌道を決める物理定数（辺に沿って動くキャラクターのもの）
+        self.grid: TileGrid = grid
+        self.rows: int = min(rows, grid.height)
+        self.jumps: List[JumpMove] = jump_moves(jump_arc(profile))
+        self.node_x: List[int] = []
+        self.node_y: List[int] = []
+        self.edges: List[List[Edge]] = []
+        self.node_index: array = array("i")  # タイル (行優先) → ノード番号（ノードでなければ NO_NODE）
+        self.paths: Dict[Tuple[int, int], List[Edge] | None] = {}  # (始点, 終点) → 経路の辺（届かなければNone）
+        self.hits: int = 0       # キャッシュで答えた問い合わせの数
+        self.searches: int = 0   # A*で探索した問い合わせの数
+        self.builds: int = 0     # グラフを作った回数
+        self.dirty: bool = True
+        self.build()
+
+    def attach(self, editor: TileEditor) -> None:
+        # TileEditor でタイルが書き換えられたら知らせを受けるようにする
+        # editor: 監視する TileEditor
+        editor.add_listener(self.on_tile_changed)
+
+    def on_tile_changed(self, tile_x: int, tile_y: int, old_kind: int, new_kind: int) -> None:
+        # タイルの種別が変わったとき（TileEditor のリスナー）。対象の行ならキャッシュを捨てて作り直しを予約する
+        # tile_x, tile_y: 書き換えられたタイル座標
+        # old_kind, new_kind: 書き換え前後の種別
+        if tile_y < self.rows:
+            self.dirty = True
+            self.paths.clear()
+
+    def build(self) -> None:
+        # タイルインデックスを走査してノードと辺を作り直す
+        width: int = self.grid.width
+        self.node_index = array("i", [NO_NODE]) * (width * self.rows)
+        self.node_x, self.node_y = [], []
+        for tile_y in range(self.rows - 1):
+            for tile_x in range(width):
+                if self._standable(tile_x, tile_y):
+                    self.node_index[tile_y * width + tile_x] = len(self.node_x)
+                    self.node_x.append(tile_x)
+                    self.node_y.append(tile_y)
+        self.edges = [self._node_edges(node) for node in range(len(self.node_x))]
+        self.paths.clear()
+        self.dirty = False
+        self.builds += 1
+
+    def _standable(self, tile_x: int, tile_y: int) -> bool:
+        # タイルに立てるか（タイルが壁でもすり抜け床でもなく、真下が壁かすり抜け床。真下も対象の行の中）
+        kind: int = self.grid.kind(tile_x, tile_y)
+        below: int = self.grid.kind(tile_x, tile_y + 1)
+        return kind != TileKind.WALL and kind != TileKind.THROUGH_FLOOR and tile_y + 1 < self.rows and \
+            (below == TileKind.WALL or below == TileKind.THROUGH_FLOOR)
+
+    def node_at(self, tile_x: int, tile_y: int) -> int:
+        # タイル座標のノード番号（ノードでなければ NO_NODE）
+        # tile_x, tile_y: タイル座標
+        if 0 <= tile_x < self.grid.width and 0 <= tile_y < self.rows:
+            return self.node_index[tile_y * self.grid.width + tile_x]
+        return NO_NODE
+
+    def _landing(self, tile_x: int, tile_y: int) -> Tuple[int, int]:
+        # タイルから真下に落ちたときに着地するノードと落ちる段数を返す（壁に当たるか、下に足場が無ければ NO_NODE）
+        # tile_x, tile_y: 落ち始めるタイル座標
+        for row in range(tile_y, self.rows):
+            if self.grid.kind(tile_x, row) == TileKind.WALL:
+                return NO_NODE, 0
+            node: int = self.node_at(tile_x, row)
+            if node != NO_NODE:
+                return node, row - tile_y
+        return NO_NODE, 0
+
+    def _node_edges(self, node: int) -> List[Edge]:
+        # ノードから出ていく辺の一覧を作る
+        # node: ノード番号
+        tile_x: int = self.node_x[node]
+        tile_y: int = self.node_y[node]
+        edges: List[Edge] = []
+        for step in (-1, 1):
+            side: int = self.node_at(tile_x + step, tile_y)
+            if side != NO_NODE:
+                edges.append(Edge(side, EdgeKind.WALK, WALK_COST))
+                continue
+            if self.grid.kind(tile_x + step, tile_y) == TileKind.WALL:
+                continue
+            target, rows = self._landing(tile_x + step, tile_y + 1)
+            if target != NO_NODE:
+                edges.append(Edge(target, EdgeKind.FALL, WALK_COST + (rows + 1) * FALL_COST_PER_ROW))
+        if self.grid.kind(tile_x, tile_y + 1) == TileKind.THROUGH_FLOOR:
+            target, rows = self._landing(tile_x, tile_y + 2)
+            if target != NO_NODE:
+                edges.append(Edge(target, EdgeKind.DROP, WALK_COST + (rows + 1) * FALL_COST_PER_ROW))
+        edges.extend(self._jump_edges(tile_x, tile_y))
+        return edges
+
+    def _jump_edges(self, tile_x: int, tile_y: int) -> List[Edge]:
+        # タイルから踏み切って届く足場への辺の一覧
+        # tile_x, tile_y: 踏み切るタイル座標
+        edges: List[Edge] = []
+        for move in self.jumps:
+            target: int = self.node_at(tile_x + move.offset, tile_y - move.rise)
+            if target != NO_NODE and self._jump_clear(tile_x, tile_y, move):
+                edges.append(Edge(target, EdgeKind.JUMP, abs(move.offset) + JUMP_COST + max(move.rise, 0)))
+        return edges
+
+    def _jump_clear(self, tile_x: int, tile_y: int, move: JumpMove) -> bool:
+        # ジャンプの軌道が塞がれていないか（上昇中は壁、下降中は壁とすり抜け床、画面の上端より上も塞ぐ）
+        # tile_x, tile_y: 踏み切るタイル座標
+        # move: ジャンプの辺の候補
+        for column, row in move.solid_cells:
+            if tile_y + row < 0 or self.grid.kind(tile_x + column, tile_y + row) == TileKind.WALL:
+                return False
+        for column, row in move.floor_cells:
+            if tile_y + row < 0 or self.grid.kind(tile_x + column, tile_y + row) in (TileKind.WALL, TileKind.THROUGH_FLOOR):
+                return False
+        return True
+
+    def locate(self, x: int, y: int) -> int:
+        # 8x8のキャラクターがいる（空中なら真下に落ちて着地する）ノードを返す（無ければ NO_NODE）
+        # 体の中心のタイルを優先し、足場の端で体の片側だけが乗っているときはその側のノードを返す
+        # x, y: キャラクターの左上座標（ピクセル単位）
+        if self.dirty:
+            self.build()
+        column: int = (x + TILE_SIZE // 2) // TILE_SIZE
+        row: int = (y + TILE_SIZE // 2) // TILE_SIZE
+        for tile_x in (column, x // TILE_SIZE, (x + TILE_SIZE - 1) // TILE_SIZE):
+            node: int = self.node_at(tile_x, row)
+            if node != NO_NODE:
+                return node
+        return self._landing(column, row)[0]
+
+    def find_path(self, source: int, target: int) -> List[Edge] | None:
+        # 始点から終点までの経路の辺を返す（同じノードなら空、届かなければNone）。結果はキャッシュする
+        # source, target: 始点・終点のノード番号
+        if self.dirty:
+            self.build()
+        key: Tuple[int, int] = (source, target)
+        if key in self.paths:
+            self.hits += 1
+            return self.paths[key]
+        self.searches += 1
+        path: List[Edge] | None = self._search(source, target)
+        if len(self.paths) >= CACHE_LIMIT:
+            self.paths.clear()
+        self.paths[key] = path
+        if path is not None:
+            # 経路の途中のノードから同じ終点への最短経路は、この経路の残りの部分
+            for index in range(1, len(path)):
+                self.paths[(path[index - 1].target, target)] = path[index:]
+        return path
+
+    def next_step(self, source: int, target: int) -> Edge | None:
+        # 始点から終点へ向かうときに最初に通る辺（同じノードか、届かなければNone）
+        # source, target: 始点・終点のノード番号
+        path: List[Edge] | None = self.find_path(source, target)
+        return path[0] if path else None
+
+    def _search(self, source: int, target: int) -> List[Edge] | None:
+        # A*で始点から終点までの最小コストの経路を探す（ヒューリスティックは横方向のタイル数）
+        # source, target: 始点・終点のノード番号
+        goal_x: int = self.node_x[target]
+        best: Dict[int, float] = {source: 0.0}
+        came_from: Dict[int, Tuple[int, Edge]] = {}
+        heap: List[Tuple[float, float, int]] = [(abs(self.node_x[source] - goal_x), 0.0, source)]
+        while heap:
+            _, cost, node = heapq.heappop(heap)
+            if node == target:
+                return self._walk_back(came_from, source, target)
+            if cost > best[node]:
+                continue
+            for edge in self.edges[node]:
+                next_cost: float = cost + edge.cost
+                if next_cost < best.get(edge.target, float("inf")):
+                    best[edge.target] = next_cost
+                    came_from[edge.target] = (node, edge)
+                    heapq.heappush(heap, (next_cost + abs(self.node_x[edge.target] - goal_x), next_cost, edge.target))
+        return None
+
+    def _walk_back(self, came_from: Dict[int, Tuple[int, Edge]], source: int, target: int) -> List[Edge]:
+        # A*の探索結果を終点からたどって、始点からの辺の並びにする
+        # came_from: ノード → (直前のノード, そこから来た辺)
+        # source, target: 始点・終点のノード番号
+        path: List[Edge] = []
+        node: int = target
+        while node != source:
+            node, edge = came_from[node][0], came_from[node][1]
+            path.append(edge)
+        path.reverse()
+        return path
+
+# グラフの構築時間と、ランダムなノード間の探索（キャッシュなし）・キャッシュ済みの問い合わせの時間を表示する
+# grid: 対象のタイルインデックス
+# rows: 対象にする行数
+# queries: 問い合わせの数
+def measure(grid: TileGrid, rows: int, queries: int) -> None:
+    start: float = time.perf_counter()
+    graph: NavGraph = NavGraph(grid, rows)
+    build_ms: float = (time.perf_counter() - start) * MS_PER_SECOND
+    edge_count: int = sum(len(edges) for edges in graph.edges)
+    print(f"graph: {len(graph.node_x)} nodes, {edge_count} edges, built in {build_ms:.2f} ms")
+    rng: random.Random = random.Random(0)
+    pairs: List[Tuple[int, int]] = [(rng.randrange(len(graph.node_x)), rng.randrange(len(graph.node_x)))
+                                    for _ in range(queries)]
+    for label in ("A* search", "cached"):
+        start = time.perf_counter()
+        reachable: int = sum(graph.find_path(source, target) is not None for source, target in pairs)
+        per_query: float = (time.perf_counter() - start) / queries * US_PER_SECOND
+        print(f"{label:10s} {per_query:10.2f} us/query  ({reachable}/{queries} reachable)")
+
+# ナビゲーショングラフの計測のエントリポイント
+def main() -> None:
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description="navigation graph and cached A*")
+    parser.add_argument("--resource", default=DEFAULT_RESOURCE_PATH, help="path to the .pyxres file")
+    parser.add_argument("--rows", type=int, default=16, help="number of tile rows to include in the graph")
+    parser.add_argument("--queries", type=int, default=2000, help="random node pairs to query")
+    args: argparse.Namespace = parser.parse_args()
+    measure(TileGrid.from_resource(args.resource), args.rows, args.queries)
+
+if __name__ == "__main__":
+    main()
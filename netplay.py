@@ -0,0 +1,434 @@
+# coding: utf-8
+# コーディングルール:
+# - すべての変数・関数・戻り値に型アノテーションを必ず付与すること
+# - 定数宣言時は"HOGHOGE"のような文字列は使わない。必ず HOGEHOGE = 1 みたいに宣言する。たくさんある時は enum にする
+# - 1関数につき30行以内を目安に分割
+# - コメントは日本語で記述
+# - 関数宣言したら、関数の機能、引数がある時は引数名と、なんの値を受け取っているかをコメントで書く
+
+# UDPで毎フレームの入力だけを交換する、2人プレイ用のロールバックネットコード
+# 相手の入力が届くまでは直前の入力が続くと予測して進め、届いた入力が予測と違えば
+# そのフレームのスナップショットまで巻き戻して再シミュレーションする（相手を待って止まらない）。
+#   python netplay.py play --port 7000 --remote 127.0.0.1:7001 --player 0
+#   python netplay.py play --port 7001 --remote 127.0.0.1:7000 --player 1
+#   python netplay.py selftest --latency-ms 120 --loss 0.1 --frames 3000
+
+import argparse
+import random
+import socket
+import struct
+import sys
+import time
+import zlib
+import pyxel
+from collections import deque
+from typing import Callable, Deque, Dict, List, NamedTuple, Tuple
+from player import Player, CameraManager, CameraState, PlayerState, CollisionDetector, PLAYER_START_X, \
+    PLAYER_START_Y
+from tile_grid import TileGrid
+from input_source import ScriptedInput, HELD_MASK
+from recording import KEYFRAME_FORMAT
+from simulation import DEFAULT_RESOURCE_PATH, random_inputs
+from main import App, FPS
+
+PLAYER_COUNT = 2                 # プレイヤー数
+PLAYER_SPACING = 16              # 2人目の初期位置のずれ（ピクセル）
+MAX_PREDICTION_FRAMES = 15       # 相手の入力が確定していないまま先に進めるフレーム数の上限
+MAX_INPUTS_PER_PACKET = 64       # 1パケットに載せる入力の最大数
+PACKET_MAGIC = b"MVNP"           # パケットのマジック
+PACKET_HEADER_FORMAT = "<4sBIIB"  # マジック, 送信者番号, 先頭フレーム, 受信済みフレーム数(ack), 入力数
+PACKET_HEADER_SIZE = struct.calcsize(PACKET_HEADER_FORMAT)
+RECEIVE_BUFFER_SIZE = 2048       # 受信バッファの大きさ（バイト）
+REMOTE_PALETTE = (9, 12)         # 相手プレイヤーの描画で置き換える色 (元の色, 置き換え後の色)
+MS_PER_SECOND = 1000
+
+# 両プレイヤーとカメラの状態のスナップショット
+class GameState(NamedTuple):
+    players: Tuple[PlayerState, ...]
+    cameras: Tuple[CameraState, ...]
+
+# === 2人分のシミュレーション ===
+class TwoPlayerSimulation:
+    # 2人のPlayerを同じマップ上で、同じ順序で進めるシミュレーション（双方の端末で同じ結果になる）
+    # カメラはプレイヤーごとに持ち（ロジックはCameraManagerそのもの）、描画には自分のカメラを使う
+    def __init__(self, grid: TileGrid):
+        # grid: 衝突判定に使うタイルインデックス
+        CollisionDetector.load_grid(grid)
+        self.inputs: List[ScriptedInput] = [ScriptedInput() for _ in range(PLAYER_COUNT)]
+        self.cameras: List[CameraManager] = [CameraManager() for _ in range(PLAYER_COUNT)]
+        self.players: List[Player] = [
+            Player(PLAYER_START_X + index * PLAYER_SPACING, PLAYER_START_Y, self.cameras[index], self.inputs[index])
+            for index in range(PLAYER_COUNT)]
+
+    def step(self, bits: Tuple[int, ...]) -> None:
+        # 両プレイヤーを1フレーム進める
+        # bits: プレイヤー番号順の入力ビットフィールド
+        for player, input_source, player_bits in zip(self.players, self.inputs, bits):
+            input_source.set_bits(player_bits)
+            player.update()
+
+    def snapshot(self) -> GameState:
+        # 現在の状態のスナップショットを返す
+        return GameState(tuple(player.snapshot() for player in self.players),
+                         tuple(camera.snapshot() for camera in self.cameras))
+
+    def restore(self, state: GameState) -> None:
+        # スナップショットの状態に戻す
+        # state: snapshot() で取った状態
+        for player, camera, player_state, camera_state in zip(self.players, self.cameras, state.players,
+                                                              state.cameras):
+            player.restore(player_state)
+            camera.restore(camera_state)
+
+# 状態のチェックサム（双方の端末の状態が一致しているかの確認用）
+# state: 対象の状態
+def state_checksum(state: GameState) -> int:
+    data: bytes = b"".join(struct.pack(KEYFRAME_FORMAT, *player.values(), camera.scroll_x)
+                           for player, camera in zip(state.players, state.cameras))
+    return zlib.crc32(data)
+
+# === 通信 ===
+class UdpTransport:
+    # 相手1人とだけデータグラムをやりとりするノンブロッキングのUDPソケット
+    def __init__(self, port: int, remote: Tuple[str, int] | None = None, host: str = "127.0.0.1"):
+        # port: 受信に使うローカルのポート（0なら空いているポート）
+        # remote: 相手の (ホスト, ポート)。あとから connect_to で設定してもよい
+        # host: 受信に使うローカルのアドレス
+        self.socket: socket.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind((host, port))
+        self.socket.setblocking(False)
+        self.remote: Tuple[str, int] | None = remote
+
+    def address(self) -> Tuple[str, int]:
+        # 受信に使っている (アドレス, ポート)
+        return self.socket.getsockname()
+
+    def connect_to(self, remote: Tuple[str, int]) -> None:
+        # 送信先を設定する
+        # remote: 相手の (ホスト, ポート)
+        self.remote = remote
+
+    def send(self, data: bytes) -> None:
+        # 相手にデータグラムを送る（送れなかった分は捨てる。入力は次のパケットで再送される）
+        # data: 送るデータ
+        try:
+            self.socket.sendto(data, self.remote)
+        except OSError:
+            pass
+
+    def receive(self) -> List[bytes]:
+        # 届いているデータグラムをすべて受け取る
+        packets: List[bytes] = []
+        while True:
+            try:
+                packets.append(self.socket.recv(RECEIVE_BUFFER_SIZE))
+            except (BlockingIOError, ConnectionError):
+                return packets
+
+    def poll(self) -> None:
+        # 遅延させている送信がないので何もしない（LatencyTransport と同じ呼び方をするため）
+        pass
+
+    def close(self) -> None:
+        # ソケットを閉じる
+        self.socket.close()
+
+class LatencyTransport:
+    # 送信に遅延・揺らぎ・パケットロスを加える UdpTransport のラッパー（1台のマシンでの試験用）
+    def __init__(self, transport: UdpTransport, latency_ms: float, jitter_ms: float, loss: float,
+                 clock: Callable[[], float] = time.monotonic, seed: int = 0):
+        # transport: 実際に送受信するトランスポート
+        # latency_ms: 片道の遅延（ミリ秒）
+        # jitter_ms: 遅延の揺らぎの最大値（ミリ秒、0〜この値を加える）
+        # loss: パケットを捨てる確率（0.0〜1.0）
+        # clock: 現在時刻（秒）を返す関数
+        # seed: 乱数シード
+        self.transport: UdpTransport = transport
+        self.latency: float = latency_ms / MS_PER_SECOND
+        self.jitter: float = jitter_ms / MS_PER_SECOND
+        self.loss: float = loss
+        self.clock: Callable[[], float] = clock
+        self.random: random.Random = random.Random(seed)
+        self.queue: Deque[Tuple[float, bytes]] = deque()  # (送信する時刻, データ)。時刻順とは限らない
+
+    def send(self, data: bytes) -> None:
+        # パケットロスの確率で捨て、残りは遅延を加えて送信待ちにする
+        # data: 送るデータ
+        if self.random.random() < self.loss:
+            return
+        self.queue.append((self.clock() + self.latency + self.random.uniform(0, self.jitter), data))
+
+    def poll(self) -> None:
+        # 送信時刻になったデータを送る（揺らぎで順序が入れ替わることもある）
+        now: float = self.clock()
+        waiting: Deque[Tuple[float, bytes]] = deque()
+        for due, data in self.queue:
+            if due <= now:
+                self.transport.send(data)
+            else:
+                waiting.append((due, data))
+        self.queue = waiting
+
+    def receive(self) -> List[bytes]:
+        # 届いているデータグラムをすべて受け取る
+        return self.transport.receive()
+
+    def close(self) -> None:
+        # ソケットを閉じる
+        self.transport.close()
+
+# 入力パケットを作る
+# sender: 送信者のプレイヤー番号
+# first_frame: 先頭の入力のフレーム番号
+# ack: 相手から受け取り済みの連続した入力の数（次に欲しいフレーム番号）
+# inputs: first_frame から順の入力ビットフィールド
+def pack_packet(sender: int, first_frame: int, ack: int, inputs: List[int]) -> bytes:
+    return struct.pack(PACKET_HEADER_FORMAT, PACKET_MAGIC, sender, first_frame, ack, len(inputs)) + bytes(inputs)
+
+# 入力パケットを読む。戻り値: (送信者, 先頭フレーム, ack, 入力の列)。不正なパケットはNone
+# data: 受信したデータ
+def unpack_packet(data: bytes) -> Tuple[int, int, int, bytes] | None:
+    if len(data) < PACKET_HEADER_SIZE:
+        return None
+    magic, sender, first_frame, ack, count = struct.unpack_from(PACKET_HEADER_FORMAT, data)
+    if magic != PACKET_MAGIC or len(data) != PACKET_HEADER_SIZE + count:
+        return None
+    return sender, first_frame, ack, data[PACKET_HEADER_SIZE:]
+
+# === ロールバック ===
+class RollbackSession:
+    # 自分の入力を送り、相手の入力を予測しながら TwoPlayerSimulation を1フレームずつ進めるセッション
+    # 毎フレーム状態のスナップショットを取っておき、予測が外れたら外れたフレームまで戻して進め直す
+    # 入力はackされるまで毎パケットに載せ直すので、パケットが失われても次のパケットで届く
+    def __init__(self, simulation: TwoPlayerSimulation, local_index: int, transport: UdpTransport | LatencyTransport,
+                 max_prediction: int = MAX_PREDICTION_FRAMES):
+        # simulation: 進める2人分のシミュレーション
+        # local_index: 自分のプレイヤー番号（0 または 1）
+        # transport: 相手と入力をやりとりするトランスポート
+        # max_prediction: 相手の入力が確定していないまま先に進めるフレーム数の上限（超えたら待つ）
+        self.simulation: TwoPlayerSimulation = simulation
+        self.local_index: int = local_index
+        self.transport: UdpTransport | LatencyTransport = transport
+        self.max_prediction: int = max_prediction
+        self.frame: int = 0                     # 次に進めるフレーム番号
+        self.local_inputs: List[int] = []       # 自分の入力（フレーム番号順）
+        self.remote_inputs: List[int] = []      # 確定した相手の入力（0から連続した分）
+        self.remote_pending: Dict[int, int] = {}  # 順序が入れ替わって先に届いた相手の入力
+        self.predicted: Dict[int, int] = {}     # 予測で使った相手の入力（まだ確定していないフレーム）
+        self.snapshots: Dict[int, GameState] = {}  # 各フレームを進める前の状態（未確定のフレーム分だけ）
+        self.peer_ack: int = 0                  # 相手が受け取り済みの自分の入力の数
+        self.rollback_from: int | None = None   # 巻き戻しが必要な最初のフレーム
+        self.confirmed_checksums: List[int] = []  # 確定した各フレームの開始時の状態のチェックサム
+        # 統計
+        self.rollbacks: int = 0
+        self.max_rollback_depth: int = 0
+        self.resimulated_frames: int = 0
+        self.stalls: int = 0
+
+    def advance(self, local_bits: int) -> bool:
+        # 相手の入力を受け取り、必要なら巻き戻してから、自分の入力で1フレーム進める
+        # 予測できる上限まで先行していたら進めずに待つ。戻り値: Trueなら1フレーム進めた
+        # local_bits: このフレームの自分の入力ビットフィールド
+        self.poll()
+        if self.frame - len(self.remote_inputs) >= self.max_prediction:
+            self.stalls += 1
+            return False
+        self.local_inputs.append(local_bits)
+        self._simulate_frame(self.frame)
+        self.frame += 1
+        self._send()
+        self._trim()
+        return True
+
+    def poll(self) -> None:
+        # フレームを進めずに、送受信と巻き戻しだけを行う
+        self.transport.poll()
+        self._receive()
+        self._rollback()
+        self._send()
+        self._trim()
+
+    def _simulate_frame(self, frame: int) -> None:
+        # 状態のスナップショットを取ってから、指定フレームを進める（相手の入力が未確定なら予測する）
+        # frame: 進めるフレーム番号
+        self.snapshots[frame] = self.simulation.snapshot()
+        remote_bits: int
+        if frame < len(self.remote_inputs):
+            remote_bits = self.remote_inputs[frame]
+        else:
+            remote_bits = self._predict()
+            self.predicted[frame] = remote_bits
+        local_bits: int = self.local_inputs[frame]
+        if self.local_index == 0:
+            self.simulation.step((local_bits, remote_bits))
+        else:
+            self.simulation.step((remote_bits, local_bits))
+
+    def _predict(self) -> int:
+        # 相手の入力の予測。最後に確定した入力のキーを押し続け、押した瞬間のビットは立たないとみなす
+        if not self.remote_inputs:
+            return 0
+        return self.remote_inputs[-1] & HELD_MASK
+
+    def _rollback(self) -> None:
+        # 予測が外れていたら、外れたフレームの状態に戻して現在のフレームまで進め直す
+        if self.rollback_from is None:
+            return
+        start: int = self.rollback_from
+        self.rollback_from = None
+        self.simulation.restore(self.snapshots[start])
+        for frame in range(start, self.frame):
+            self._simulate_frame(frame)
+        self.rollbacks += 1
+        self.max_rollback_depth = max(self.max_rollback_depth, self.frame - start)
+        self.resimulated_frames += self.frame - start
+
+    def _receive(self) -> None:
+        # 届いたパケットから相手の入力とackを取り込む
+        for data in self.transport.receive():
+            packet: Tuple[int, int, int, bytes] | None = unpack_packet(data)
+            if packet is None or packet[0] == self.local_index:
+                continue
+            _, first_frame, ack, inputs = packet
+            self.peer_ack = max(self.peer_ack, ack)
+            for offset, bits in enumerate(inputs):
+                if first_frame + offset >= len(self.remote_inputs):
+                    self.remote_pending[first_frame + offset] = bits
+            self._confirm_pending()
+
+    def _confirm_pending(self) -> None:
+        # 連続して揃った相手の入力を確定させ、予測と違っていたら巻き戻しを予約する
+        while len(self.remote_inputs) in self.remote_pending:
+            frame: int = len(self.remote_inputs)
+            bits: int = self.remote_pending.pop(frame)
+            self.remote_inputs.append(bits)
+            if frame in self.predicted and self.predicted.pop(frame) != bits:
+                self.rollback_from = frame if self.rollback_from is None else min(self.rollback_from, frame)
+
+    def _send(self) -> None:
+        # 相手がまだ受け取っていない自分の入力を、ackと一緒に送る
+        first_frame: int = self.peer_ack
+        inputs: List[int] = self.local_inputs[first_frame:first_frame + MAX_INPUTS_PER_PACKET]
+        self.transport.send(pack_packet(self.local_index, first_frame, len(self.remote_inputs), inputs))
+
+    def _trim(self) -> None:
+        # 両者の入力が確定したフレームのスナップショットを捨てる（捨てる前にチェックサムを残す）
+        confirmed: int = min(len(self.remote_inputs), self.frame)
+        if self.rollback_from is not None:
+            confirmed = min(confirmed, self.rollback_from)
+        for frame in range(len(self.confirmed_checksums), confirmed):
+            self.confirmed_checksums.append(state_checksum(self.snapshots.pop(frame)))
+
+    def synced(self) -> bool:
+        # 相手の入力がすべて確定し、相手も自分の入力をすべて受け取っているか
+        return len(self.remote_inputs) == self.frame and self.peer_ack == self.frame
+
+# === 2人プレイ用のApp ===
+class NetplayApp(App):
+    # main.py の App を2人プレイ用にしたもの。自分の入力は RollbackSession を通してシミュレーションに渡す
+    # 描画は自分のカメラで行い、相手のプレイヤーは色を置き換えて描く
+    def __init__(self, local_index: int, transport: UdpTransport | LatencyTransport) -> None:
+        # local_index: 自分のプレイヤー番号（0 または 1）
+        # transport: 相手と入力をやりとりするトランスポート
+        # ウィンドウ・入力・プロファイラの用意とレベルの読み込みは App と共通（記録などの任意機能は使わない）
+        grid: TileGrid = self._setup(f"Move Rec (P{local_index + 1})")
+        self.local_index: int = local_index
+        self.two_players: TwoPlayerSimulation = TwoPlayerSimulation(grid)
+        self.session: RollbackSession = RollbackSession(self.two_players, local_index, transport)
+        self.camera_manager: CameraManager = self.two_players.cameras[local_index]
+        self.player: Player = self.two_players.players[local_index]
+        pyxel.run(self.update, self.draw)
+
+    def _update_frame(self) -> None:
+        # 自分の入力で1フレーム進める（相手を待っている間は送受信だけ行う）
+        self.session.advance(self.keyboard.read_bits())
+
+    def _draw_frame(self) -> None:
+        # 背景・マップ・両プレイヤーを自分のカメラで描画する
+        self._draw_background()
+        self._draw_map()
+        self.camera_manager.set_camera()
+        for index, player in enumerate(self.two_players.players):
+            if index != self.local_index:
+                pyxel.pal(*REMOTE_PALETTE)
+            player.draw(pyxel.frame_count)
+            pyxel.pal()
+
+# === ループバックでの自己テスト ===
+# 2つのセッションをループバックのUDPでつなぎ、遅延とパケットロスを加えてランダム入力で進める
+# 仮想時計で1フレームずつ進めるので実時間は待たない。戻り値: 確定した状態が双方で一致したか
+# frames: 進めるフレーム数
+# latency_ms: 片道の遅延（ミリ秒）
+# jitter_ms: 遅延の揺らぎ（ミリ秒）
+# loss: パケットロスの確率
+# seed: 乱数シード
+def self_test(frames: int, latency_ms: float, jitter_ms: float, loss: float, seed: int) -> bool:
+    clock: List[float] = [0.0]
+    sockets: List[UdpTransport] = [UdpTransport(0) for _ in range(PLAYER_COUNT)]
+    sockets[0].connect_to(sockets[1].address())
+    sockets[1].connect_to(sockets[0].address())
+    grid: TileGrid = TileGrid.from_resource(DEFAULT_RESOURCE_PATH)
+    sessions: List[RollbackSession] = [
+        RollbackSession(TwoPlayerSimulation(grid), index,
+                        LatencyTransport(sockets[index], latency_ms, jitter_ms, loss, lambda: clock[0], seed + index))
+        for index in range(PLAYER_COUNT)]
+    inputs: List[List[int]] = [random_inputs(frames, seed + index) for index in range(PLAYER_COUNT)]
+    ticks: int = 0
+    while not all(session.frame == frames and session.synced() for session in sessions):
+        clock[0] += 1.0 / FPS
+        ticks += 1
+        for session, session_inputs in zip(sessions, inputs):
+            if session.frame < frames:
+                session.advance(session_inputs[session.frame])
+            else:
+                session.poll()
+    for session in sessions:
+        session.transport.close()
+    return _report(sessions, ticks)
+
+# 自己テストの結果を表示する。戻り値: 確定した状態が双方で一致したか
+# sessions: 終了した2つのセッション
+# ticks: かかった仮想フレーム数
+def _report(sessions: List[RollbackSession], ticks: int) -> bool:
+    for session in sessions:
+        print(f"P{session.local_index + 1}: frames {session.frame}  rollbacks {session.rollbacks}  "
+              f"resimulated {session.resimulated_frames}  max depth {session.max_rollback_depth}  "
+              f"stalls {session.stalls}")
+    final: List[int] = [state_checksum(session.simulation.snapshot()) for session in sessions]
+    first, second = (session.confirmed_checksums for session in sessions)
+    mismatch: int = next((frame for frame, (a, b) in enumerate(zip(first, second)) if a != b), -1)
+    print(f"ticks {ticks}  confirmed {len(first)}  final checksum {final[0]:08x} / {final[1]:08x}")
+    if mismatch >= 0:
+        print(f"desync at frame {mismatch}")
+    return mismatch < 0 and final[0] == final[1] and len(first) == len(second)
+
+# "ホスト:ポート" を (ホスト, ポート) に変換する
+# text: "127.0.0.1:7001" のような文字列
+def parse_address(text: str) -> Tuple[str, int]:
+    host, _, port = text.rpartition(":")
+    return host, int(port)
+
+# 2人プレイ・自己テストのエントリポイント
+def main() -> None:
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description="rollback netplay for two players")
+    commands = parser.add_subparsers(dest="command", required=True)
+    play: argparse.ArgumentParser = commands.add_parser("play", help="play against a peer over UDP")
+    play.add_argument("--port", type=int, required=True, help="local UDP port")
+    play.add_argument("--remote", type=parse_address, required=True, help="peer address as HOST:PORT")
+    play.add_argument("--player", type=int, choices=range(PLAYER_COUNT), required=True, help="local player number")
+    test: argparse.ArgumentParser = commands.add_parser("selftest", help="run two headless peers over loopback")
+    test.add_argument("--frames", type=int, default=3000)
+    test.add_argument("--seed", type=int, default=0)
+    for sub in (play, test):
+        sub.add_argument("--latency-ms", type=float, default=0.0, help="injected one-way latency")
+        sub.add_argument("--jitter-ms", type=float, default=0.0, help="injected random extra latency")
+        sub.add_argument("--loss", type=float, default=0.0, help="injected packet loss probability")
+    args: argparse.Namespace = parser.parse_args()
+    if args.command == "selftest":
+        sys.exit(0 if self_test(args.frames, args.latency_ms, args.jitter_ms, args.loss, args.seed) else 1)
+    transport: LatencyTransport = LatencyTransport(UdpTransport(args.port, args.remote, host=""),
+                                                   args.latency_ms, args.jitter_ms, args.loss)
+    NetplayApp(args.player, transport)
+
+if __name__ == "__main__":
+    main()
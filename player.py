@@ -7,8 +7,12 @@
 # - 関数宣言したら、関数の機能、引数がある時は引数名と、なんの値を受け取っているかをコメントで書く
 
 import pyxel
-from typing import Tuple
+import struct
+import zlib
+from typing import Callable, Tuple
 from enum import Enum, auto
+from tile_grid import TileGrid, TileKind
+from input_source import InputSource, PyxelInput, Key
 
 # === 定数 ===
 TILE_SIZE = 8
@@ -16,6 +20,10 @@ SPRITE_SIZE = 8
 ANIMATION_SPEED = 4
 ANIMATION_FRAMES = 3
 
+# プレイヤーの初期位置
+PLAYER_START_X = 60
+PLAYER_START_Y = 60
+
 # スクロール関連定数
 SCROLL_BORDER_X = 80   # プレイヤーが画面端に到達した際にスクロールを開始するX座標の境界
 TILEMAP_WIDTH = 240    # タイルマップの幅（タイル単位）
@@ -40,31 +48,104 @@ SPR_RIGHT = 0
 SPR_DOWN = 24
 SPR_UP = 48
 
-# タイル定数
-WALL_TILE_X = 4 #乗っかれる壁床タイルタイプ
-TILE_FLOOR = (1, 0)  # ジャンプで通り抜けられる床のイメージ座標
+# タイル定数（WALL_TILE_X: 乗っかれる壁床タイルタイプ、TILE_FLOOR: ジャンプで通り抜けられる床）は tile_grid で定義
+
+# プレイヤーの当たり判定（左右の端）のX座標オフセット
+HIT_LEFT = 1                 # 当たり判定の左端（スプライト左端からのオフセット）
+HIT_RIGHT = SPRITE_SIZE - 2  # 当たり判定の右端（スプライト左端からのオフセット）
 
 # プレイヤーの足元の当たり判定オフセット（左右の端から内側に何ピクセル狭めるか）
 FOOT_COLLISION_INSET_LEFT = 0   # 足元判定の左端オフセット（0ならスプライトの左端）
 FOOT_COLLISION_INSET_RIGHT = 0  # 足元判定の右端オフセット（0ならスプライトの右端）
 
+# プレイヤーの移動・ジャンプの物理定数（ピクセル/フレーム）
+RUN_SPEED = 2        # 左右移動の速度
+JUMP_SPEED = 7       # ジャンプした瞬間の上向きの速度（同じフレームの重力で1減ってから移動する）
+GRAVITY = 1          # 1フレームごとの落下速度の増加量
+MAX_FALL_SPEED = 3   # 落下速度の上限
+
+# 状態のチェックサム（決定性の確認用）: PlayerState.values() の並び + スクロール量をこの形式で詰めてCRC32に畳み込む
+CHECKSUM_STRUCT = struct.Struct("<iihhBBhiBBBBBhi")
+CHECKSUM_SEED = 0    # 1フレームも進めていないときのチェックサム
+
+# === 状態のスナップショット ===
+class CameraState:
+    # CameraManagerの状態（スナップショット用）
+    __slots__ = ("scroll_x",)
+
+    def __init__(self, scroll_x: int):
+        # scroll_x: スクロール量
+        self.scroll_x: int = scroll_x
+
+class PlayerState:
+    # Playerの状態だけを固定の並びで持つスナップショット（movement_handler等の参照は含まない）
+    # deepcopyを使わずに snapshot / restore で属性を直接写すので、ロールバックや探索で大量に使える
+    __slots__ = ("x", "y", "dx", "dy", "direction", "is_on_ground", "jump_count", "jump_start_y",
+                 "is_jumping", "skip_jump", "floor_state", "was_on_ground", "jump_input", "coyote_timer")
+
+    def __init__(self, x: int, y: int, dx: int, dy: int, direction: 'Direction', is_on_ground: bool,
+                 jump_count: int, jump_start_y: int, is_jumping: bool, skip_jump: bool,
+                 floor_state: 'FloorState', was_on_ground: bool, jump_input: bool, coyote_timer: int):
+        # 各引数: 同名のPlayerの属性（jump_input は Player._jump_input）
+        self.x: int = x
+        self.y: int = y
+        self.dx: int = dx
+        self.dy: int = dy
+        self.direction: Direction = direction
+        self.is_on_ground: bool = is_on_ground
+        self.jump_count: int = jump_count
+        self.jump_start_y: int = jump_start_y
+        self.is_jumping: bool = is_jumping
+        self.skip_jump: bool = skip_jump
+        self.floor_state: FloorState = floor_state
+        self.was_on_ground: bool = was_on_ground
+        self.jump_input: bool = jump_input
+        self.coyote_timer: int = coyote_timer
+
+    def values(self) -> Tuple:
+        # 状態を整数と真偽値だけのタプルにする（列挙型は値に変換。struct.packに渡す用）
+        return (self.x, self.y, self.dx, self.dy, self.direction.value, self.is_on_ground, self.jump_count,
+                self.jump_start_y, self.is_jumping, self.skip_jump, self.floor_state.value, self.was_on_ground,
+                self.jump_input, self.coyote_timer)
+
+    @classmethod
+    def from_values(cls, values: Tuple) -> 'PlayerState':
+        # values() の形のタプル（struct.unpackの結果など）から状態を作る
+        # values: 状態のタプル
+        (x, y, dx, dy, direction, is_on_ground, jump_count, jump_start_y, is_jumping, skip_jump,
+         floor_state, was_on_ground, jump_input, coyote_timer) = values
+        return cls(x, y, dx, dy, Direction(direction), bool(is_on_ground), jump_count, jump_start_y,
+                   bool(is_jumping), bool(skip_jump), FloorState(floor_state), bool(was_on_ground),
+                   bool(jump_input), coyote_timer)
+
+    def __eq__(self, other: object) -> bool:
+        # すべての属性が等しければTrue
+        # other: 比べる相手
+        return isinstance(other, PlayerState) and \
+            all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
 # === カメラ・スクロール管理 ===
 class CameraManager:
     # カメラのスクロール処理を管理するクラス
     def __init__(self):
         # カメラの初期化。スクロール量を0で開始。
         self.scroll_x: int = 0
+        self.max_scroll_x: int = MAX_SCROLL_X  # 最大スクロール量（ストリーミングするレベルでは幅に合わせて変える）
+        self.scroll_listener: Callable[[int], None] | None = None  # スクロール量が変わったときに呼ぶ関数
 
     def update_scroll(self, player_x: int) -> None:
         # プレイヤーの位置に基づいてスクロール量を更新
         # player_x: プレイヤーのX座標
+        old_scroll_x: int = self.scroll_x
         if player_x > self.scroll_x + SCROLL_BORDER_X:
             # プレイヤーが画面右端の境界を超えたらスクロール
-            self.scroll_x = min(player_x - SCROLL_BORDER_X, MAX_SCROLL_X)
+            self.scroll_x = min(player_x - SCROLL_BORDER_X, self.max_scroll_x)
         elif player_x < self.scroll_x + SCROLL_BORDER_X // 2:
             # プレイヤーが画面左端の境界を超えたらスクロール（左方向）
             # 左端の境界は右端の半分の位置（SCROLL_BORDER_X // 2）に設定
             self.scroll_x = max(player_x - SCROLL_BORDER_X // 2, 0)
+        if self.scroll_listener is not None and self.scroll_x != old_scroll_x:
+            self.scroll_listener(self.scroll_x)
 
     def get_scroll_x(self) -> int:
         # 現在のスクロール量を取得
@@ -78,17 +159,26 @@ class CameraManager:
         # Pyxelのカメラをリセット（スクロールしない状態）
         pyxel.camera()
 
+    def snapshot(self) -> CameraState:
+        # 現在の状態のスナップショットを返す
+        return CameraState(self.scroll_x)
+
+    def restore(self, state: CameraState) -> None:
+        # スナップショットの状態に戻す
+        # state: snapshot() で取った状態
+        self.scroll_x = state.scroll_x
+        if self.scroll_listener is not None:
+            self.scroll_listener(self.scroll_x)
+
 # === 衝突判定 ===
 class CollisionDetector:
+    grid: TileGrid = TileGrid(0, 0, bytearray())  # 衝突判定用タイルインデックス（load_grid で構築）
+
     @staticmethod
-    def get_tile(tile_x: int, tile_y: int) -> Tuple[int, int]:
-        """
-        指定したタイル座標(tile_x, tile_y)のタイル情報（画像バンク上の(u, v)座標）を取得する関数。
-        - tile_x: タイルマップ上のX座標（タイル単位）
-        - tile_y: タイルマップ上のY座標（タイル単位）
-        戻り値: (u, v) タイル画像の座標タプル
-        """
-        return pyxel.tilemap(0).pget(tile_x, tile_y)
+    def load_grid(grid: TileGrid) -> None:
+        # 衝突判定用インデックスを設定する（衝突判定はこのインデックスだけを見て、pyxelのタイルマップは参照しない）
+        # grid: 使用するTileGrid
+        CollisionDetector.grid = grid
 
     @staticmethod
     def detect_collision(x: int, y: int, y_vector: int) -> bool:
@@ -104,18 +194,18 @@ class CollisionDetector:
         ・床タイル（TILE_FLOOR）
         に当たるかどうかを判定する。
         """
-        x1 = (x + 1) // TILE_SIZE
+        grid: TileGrid = CollisionDetector.grid
+        x1 = (x + HIT_LEFT) // TILE_SIZE
         y1 = y // TILE_SIZE
-        x2 = (x + SPRITE_SIZE - 2) // TILE_SIZE
+        x2 = (x + HIT_RIGHT) // TILE_SIZE
         y2 = (y + SPRITE_SIZE - 1) // TILE_SIZE
         for yi in range(y1, y2 + 1):
             for xi in range(x1, x2 + 1):
-                fg_tile_u = CollisionDetector.get_tile(xi, yi)[0]
-                if fg_tile_u >= WALL_TILE_X:
+                if grid.kind(xi, yi) == TileKind.WALL:
                     return True
         if y_vector > 0 and y % TILE_SIZE == 1:
             for xi in range(x1, x2 + 1):
-                if CollisionDetector.get_tile(xi, y1 + 1) == TILE_FLOOR:
+                if grid.kind(xi, y1 + 1) == TileKind.THROUGH_FLOOR:
                     return True
         return False
 
@@ -143,24 +233,14 @@ class MovementHandler:
         return x, y, dx, dy
 
     def _push_back_x(self, x: int, y: int, dx: int, dy: int) -> int:
-        if dx == 0:
-            return x
-        sign = 1 if dx > 0 else -1
-        for _ in range(abs(dx)):
-            if CollisionDetector.detect_collision(x + sign, y, dy):
-                break
-            x += sign
-        return x
+        # X方向の押し戻し。通過するタイル列だけを調べて衝突直前の位置を求める
+        # （1ピクセルずつ detect_collision を呼ぶ方式と同じ結果になる）
+        return CollisionDetector.grid.sweep_x(x, y, dx, dy, HIT_LEFT, HIT_RIGHT)
 
     def _push_back_y(self, x: int, y: int, dx: int, dy: int) -> int:
-        if dy == 0:
-            return y
-        sign = 1 if dy > 0 else -1
-        for _ in range(abs(dy)):
-            if CollisionDetector.detect_collision(x, y + sign, dy):
-                break
-            y += sign
-        return y
+        # Y方向の押し戻し。通過するタイル行だけを調べて衝突直前の位置を求める
+        # （すり抜け床は y % TILE_SIZE == 1 の位置で下降中のときだけ衝突する）
+        return CollisionDetector.grid.sweep_y(x, y, dy, HIT_LEFT, HIT_RIGHT)
 
 # === スプライト描画 ===
 class SpriteRenderer:
@@ -172,11 +252,12 @@ class SpriteRenderer:
     }
 
     @staticmethod
-    def get_sprite_coordinates(direction: Direction) -> Tuple[int, int]:
+    def get_sprite_coordinates(direction: Direction, frame_count: int) -> Tuple[int, int]:
         """
         指定された向き(direction)に応じたスプライト画像のX座標オフセットと、
         左右反転フラグ（horizon_flip）を計算して返す関数。
         - direction: プレイヤーの向き（Direction列挙型）
+        - frame_count: アニメーションに使う経過フレーム数
         戻り値: (スプライト画像のX座標, 左右反転フラグ)
         歩行アニメーションのフレームも考慮し、アニメーションオフセットを加算する。
         """
@@ -191,17 +272,18 @@ class SpriteRenderer:
             SprBaseidx_X = SPR_DOWN
         elif direction == Direction.UP:
             SprBaseidx_X = SPR_UP
-        animation_offset = (pyxel.frame_count // ANIMATION_SPEED % ANIMATION_FRAMES) * SPRITE_SIZE
+        animation_offset = (frame_count // ANIMATION_SPEED % ANIMATION_FRAMES) * SPRITE_SIZE
         return SprBaseidx_X + animation_offset, horizon_flip
 
 # === プレイヤークラス ===
 class Player:
     # プレイヤーキャラクターの状態と動作を管理するクラス
-    def __init__(self, x: int, y: int, camera_manager: CameraManager):
+    def __init__(self, x: int, y: int, camera_manager: CameraManager, input_source: InputSource | None = None):
         # Playerの初期化処理。位置・速度・状態変数の初期化。
         # x: 初期X座標
         # y: 初期Y座標
         # camera_manager: カメラマネージャーのインスタンス
+        # input_source: 入力ソース（省略時はpyxelのキーボード入力）
         self.x: int = x  # プレイヤーのX座標
         self.y: int = y  # プレイヤーのY座標
         self.dx: int = 0  # プレイヤーのX方向速度
@@ -218,6 +300,7 @@ class Player:
         self.was_on_ground: bool = False  # 1フレーム前に地面にいたか
         self._jump_input: bool = False  # 今フレームでジャンプ入力があったか
         self.camera_manager: CameraManager = camera_manager  # カメラ管理インスタンス
+        self.input_source: InputSource = input_source if input_source is not None else PyxelInput()  # 入力ソース
         self.movement_handler: MovementHandler = MovementHandler(camera_manager)  # 移動処理インスタンス
         self.renderer: SpriteRenderer = SpriteRenderer()  # スプライト描画インスタンス
         self.coyote_timer: int = 0  # コヨーテタイム用カウンタ（地面を離れてからジャンプ可能な残りフレーム数）
@@ -231,11 +314,11 @@ class Player:
 
         # 左足から右足までのタイルをチェック
         for tile_x in range(start_tile_x, end_tile_x + 1):
-            tile: Tuple[int, int] = CollisionDetector.get_tile(tile_x, tile_y)
+            kind: int = CollisionDetector.grid.kind(tile_x, tile_y)
             
-            if tile == TILE_FLOOR:
+            if kind == TileKind.THROUGH_FLOOR:
                 return FloorState.ON_THROUGH_FLOOR
-            elif tile[0] >= WALL_TILE_X:
+            elif kind == TileKind.WALL:
                 return FloorState.ON_FLOOR
 
         return FloorState.NOT_FLOOR
@@ -267,7 +350,7 @@ class Player:
     def _handle_through_floor_action(self) -> None:
         # すり抜け床の上で下＋ジャンプキーで下に降りる処理
         if self.is_on_ground and self.floor_state == FloorState.ON_THROUGH_FLOOR:
-            if pyxel.btn(pyxel.KEY_DOWN) and pyxel.btnp(pyxel.KEY_SPACE):
+            if self.input_source.btn(Key.DOWN) and self.input_source.btnp(Key.SPACE):
                 self.y += 1
                 self.skip_jump = True
 
@@ -285,7 +368,7 @@ class Player:
         dx, direction, jump = self._get_movement_input(self.is_on_ground or (self.jump_count < self.max_jumps))
         if direction is not None:
             self.direction = direction
-        self.dx = dx * 2
+        self.dx = dx * RUN_SPEED
         self._jump_input = jump
 
     def _handle_jump(self) -> None:
@@ -296,13 +379,13 @@ class Player:
                 self.is_jumping = True
                 self.jump_count += 1
             if self.is_jumping and (self.jump_start_y - self.y < self.max_jump_height):
-                self.dy = -7
-        if not pyxel.btn(pyxel.KEY_SPACE):
+                self.dy = -JUMP_SPEED
+        if not self.input_source.btn(Key.SPACE):
             self.is_jumping = False
 
     def _handle_gravity_and_move(self) -> None:
         # 重力・移動・押し戻し処理
-        self.dy = min(self.dy + 1, 3) if self.dy < 3 else self.dy
+        self.dy = min(self.dy + GRAVITY, MAX_FALL_SPEED) if self.dy < MAX_FALL_SPEED else self.dy
         self.x, self.y, self.dx, self.dy = self.movement_handler.push_back(
             self.x, self.y, self.dx, self.dy
         )
@@ -320,19 +403,20 @@ class Player:
         dx: int = 0
         direction: Direction | None = None
         jump: bool = False
-        if pyxel.btn(pyxel.KEY_LEFT):
+        if self.input_source.btn(Key.LEFT):
             dx, direction = -1, Direction.LEFT
-        elif pyxel.btn(pyxel.KEY_RIGHT):
+        elif self.input_source.btn(Key.RIGHT):
             dx, direction = 1, Direction.RIGHT
-        if is_on_ground and pyxel.btnp(pyxel.KEY_SPACE):
+        if is_on_ground and self.input_source.btnp(Key.SPACE):
             jump = True
         return dx, direction, jump
 
-    def draw(self) -> None:
+    def draw(self, frame_count: int) -> None:
         # プレイヤーを描画
+        # frame_count: アニメーションに使う経過フレーム数
         Spr_x_Offset: int
         horizon_flip: int
-        Spr_x_Offset, horizon_flip = self.renderer.get_sprite_coordinates(self.direction)
+        Spr_x_Offset, horizon_flip = self.renderer.get_sprite_coordinates(self.direction, frame_count)
         pyxel.blt(
             self.x, self.y, 0,
             Spr_x_Offset, SPRITE_Y_OFFSET,
@@ -340,6 +424,39 @@ class Player:
             0
         )
 
+    def snapshot(self) -> PlayerState:
+        # 現在の状態のスナップショットを返す（参照先のオブジェクトは含まない）
+        return PlayerState(self.x, self.y, self.dx, self.dy, self.direction, self.is_on_ground, self.jump_count,
+                           self.jump_start_y, self.is_jumping, self.skip_jump, self.floor_state,
+                           self.was_on_ground, self._jump_input, self.coyote_timer)
+
+    def restore(self, state: PlayerState) -> None:
+        # スナップショットの状態に戻す
+        # state: snapshot() で取った状態
+        self.x = state.x
+        self.y = state.y
+        self.dx = state.dx
+        self.dy = state.dy
+        self.direction = state.direction
+        self.is_on_ground = state.is_on_ground
+        self.jump_count = state.jump_count
+        self.jump_start_y = state.jump_start_y
+        self.is_jumping = state.is_jumping
+        self.skip_jump = state.skip_jump
+        self.floor_state = state.floor_state
+        self.was_on_ground = state.was_on_ground
+        self._jump_input = state.jump_input
+        self.coyote_timer = state.coyote_timer
+
+    def checksum(self, seed: int) -> int:
+        # 現在の状態（位置・速度・向き・ジャンプ・床・コヨーテタイム・スクロール量）を seed に続けて畳み込んだ
+        # CRC32 を返す。前のフレームの値を seed に渡すと、最初にずれたフレーム以降の値がすべて変わる
+        # seed: 直前までのチェックサム（最初は CHECKSUM_SEED）
+        return zlib.crc32(CHECKSUM_STRUCT.pack(
+            self.x, self.y, self.dx, self.dy, self.direction.value, self.is_on_ground, self.jump_count,
+            self.jump_start_y, self.is_jumping, self.skip_jump, self.floor_state.value, self.was_on_ground,
+            self._jump_input, self.coyote_timer, self.camera_manager.scroll_x), seed)
+
     def get_camera_manager(self) -> CameraManager:
         # カメラマネージャーを取得
         return self.camera_manager
@@ -0,0 +1,235 @@
+# coding: utf-8
+# コーディングルール:
+# - すべての変数・関数・戻り値に型アノテーションを必ず付与すること
+# - 定数宣言時は"HOGHOGE"のような文字列は使わない。必ず HOGEHOGE = 1 みたいに宣言する。たくさんある時は enum にする
+# - 1関数につき30行以内を目安に分割
+# - コメントは日本語で記述
+# - 関数宣言したら、関数の機能、引数がある時は引数名と、なんの値を受け取っているかをコメントで書く
+
+# player.py の物理をヘッドレスで動かす、Gym風の環境（reset / step）
+# 行動は押すキーのビット（下位4ビット、input_source.Key）、観測はプレイヤーの状態と周囲のタイル種別。
+# VectorPlayerEnv は K 個の環境をワーカープロセスに分けて動かし、観測を共有メモリに直接書き込む。
+#   python player_env.py --envs 8 --workers 4 --steps 2000
+
+import argparse
+import multiprocessing
+import os
+import time
+import numpy as np
+from enum import IntEnum
+from multiprocessing import shared_memory
+from multiprocessing.connection import Connection
+from typing import Dict, List, Tuple
+from player import Player, PLAYER_START_X, PLAYER_START_Y
+from simulation import HeadlessSimulation, DEFAULT_RESOURCE_PATH
+from tile_grid import TileGrid, TileKind, TILE_SIZE
+from input_source import HELD_MASK, PRESS_SHIFT
+
+ACTION_COUNT = HELD_MASK + 1  # 行動の数（押すキーの組み合わせ16通り）
+WINDOW_RADIUS = 4             # 観測するタイル窓の半径（タイル単位。窓は (2*半径+1) 四方）
+WINDOW_SIZE = 2 * WINDOW_RADIUS + 1
+STATE_FIELDS = ("x", "y", "dx", "dy", "is_on_ground", "jump_count", "is_jumping", "coyote_timer")
+STATE_SIZE = len(STATE_FIELDS) + 2          # プレイヤーの属性 + 床状態 + スクロール量
+OBSERVATION_SIZE = STATE_SIZE + WINDOW_SIZE * WINDOW_SIZE
+DEFAULT_MAX_STEPS = 3000      # 1エピソードの最大ステップ数
+FALL_LIMIT_Y = 16 * TILE_SIZE  # これより下に落ちたらエピソード終了（ピクセル）
+# 窓の各要素の、中心タイルからの相対タイル座標（行優先）
+WINDOW_ROWS: np.ndarray = np.repeat(np.arange(-WINDOW_RADIUS, WINDOW_RADIUS + 1), WINDOW_SIZE)
+WINDOW_COLUMNS: np.ndarray = np.tile(np.arange(-WINDOW_RADIUS, WINDOW_RADIUS + 1), WINDOW_SIZE)
+
+# ワーカープロセスへの命令
+class Command(IntEnum):
+    RESET = 0
+    STEP = 1
+    CLOSE = 2
+
+# === 単体の環境 ===
+class PlayerEnv:
+    # 1体のPlayerとCameraManagerをヘッドレスで動かす環境
+    # 報酬は右方向への移動量（ピクセル）、画面下に落ちたら終了、最大ステップ数で打ち切り
+    def __init__(self, grid: TileGrid, max_steps: int = DEFAULT_MAX_STEPS,
+                 start_x: int = PLAYER_START_X, start_y: int = PLAYER_START_Y):
+        # grid: 衝突判定と観測に使うタイルインデックス
+        # max_steps: 1エピソードの最大ステップ数
+        # start_x, start_y: プレイヤーの初期座標
+        self.grid: TileGrid = grid
+        self.max_steps: int = max_steps
+        self.start_x: int = start_x
+        self.start_y: int = start_y
+        # grid.cells をコピーせずに参照する（TileEditor でのタイルの書き換えがそのまま反映される）
+        self.kinds: np.ndarray = np.frombuffer(grid.cells, dtype=np.uint8).reshape(grid.height, grid.width)
+        self.simulation: HeadlessSimulation = HeadlessSimulation(grid, start_x, start_y)
+        self.held: int = 0
+
+    def reset(self) -> Tuple[np.ndarray, Dict[str, int]]:
+        # エピソードを初期状態からやり直す。戻り値: (観測, 情報)
+        self.simulation = HeadlessSimulation(self.grid, self.start_x, self.start_y)
+        self.held = 0
+        return self.observe(), {"frame": 0}
+
+    def step(self, action: int) -> Tuple[np.ndarray, float, bool, bool, Dict[str, int]]:
+        # 行動を1ステップ実行する。戻り値: (観測, 報酬, 終了, 打ち切り, 情報)
+        # action: 押すキーのビット（0〜ACTION_COUNT-1）。押した瞬間のビットは前ステップとの差分から作る
+        held: int = action & HELD_MASK
+        pressed: int = held & ~self.held
+        self.held = held
+        before_x: int = self.simulation.player.x
+        self.simulation.step_bits(held | (pressed << PRESS_SHIFT))
+        reward: float = float(self.simulation.player.x - before_x)
+        terminated: bool = self.simulation.player.y > FALL_LIMIT_Y
+        truncated: bool = self.simulation.frame_count >= self.max_steps
+        return self.observe(), reward, terminated, truncated, {"frame": self.simulation.frame_count}
+
+    def observe(self, out: np.ndarray | None = None) -> np.ndarray:
+        # 観測（プレイヤーの状態 + プレイヤーを中心としたタイル種別の窓）を int32 の1次元配列で返す
+        # out: 書き込み先の配列（省略時は新しく作る）
+        observation: np.ndarray = out if out is not None else np.zeros(OBSERVATION_SIZE, dtype=np.int32)
+        player: Player = self.simulation.player
+        for index, name in enumerate(STATE_FIELDS):
+            observation[index] = getattr(player, name)
+        observation[len(STATE_FIELDS)] = player.floor_state.value
+        observation[len(STATE_FIELDS) + 1] = self.simulation.camera_manager.scroll_x
+        observation[STATE_SIZE:] = self._tile_window(player.x + TILE_SIZE // 2, player.y + TILE_SIZE // 2)
+        return observation
+
+    def _tile_window(self, center_x: int, center_y: int) -> np.ndarray:
+        # 指定ピクセルを含むタイルを中心とした WINDOW_SIZE 四方のタイル種別（行優先、マップ外はEMPTY）
+        # center_x, center_y: 窓の中心にするピクセル座標
+        rows: np.ndarray = center_y // TILE_SIZE + WINDOW_ROWS
+        columns: np.ndarray = center_x // TILE_SIZE + WINDOW_COLUMNS
+        inside: np.ndarray = (rows >= 0) & (rows < self.grid.height) & (columns >= 0) & (columns < self.grid.width)
+        kinds: np.ndarray = self.kinds[np.clip(rows, 0, self.grid.height - 1), np.clip(columns, 0, self.grid.width - 1)]
+        return np.where(inside, kinds, TileKind.EMPTY)
+
+# === 共有メモリのバッファ ===
+# 共有メモリ1ブロックを、K個の環境の報酬・観測・行動・終了・打ち切りの配列として見る
+# buffer: 共有メモリのバッファ
+# count: 環境の数
+def buffer_views(buffer: memoryview, count: int) -> Dict[str, np.ndarray]:
+    layout: List[Tuple[str, type, Tuple[int, ...]]] = [
+        ("rewards", np.float64, (count,)),
+        ("observations", np.int32, (count, OBSERVATION_SIZE)),
+        ("actions", np.int32, (count,)),
+        ("terminated", np.bool_, (count,)),
+        ("truncated", np.bool_, (count,)),
+    ]
+    views: Dict[str, np.ndarray] = {}
+    offset: int = 0
+    for name, dtype, shape in layout:
+        views[name] = np.ndarray(shape, dtype=dtype, buffer=buffer, offset=offset)
+        offset += views[name].nbytes
+    return views
+
+# 共有メモリに必要なバイト数
+# count: 環境の数
+def buffer_size(count: int) -> int:
+    return count * (8 + 4 * OBSERVATION_SIZE + 4 + 1 + 1)
+
+# ワーカープロセスの本体。担当する環境を命令に従って進め、結果を共有メモリに書き込む
+# connection: 親プロセスとの命令・完了通知用の接続
+# memory_name: 共有メモリの名前
+# count: 環境の総数
+# first, last: 担当する環境の添字の範囲（first以上last未満）
+# resource_path: .pyxres ファイルのパス
+# max_steps: 1エピソードの最大ステップ数
+def worker_main(connection: Connection, memory_name: str, count: int, first: int, last: int,
+                resource_path: str, max_steps: int) -> None:
+    memory: shared_memory.SharedMemory = shared_memory.SharedMemory(name=memory_name)
+    views: Dict[str, np.ndarray] = buffer_views(memory.buf, count)
+    grid: TileGrid = TileGrid.from_resource(resource_path)
+    envs: List[PlayerEnv] = [PlayerEnv(grid, max_steps) for _ in range(first, last)]
+    while (command := connection.recv()) != Command.CLOSE:
+        for index, env in enumerate(envs, first):
+            if command == Command.RESET:
+                env.reset()
+            else:
+                _, views["rewards"][index], views["terminated"][index], views["truncated"][index], _ = \
+                    env.step(int(views["actions"][index]))
+                if views["terminated"][index] or views["truncated"][index]:
+                    env.reset()  # 終わった環境は自動でやり直し、次のエピソードの最初の観測を返す
+            env.observe(views["observations"][index])
+        connection.send(command)
+    del views
+    memory.close()
+
+# === 並列環境 ===
+class VectorPlayerEnv:
+    # K個の PlayerEnv をワーカープロセスに分けて一斉に進める環境
+    # 観測・報酬などはワーカーが共有メモリに直接書き込むので、プロセス間でコピーするのは命令と完了通知だけ
+    def __init__(self, count: int, workers: int = os.cpu_count() or 1,
+                 resource_path: str = DEFAULT_RESOURCE_PATH, max_steps: int = DEFAULT_MAX_STEPS):
+        # count: 環境の数
+        # workers: ワーカープロセスの数（環境の数より多くはしない）
+        # resource_path: .pyxres ファイルのパス
+        # max_steps: 1エピソードの最大ステップ数
+        self.count: int = count
+        self.memory: shared_memory.SharedMemory = shared_memory.SharedMemory(create=True, size=buffer_size(count))
+        self.views: Dict[str, np.ndarray] = buffer_views(self.memory.buf, count)
+        self.connections: List[Connection] = []
+        self.processes: List[multiprocessing.Process] = []
+        bounds: np.ndarray = np.linspace(0, count, min(workers, count) + 1).astype(int)
+        for first, last in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+            parent, child = multiprocessing.Pipe()
+            process: multiprocessing.Process = multiprocessing.Process(
+                target=worker_main, args=(child, self.memory.name, count, first, last, resource_path, max_steps),
+                daemon=True)
+            process.start()
+            self.connections.append(parent)
+            self.processes.append(process)
+
+    def _broadcast(self, command: Command) -> None:
+        # 全ワーカーに命令を送り、全員の完了を待つ
+        # command: 送る命令
+        for connection in self.connections:
+            connection.send(command)
+        for connection in self.connections:
+            connection.recv()
+
+    def reset(self) -> np.ndarray:
+        # 全環境をやり直す。戻り値: 観測 (K, OBSERVATION_SIZE)
+        self._broadcast(Command.RESET)
+        return self.views["observations"].copy()
+
+    def step(self, actions: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        # 全環境を1ステップ進める。終わった環境は自動でやり直す
+        # 戻り値: (観測, 報酬, 終了, 打ち切り)
+        # actions: 各環境の行動 (K,)
+        self.views["actions"][:] = actions
+        self._broadcast(Command.STEP)
+        return (self.views["observations"].copy(), self.views["rewards"].copy(),
+                self.views["terminated"].copy(), self.views["truncated"].copy())
+
+    def close(self) -> None:
+        # ワーカーを終了させ、共有メモリを解放する
+        for connection in self.connections:
+            connection.send(Command.CLOSE)
+        for process in self.processes:
+            process.join()
+        self.views = {}
+        self.memory.close()
+        self.memory.unlink()
+
+# コマンドライン: ランダムな行動で並列環境を動かし、1秒あたりのステップ数を表示する
+def main() -> None:
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description="MoveRec gym-style environments")
+    parser.add_argument("--resource", default=DEFAULT_RESOURCE_PATH, help=".pyxres file")
+    parser.add_argument("--envs", type=int, default=8, help="number of environments")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="number of worker processes")
+    parser.add_argument("--steps", type=int, default=2000, help="steps per environment")
+    parser.add_argument("--seed", type=int, default=0, help="random action seed")
+    args: argparse.Namespace = parser.parse_args()
+    rng: np.random.Generator = np.random.default_rng(args.seed)
+    env: VectorPlayerEnv = VectorPlayerEnv(args.envs, args.workers, args.resource)
+    env.reset()
+    episodes: int = 0
+    start: float = time.perf_counter()
+    for _ in range(args.steps):
+        _, _, terminated, truncated = env.step(rng.integers(0, ACTION_COUNT, args.envs))
+        episodes += int(np.count_nonzero(terminated | truncated))
+    elapsed: float = time.perf_counter() - start
+    env.close()
+    print(f"envs={args.envs} workers={args.workers} steps={args.steps * args.envs} episodes={episodes} "
+          f"time={elapsed:.3f}s steps_per_sec={args.steps * args.envs / elapsed:.0f}")
+
+if __name__ == "__main__":
+    main()
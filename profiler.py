@@ -0,0 +1,124 @@
+# coding: utf-8
+# コーディングルール:
+# - すべての変数・関数・戻り値に型アノテーションを必ず付与すること
+# - 定数宣言時は"HOGHOGE"のような文字列は使わない。必ず HOGEHOGE = 1 みたいに宣言する。たくさんある時は enum にする
+# - 1関数につき30行以内を目安に分割
+# - コメントは日本語で記述
+# - 関数宣言したら、関数の機能、引数がある時は引数名と、なんの値を受け取っているかをコメントで書く
+
+import csv
+import time
+from array import array
+from enum import IntEnum
+from typing import Any, Callable, List, Tuple
+
+# 計測する区間
+class Section(IntEnum):
+    APP_UPDATE = 0        # App.update（入力・記録・シミュレーション）
+    APP_DRAW = 1          # App.draw（画面全体の描画）
+    PLAYER_UPDATE = 2     # Player.update 全体
+    FLOOR_STATE = 3       # Player._update_floor_state
+    THROUGH_FLOOR = 4     # Player._handle_through_floor_action
+    LANDING_RESET = 5     # Player._handle_landing_reset
+    INPUT_MOVE = 6        # Player._handle_input_and_movement
+    JUMP = 7              # Player._handle_jump
+    GRAVITY_MOVE = 8      # Player._handle_gravity_and_move
+    BOUNDARY = 9          # Player._handle_boundary_limits
+    DRAW_MAP = 10         # App._draw_map
+    DRAW_CHARACTERS = 11  # App._draw_characters
+
+SECTION_COUNT = len(Section)  # 1フレームあたりの記録数
+RING_FRAMES = 512             # リングバッファに保持するフレーム数
+NS_PER_US = 1000              # ナノ秒→マイクロ秒
+
+# === フレームプロファイラ ===
+class FrameProfiler:
+    # 区間ごとの処理時間（ナノ秒）をフレーム単位でリングバッファに記録するクラス
+    # 計測対象のメソッドは有効にしている間だけインスタンス属性の計測用ラッパーに差し替えるので、
+    # 無効時は元のメソッドがそのまま呼ばれ、計測のコストはかからない
+    def __init__(self, frames: int = RING_FRAMES):
+        # frames: リングバッファに保持するフレーム数
+        self.frames: int = frames
+        self.samples: array = array("q", bytes(8 * frames * SECTION_COUNT))  # [フレーム][区間] の処理時間
+        self.frame_numbers: array = array("q", bytes(8 * frames))           # 各行のフレーム番号
+        self.slot: int = 0          # 現在書き込み中の行
+        self.row: int = 0           # 現在の行の先頭位置（slot * SECTION_COUNT）
+        self.filled: int = 0        # 記録済みの行数（最大frames）
+        self.frame_count: int = 0   # これまでに始めたフレーム数
+        self.enabled: bool = False
+        self.targets: List[Tuple[Any, str, Section]] = []  # 計測対象（オブジェクト, メソッド名, 区間）
+
+    def attach(self, target: Any, name: str, section: Section) -> None:
+        # 計測対象のメソッドを登録する（有効中なら即座に差し替える）
+        # target: メソッドを持つオブジェクト
+        # name: メソッド名
+        # section: 計測結果を入れる区間
+        self.targets.append((target, name, section))
+        if self.enabled:
+            setattr(target, name, self._timed(getattr(target, name), section))
+
+    def set_enabled(self, enabled: bool) -> None:
+        # 計測の有効・無効を切り替える。無効にするとラッパーを外して元のメソッドに戻す
+        # enabled: Trueで計測開始
+        if enabled == self.enabled:
+            return
+        self.enabled = enabled
+        for target, name, section in self.targets:
+            if enabled:
+                setattr(target, name, self._timed(getattr(target, name), section))
+            else:
+                delattr(target, name)
+
+    def _timed(self, method: Callable[..., Any], section: Section) -> Callable[..., Any]:
+        # メソッドを呼び出して、かかった時間を現在の行の区間sectionに加算するラッパーを作る
+        # method: 元のメソッド
+        # section: 計測結果を入れる区間
+        samples: array = self.samples
+        clock: Callable[[], int] = time.perf_counter_ns
+        offset: int = int(section)
+
+        def timed(*args: Any) -> Any:
+            start: int = clock()
+            result: Any = method(*args)
+            samples[self.row + offset] += clock() - start
+            return result
+        return timed
+
+    def next_frame(self) -> None:
+        # 新しいフレームの記録を始める（毎フレームの先頭で呼ぶ）。次の行を0クリアして使う
+        if not self.enabled:
+            return
+        self.slot = self.frame_count % self.frames
+        self.row = self.slot * SECTION_COUNT
+        for index in range(self.row, self.row + SECTION_COUNT):
+            self.samples[index] = 0
+        self.frame_numbers[self.slot] = self.frame_count
+        self.frame_count += 1
+        self.filled = min(self.filled + 1, self.frames)
+
+    def _ordered_slots(self) -> range | List[int]:
+        # 記録済みの行を古い順に並べた行番号の列
+        if self.filled < self.frames:
+            return range(self.filled)
+        start: int = self.frame_count % self.frames
+        return [(start + index) % self.frames for index in range(self.frames)]
+
+    def percentiles(self, section: Section) -> Tuple[int, int]:
+        # 区間sectionの処理時間の50パーセンタイルと99パーセンタイル（ナノ秒）を返す
+        # 現在の（まだ計測途中の）行は除く
+        # section: 対象の区間
+        slots: List[int] = [slot for slot in self._ordered_slots() if slot != self.slot]
+        values: List[int] = sorted(self.samples[slot * SECTION_COUNT + section] for slot in slots)
+        if not values:
+            return 0, 0
+        return values[len(values) // 2], values[min(len(values) - 1, len(values) * 99 // 100)]
+
+    def dump_csv(self, path: str) -> None:
+        # リングバッファの内容を古い順にCSVへ書き出す（1行1フレーム、値はナノ秒）
+        # path: 書き出すファイルのパス
+        with open(path, "w", newline="") as file:
+            writer: Any = csv.writer(file)
+            writer.writerow(["frame"] + [section.name.lower() for section in Section])
+            for slot in self._ordered_slots():
+                row: int = slot * SECTION_COUNT
+                writer.writerow([self.frame_numbers[slot]] + list(self.samples[row:row + SECTION_COUNT]))
@@ -0,0 +1,425 @@
+# coding: utf-8
+# コーディングルール:
+# - すべての変数・関数・戻り値に型アノテーションを必ず付与すること
+# - 定数宣言時は"HOGHOGE"のような文字列は使わない。必ず HOGEHOGE = 1 みたいに宣言する。たくさんある時は enum にする
+# - 1関数につき30行以内を目安に分割
+# - コメントは日本語で記述
+# - 関数宣言したら、関数の機能、引数がある時は引数名と、なんの値を受け取っているかをコメントで書く
+
+# 入力記録ファイル(.mvr)の形式（バージョン3）
+#   ヘッダー: マジック(4バイト) / 形式バージョン(u16) / fps(u16) / 初期X座標(i16) / 初期Y座標(i16)
+#             / キーフレーム間隔(u16)
+#   本体: 1フレームにつき1バイトの入力ビットフィールド（input_source参照）と、そのフレームを進めた後の
+#         状態のチェックサム（u32。Player.checksum で前のフレームの値に畳み込んだもの）。
+#         キーフレーム間隔ごとに、そのフレームの入力の直前へPlayerとCameraManagerの全状態（キーフレーム）を挟む
+#   末尾: 記録終了時の状態（最終キーフレーム）
+#         / キーフレームの索引（フレーム番号 u32, ファイル内オフセット u32 の並び。最終キーフレームを含む）
+#         / フッター: 総フレーム数(u32) / キーフレーム数(u32) / 索引マジック(4バイト)
+# 30fpsで1時間遊んでも約550KBに収まる。バージョン1（キーフレームなし）・2（チェックサムなし）のファイルも読み込める。
+# 再生時は毎フレームのチェックサムを比べるので、物理が変わると最初にずれたフレームがすぐ分かる。
+# 索引がない（記録中に強制終了した）ファイルは、キーフレームの配置が固定なので本体を走査して復元する。
+
+import argparse
+import bisect
+import struct
+import time
+from typing import BinaryIO, Iterator, List, Tuple
+from player import Player, CameraManager, PlayerState, CameraState, CHECKSUM_SEED
+from simulation import Simulation, HeadlessSimulation, DEFAULT_RESOURCE_PATH, random_inputs
+from tile_grid import TileGrid
+
+# === 定数 ===
+RECORDING_MAGIC = b"MVRC"      # ファイル先頭のマジック
+RECORDING_VERSION = 3          # 形式バージョン
+RECORDING_VERSION_V2 = 2       # キーフレームあり・チェックサムなしの形式バージョン
+HEADER_FORMAT_V1 = "<4sHHhh"   # マジック, バージョン, fps, 初期X, 初期Y
+HEADER_FORMAT = "<4sHHhhH"     # バージョン2: 上記 + キーフレーム間隔
+HEADER_SIZE_V1 = struct.calcsize(HEADER_FORMAT_V1)
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+INDEX_ENTRY_FORMAT = "<II"     # キーフレームのフレーム番号, オフセット
+INDEX_ENTRY_SIZE = struct.calcsize(INDEX_ENTRY_FORMAT)
+CHECKSUM_FORMAT = "<I"         # 1フレーム分のチェックサム
+CHECKSUM_SIZE = struct.calcsize(CHECKSUM_FORMAT)
+FRAME_SIZE_V2 = 1              # バージョン2の本体の1フレーム分のバイト数（入力だけ）
+FRAME_SIZE = 1 + CHECKSUM_SIZE  # バージョン3の本体の1フレーム分のバイト数（入力 + チェックサム）
+FOOTER_FORMAT = "<II4s"        # 総フレーム数, キーフレーム数, 索引マジック
+FOOTER_SIZE = struct.calcsize(FOOTER_FORMAT)
+INDEX_MAGIC = b"MVRX"          # フッター末尾のマジック
+# キーフレーム: PlayerState.values() の並び (x, y, dx, dy, direction, is_on_ground, jump_count, jump_start_y,
+#               is_jumping, skip_jump, floor_state, was_on_ground, jump_input, coyote_timer) + scroll_x
+KEYFRAME_FORMAT = "<iihhBBhiBBBBBhi"
+KEYFRAME_SIZE = struct.calcsize(KEYFRAME_FORMAT)
+DEFAULT_FPS = 30               # 記録時のフレームレート（既定値）
+DEFAULT_KEYFRAME_INTERVAL = 256  # キーフレームを挟む間隔（フレーム数、既定値）
+FLUSH_FRAMES = 1024            # この数のフレームが溜まったらファイルに書き出す
+NO_DIVERGENCE = -1             # 記録とずれなかったことを表すフレーム番号
+
+# プレイヤーの1フレーム分の軌跡 (x, y, dy, jump_count, scroll_x)
+TrajectoryPoint = Tuple[int, int, int, int, int]
+
+# === キーフレーム（全状態のスナップショット） ===
+# PlayerとCameraManagerの状態をキーフレームのバイト列にする
+# player: 対象のプレイヤー
+# camera_manager: 対象のカメラマネージャー
+def pack_keyframe(player: Player, camera_manager: CameraManager) -> bytes:
+    return struct.pack(KEYFRAME_FORMAT, *player.snapshot().values(), camera_manager.scroll_x)
+
+# キーフレームのバイト列からPlayerとCameraManagerの状態を復元する
+# data: キーフレームを含むバイト列
+# offset: data内のキーフレームの位置
+# player: 復元先のプレイヤー
+# camera_manager: 復元先のカメラマネージャー
+def unpack_keyframe(data: bytes, offset: int, player: Player, camera_manager: CameraManager) -> None:
+    values: Tuple = struct.unpack_from(KEYFRAME_FORMAT, data, offset)
+    player.restore(PlayerState.from_values(values[:-1]))
+    camera_manager.restore(CameraState(values[-1]))
+
+# === 記録 ===
+class InputRecorder:
+    # 毎フレームの入力ビットフィールドとチェックサム、一定間隔のキーフレームを記録ファイルに書き出すクラス
+    # チェックサムはそのフレームを進めた後の状態で計算するので、次のフレームの record か close で書き込む
+    def __init__(self, path: str, simulation: Simulation, fps: int = DEFAULT_FPS,
+                 keyframe_interval: int = DEFAULT_KEYFRAME_INTERVAL):
+        # path: 書き出すファイルのパス
+        # simulation: 記録対象のシミュレーション（キーフレームの状態を取り出す）
+        # fps: 記録時のフレームレート
+        # keyframe_interval: キーフレームを挟む間隔（小さいほどシークが速く、ファイルが大きくなる）
+        if keyframe_interval <= 0:
+            raise ValueError("keyframe_interval must be positive")
+        self.simulation: Simulation = simulation
+        self.keyframe_interval: int = keyframe_interval
+        self.file: BinaryIO = open(path, "wb")
+        player: Player = simulation.player
+        self.file.write(struct.pack(HEADER_FORMAT, RECORDING_MAGIC, RECORDING_VERSION, fps,
+                                    player.x, player.y, keyframe_interval))
+        self.offset: int = HEADER_SIZE         # 次に書き込むバイトのファイル内オフセット
+        self.buffer: bytearray = bytearray()  # 未書き出しのデータ
+        self.index: List[Tuple[int, int]] = []  # キーフレームの (フレーム番号, オフセット)
+        self.frame_count: int = 0              # 記録したフレーム数
+        self.checksum: int = CHECKSUM_SEED     # 最後に書き込んだチェックサム
+
+    def record(self, bits: int) -> None:
+        # 1フレーム分の入力を記録する（Playerを更新する前に呼ぶ）
+        # bits: そのフレームでPlayerに与える入力ビットフィールド
+        if self.frame_count > 0:
+            self._write_checksum()
+        if self.frame_count % self.keyframe_interval == 0:
+            self._write_keyframe()
+        self.buffer.append(bits)
+        self.offset += 1
+        self.frame_count += 1
+        if len(self.buffer) >= FLUSH_FRAMES * FRAME_SIZE:
+            self.flush()
+
+    def _write_checksum(self) -> None:
+        # 直前のフレームを進めた後の状態を前のチェックサムに畳み込んで書き込む
+        self.checksum = self.simulation.player.checksum(self.checksum)
+        self.buffer += struct.pack(CHECKSUM_FORMAT, self.checksum)
+        self.offset += CHECKSUM_SIZE
+
+    def _write_keyframe(self) -> None:
+        # 現在の状態をキーフレームとして書き込み、索引に追加する
+        self.index.append((self.frame_count, self.offset))
+        self.buffer += pack_keyframe(self.simulation.player, self.simulation.camera_manager)
+        self.offset += KEYFRAME_SIZE
+
+    def flush(self) -> None:
+        # 溜まっているデータをファイルに書き出す
+        self.file.write(self.buffer)
+        self.buffer.clear()
+        self.file.flush()
+
+    def close(self) -> None:
+        # 最終キーフレーム・索引・フッターを書き出してファイルを閉じる（二重に呼んでもよい）
+        if self.file.closed:
+            return
+        if self.frame_count > 0:
+            self._write_checksum()
+        if not self.index or self.index[-1][0] != self.frame_count:
+            self._write_keyframe()
+        for frame, offset in self.index:
+            self.buffer += struct.pack(INDEX_ENTRY_FORMAT, frame, offset)
+        self.buffer += struct.pack(FOOTER_FORMAT, self.frame_count, len(self.index), INDEX_MAGIC)
+        self.flush()
+        self.file.close()
+
+# === 読み込み ===
+class Recording:
+    # 読み込んだ入力記録
+    def __init__(self, fps: int, start_x: int, start_y: int, inputs: bytes,
+                 keyframe_interval: int = 0, keyframes: List[Tuple[int, int]] | None = None,
+                 data: bytes = b"", checksums: Tuple[int, ...] = ()):
+        # fps: 記録時のフレームレート
+        # start_x, start_y: 記録開始時のプレイヤー座標
+        # inputs: 各フレームの入力ビットフィールド
+        # keyframe_interval: キーフレームの間隔（0ならキーフレームなし）
+        # keyframes: キーフレームの (フレーム番号, data内のオフセット)。フレーム番号の昇順
+        # data: キーフレームを含むファイル全体のバイト列
+        # checksums: 各フレームを進めた後の状態のチェックサム（バージョン2以前は空）
+        self.fps: int = fps
+        self.start_x: int = start_x
+        self.start_y: int = start_y
+        self.inputs: bytes = inputs
+        self.keyframe_interval: int = keyframe_interval
+        self.keyframes: List[Tuple[int, int]] = keyframes if keyframes is not None else []
+        self.keyframe_frames: List[int] = [frame for frame, _ in self.keyframes]  # 二分探索用
+        self.data: bytes = data
+        self.checksums: Tuple[int, ...] = checksums
+
+    @classmethod
+    def load(cls, path: str) -> 'Recording':
+        # 記録ファイルを読み込む
+        # path: 記録ファイルのパス
+        with open(path, "rb") as file:
+            data: bytes = file.read()
+        magic: bytes
+        version: int
+        magic, version = struct.unpack_from("<4sH", data)
+        if magic != RECORDING_MAGIC:
+            raise ValueError(f"not a MoveRec recording: {path}")
+        if version == 1:
+            fps: int
+            start_x: int
+            start_y: int
+            _, _, fps, start_x, start_y = struct.unpack_from(HEADER_FORMAT_V1, data)
+            return cls(fps, start_x, start_y, data[HEADER_SIZE_V1:])
+        if version not in (RECORDING_VERSION_V2, RECORDING_VERSION):
+            raise ValueError(f"unsupported recording version: {version}")
+        return cls._load_keyframed(data, FRAME_SIZE if version == RECORDING_VERSION else FRAME_SIZE_V2)
+
+    @classmethod
+    def _load_keyframed(cls, data: bytes, frame_size: int) -> 'Recording':
+        # バージョン2・3の記録を読み込む。入力とチェックサムはキーフレームを除いてそれぞれ1本にまとめる
+        # data: ファイル全体のバイト列
+        # frame_size: 本体の1フレーム分のバイト数（FRAME_SIZE_V2 / FRAME_SIZE）
+        fps: int
+        start_x: int
+        start_y: int
+        interval: int
+        _, _, fps, start_x, start_y, interval = struct.unpack_from(HEADER_FORMAT, data)
+        keyframes: List[Tuple[int, int]]
+        body_end: int
+        keyframes, body_end = _read_index(data)
+        if not keyframes:
+            keyframes, body_end = _scan_keyframes(data, interval, frame_size)
+        chunks: List[bytes] = []
+        for i, (_, offset) in enumerate(keyframes):
+            chunk_end: int = keyframes[i + 1][1] if i + 1 < len(keyframes) else body_end
+            chunks.append(data[offset + KEYFRAME_SIZE:chunk_end])
+        body: bytes = b"".join(chunks)
+        inputs: bytes = body[::frame_size]
+        return cls(fps, start_x, start_y, inputs, interval, keyframes, data, _split_checksums(body, frame_size))
+
+    def frame_count(self) -> int:
+        # 記録されているフレーム数
+        return len(self.inputs)
+
+    def checksum_before(self, frame: int) -> int:
+        # frameフレーム進めた時点（frame番目の入力を与える前）のチェックサム
+        # frame: フレーム番号（0 〜 総フレーム数）
+        return self.checksums[frame - 1] if frame > 0 else CHECKSUM_SEED
+
+    def nearest_keyframe(self, frame: int) -> Tuple[int, int] | None:
+        # frame以前で最も近いキーフレームの (フレーム番号, オフセット) を返す（なければNone）
+        # frame: 目的のフレーム番号
+        position: int = bisect.bisect_right(self.keyframe_frames, frame) - 1
+        return self.keyframes[position] if position >= 0 else None
+
+# 索引とフッターを読む。戻り値: (キーフレーム一覧, 本体の終端オフセット)。索引がなければ空の一覧
+# data: ファイル全体のバイト列
+def _read_index(data: bytes) -> Tuple[List[Tuple[int, int]], int]:
+    if len(data) < HEADER_SIZE + FOOTER_SIZE:
+        return [], len(data)
+    count: int
+    magic: bytes
+    _, count, magic = struct.unpack_from(FOOTER_FORMAT, data, len(data) - FOOTER_SIZE)
+    index_start: int = len(data) - FOOTER_SIZE - count * INDEX_ENTRY_SIZE
+    if magic != INDEX_MAGIC or index_start < HEADER_SIZE:
+        return [], len(data)
+    keyframes: List[Tuple[int, int]] = [
+        struct.unpack_from(INDEX_ENTRY_FORMAT, data, index_start + i * INDEX_ENTRY_SIZE) for i in range(count)]
+    return keyframes, index_start
+
+# 索引がないファイルから、固定のキーフレーム配置をたどって索引を作り直す（途中で切れたフレームは捨てる）
+# data: ファイル全体のバイト列
+# interval: キーフレームの間隔
+# frame_size: 本体の1フレーム分のバイト数
+def _scan_keyframes(data: bytes, interval: int, frame_size: int) -> Tuple[List[Tuple[int, int]], int]:
+    keyframes: List[Tuple[int, int]] = []
+    offset: int = HEADER_SIZE
+    frame: int = 0
+    while offset + KEYFRAME_SIZE <= len(data):
+        keyframes.append((frame, offset))
+        frames: int = min(interval, (len(data) - offset - KEYFRAME_SIZE) // frame_size)
+        offset += KEYFRAME_SIZE + frames * frame_size
+        frame += frames
+        if frames < interval:
+            break
+    return keyframes, offset
+
+# 本体から入力のバイトを除き、残ったチェックサムをフレーム順のタプルにする（チェックサムのない形式なら空）
+# body: キーフレームを除いた本体のバイト列
+# frame_size: 本体の1フレーム分のバイト数
+def _split_checksums(body: bytes, frame_size: int) -> Tuple[int, ...]:
+    if frame_size == FRAME_SIZE_V2:
+        return ()
+    packed: bytearray = bytearray(body)
+    del packed[::frame_size]
+    return struct.unpack(f"<{len(packed) // CHECKSUM_SIZE}I", packed)
+
+# === 再生 ===
+class Replayer:
+    # 入力記録をヘッドレスシミュレーションに流し込み、実時間より速く再生・シークするクラス
+    def __init__(self, recording: Recording, grid: TileGrid):
+        # recording: 再生する入力記録
+        # grid: 衝突判定に使うタイルインデックス（記録時と同じマップ）
+        self.recording: Recording = recording
+        self.grid: TileGrid = grid
+        self.simulation: HeadlessSimulation = HeadlessSimulation(grid, recording.start_x, recording.start_y)
+
+    def run(self) -> HeadlessSimulation:
+        # 現在のフレームから記録の最後まで一気に再生し、再生後のシミュレーションを返す
+        self.simulation.run(self.recording.inputs[self.simulation.frame_count:])
+        return self.simulation
+
+    def trajectory(self) -> Iterator[TrajectoryPoint]:
+        # 現在のフレームから1フレームずつ再生し、各フレーム後のプレイヤーの軌跡を返す
+        for bits in self.recording.inputs[self.simulation.frame_count:]:
+            self.simulation.step_bits(bits)
+            yield trajectory_point(self.simulation)
+
+    def verify(self) -> int:
+        # 現在のフレームから記録の最後まで再生しながら、毎フレームのチェックサムを記録と比べる
+        # （現在のフレームまでの状態は記録と一致している前提。最初のずれが見つかったらそこで止める）
+        # 戻り値: 最初に状態がずれたフレーム番号（その入力で進めた後の状態が違う。なければ NO_DIVERGENCE）
+        recording: Recording = self.recording
+        if len(recording.checksums) != recording.frame_count():
+            raise ValueError("recording has no checksums (format version 3 or later is required)")
+        simulation: HeadlessSimulation = self.simulation
+        player: Player = simulation.player
+        start: int = simulation.frame_count
+        checksum: int = recording.checksum_before(start)
+        for frame, bits, recorded in zip(range(start, recording.frame_count()), recording.inputs[start:],
+                                         recording.checksums[start:]):
+            simulation.step_bits(bits)
+            checksum = player.checksum(checksum)
+            if checksum != recorded:
+                return frame
+        return NO_DIVERGENCE
+
+    def seek(self, frame: int) -> HeadlessSimulation:
+        # frameフレーム再生し終えた状態にする。直前のキーフレームを復元し、そこから最大1間隔分だけ進める
+        # （今の位置がキーフレームと目的フレームの間なら、そのまま進める）
+        # frame: 目的のフレーム番号（0 〜 総フレーム数）
+        if not 0 <= frame <= self.recording.frame_count():
+            raise ValueError(f"frame out of range: {frame}")
+        keyframe: Tuple[int, int] | None = self.recording.nearest_keyframe(frame)
+        simulation: HeadlessSimulation = self.simulation
+        if keyframe is not None and not keyframe[0] <= simulation.frame_count <= frame:
+            unpack_keyframe(self.recording.data, keyframe[1], simulation.player, simulation.camera_manager)
+            simulation.frame_count = keyframe[0]
+        elif simulation.frame_count > frame:
+            # キーフレームのない記録（バージョン1）は最初から再生し直す
+            self.simulation = simulation = HeadlessSimulation(
+                self.grid, self.recording.start_x, self.recording.start_y)
+        simulation.run(self.recording.inputs[simulation.frame_count:frame])
+        return simulation
+
+# シミュレーションの現在状態から軌跡の1点を取り出す
+# simulation: 対象のシミュレーション
+def trajectory_point(simulation: Simulation) -> TrajectoryPoint:
+    player: Player = simulation.player
+    return (player.x, player.y, player.dy, player.jump_count, simulation.camera_manager.scroll_x)
+
+# ランダム入力で記録ファイルを作る（再生・回帰テスト用の記録をウィンドウなしで用意する）
+# path: 書き出すファイルのパス
+# frames: フレーム数
+# seed: 乱数シード
+# keyframe_interval: キーフレームの間隔
+def generate_random_recording(path: str, frames: int, seed: int,
+                              keyframe_interval: int = DEFAULT_KEYFRAME_INTERVAL) -> None:
+    simulation: HeadlessSimulation = HeadlessSimulation.from_resource()
+    recorder: InputRecorder = InputRecorder(path, simulation, keyframe_interval=keyframe_interval)
+    for bits in random_inputs(frames, seed):
+        recorder.record(bits)
+        simulation.step_bits(bits)
+    recorder.close()
+
+# 記録ファイルを最大速度で再生し、再生速度と最終状態を表示する
+# args: コマンドライン引数
+def replay_command(args: argparse.Namespace) -> None:
+    recording: Recording = Recording.load(args.file)
+    replayer: Replayer = Replayer(recording, TileGrid.from_resource(args.resource))
+    start: float = time.perf_counter()
+    simulation: HeadlessSimulation = replayer.run()
+    elapsed: float = max(time.perf_counter() - start, 1e-9)
+    frames: int = recording.frame_count()
+    print(f"frames={frames} time={elapsed:.3f}s fps={frames / elapsed:.0f} "
+          f"speed={frames / recording.fps / elapsed:.0f}x realtime")
+    print("final x={} y={} dy={} jump_count={} scroll_x={}".format(*trajectory_point(simulation)))
+
+# 記録ファイルの指定フレームへシークし、かかった時間とその時点の状態を表示する
+# args: コマンドライン引数
+def seek_command(args: argparse.Namespace) -> None:
+    recording: Recording = Recording.load(args.file)
+    replayer: Replayer = Replayer(recording, TileGrid.from_resource(args.resource))
+    start: float = time.perf_counter()
+    simulation: HeadlessSimulation = replayer.seek(args.frame)
+    elapsed: float = time.perf_counter() - start
+    print(f"frame={args.frame} seek={elapsed * 1000:.3f}ms keyframes={len(recording.keyframes)}")
+    print("x={} y={} dy={} jump_count={} scroll_x={}".format(*trajectory_point(simulation)))
+
+# 記録ファイルを毎フレームのチェックサムを比べながら再生し、最初にずれたフレームとチェックサムの1フレームあたりの
+# コスト（比べない再生との差）を表示する。ずれていれば終了コード1
+# args: コマンドライン引数
+def verify_command(args: argparse.Namespace) -> None:
+    recording: Recording = Recording.load(args.file)
+    grid: TileGrid = TileGrid.from_resource(args.resource)
+    start: float = time.perf_counter()
+    Replayer(recording, grid).run()
+    plain: float = time.perf_counter() - start
+    start = time.perf_counter()
+    try:
+        divergence_frame: int = Replayer(recording, grid).verify()
+    except ValueError as error:
+        raise SystemExit(f"{args.file}: {error}")
+    checked: float = time.perf_counter() - start
+    if divergence_frame != NO_DIVERGENCE:
+        print(f"frames={recording.frame_count()} DIVERGED at frame {divergence_frame}")
+        raise SystemExit(1)
+    frames: int = max(recording.frame_count(), 1)
+    print(f"frames={recording.frame_count()} ok replay={plain / frames * 1e6:.2f}us/frame "
+          f"checksum={(checked - plain) / frames * 1e6:.2f}us/frame")
+
+# ランダム入力の記録を作る
+# args: コマンドライン引数
+def generate_command(args: argparse.Namespace) -> None:
+    generate_random_recording(args.file, args.frames, args.seed, args.keyframe_interval)
+
+# コマンドライン: replay（記録の最大速度再生）/ seek（指定フレームへのシーク）/ verify（チェックサムの照合）
+#                 / generate（ランダム入力の記録作成）
+def main() -> None:
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description="MoveRec input recording tools")
+    parser.add_argument("--resource", default=DEFAULT_RESOURCE_PATH, help=".pyxres file")
+    commands: argparse._SubParsersAction = parser.add_subparsers(dest="command", required=True)
+    replay_parser: argparse.ArgumentParser = commands.add_parser("replay", help="replay a recording at max speed")
+    replay_parser.add_argument("file")
+    replay_parser.set_defaults(handler=replay_command)
+    seek_parser: argparse.ArgumentParser = commands.add_parser("seek", help="seek to a frame of a recording")
+    seek_parser.add_argument("file")
+    seek_parser.add_argument("frame", type=int)
+    seek_parser.set_defaults(handler=seek_command)
+    verify_parser: argparse.ArgumentParser = commands.add_parser("verify", help="replay checking per-frame checksums")
+    verify_parser.add_argument("file")
+    verify_parser.set_defaults(handler=verify_command)
+    generate_parser: argparse.ArgumentParser = commands.add_parser("generate", help="write a random recording")
+    generate_parser.add_argument("file")
+    generate_parser.add_argument("--frames", type=int, default=108000)
+    generate_parser.add_argument("--seed", type=int, default=0)
+    generate_parser.add_argument("--keyframe-interval", type=int, default=DEFAULT_KEYFRAME_INTERVAL)
+    generate_parser.set_defaults(handler=generate_command)
+    args: argparse.Namespace = parser.parse_args()
+    args.handler(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# coding: utf-8
+# コーディングルール:
+# - すべての変数・関数・戻り値に型アノテーションを必ず付与すること
+# - 定数宣言時は"HOGHOGE"のような文字列は使わない。必ず HOGEHOGE = 1 みたいに宣言する。たくさんある時は enum にする
+# - 1関数につき30行以内を目安に分割
+# - コメントは日本語で記述
+# - 関数宣言したら、関数の機能、引数がある時は引数名と、なんの値を受け取っているかをコメントで書く
+
+import argparse
+import os
+import random
+import time
+from typing import Iterable, List
+from player import Player, CameraManager, CollisionDetector, PLAYER_START_X, PLAYER_START_Y
+from tile_grid import TileGrid
+from input_source import InputSource, ScriptedInput, Key, PRESS_SHIFT, HELD_MASK
+
+# 既定のリソースファイル（このファイルと同じディレクトリの my_resource.pyxres）
+DEFAULT_RESOURCE_PATH: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "my_resource.pyxres")
+
+# === シミュレーション本体 ===
+class Simulation:
+    # Player・CameraManager・衝突判定をまとめたシミュレーション本体
+    # pyxelの入力・描画・frame_countには依存せず、入力ソースとフレーム数を明示的に持つ
+    def __init__(self, grid: TileGrid, input_source: InputSource,
+                 start_x: int = PLAYER_START_X, start_y: int = PLAYER_START_Y):
+        # grid: 衝突判定に使うタイルインデックス
+        # input_source: プレイヤーの入力ソース
+        # start_x, start_y: プレイヤーの初期座標
+        CollisionDetector.load_grid(grid)
+        self.grid: TileGrid = grid
+        self.input_source: InputSource = input_source
+        self.camera_manager: CameraManager = CameraManager()
+        self.player: Player = Player(start_x, start_y, self.camera_manager, input_source)
+        self.frame_count: int = 0  # これまでに進めたフレーム数
+
+    def step(self) -> None:
+        # 1フレーム分シミュレーションを進める
+        self.player.update()
+        self.frame_count += 1
+
+# === ヘッドレス実行 ===
+class HeadlessSimulation(Simulation):
+    # ウィンドウもpyxel.initも使わずに、入力ビットフィールドを与えて進めるシミュレーション
+    # テスト・パラメータ調整・大量フレームの一括解析用
+    def __init__(self, grid: TileGrid, start_x: int = PLAYER_START_X, start_y: int = PLAYER_START_Y):
+        # grid: 衝突判定に使うタイルインデックス
+        # start_x, start_y: プレイヤーの初期座標
+        self.scripted_input: ScriptedInput = ScriptedInput()
+        super().__init__(grid, self.scripted_input, start_x, start_y)
+
+    @classmethod
+    def from_resource(cls, path: str = DEFAULT_RESOURCE_PATH) -> 'HeadlessSimulation':
+        # .pyxres ファイルからタイルマップを読み込んでヘッドレスシミュレーションを作る
+        # path: .pyxres ファイルのパス
+        return cls(TileGrid.from_resource(path))
+
+    def step_bits(self, bits: int) -> None:
+        # 入力ビットフィールドを設定して1フレーム進める
+        # bits: 今フレームの入力ビットフィールド（input_source参照）
+        self.scripted_input.set_bits(bits)
+        self.step()
+
+    def run(self, inputs: Iterable[int]) -> None:
+        # 入力ビットフィールドの列を順に与えて、その数だけフレームを進める
+        # inputs: 各フレームの入力ビットフィールド
+        for bits in inputs:
+            self.step_bits(bits)
+
+# ランダムに左右移動・ジャンプする入力列を作る（ベンチマーク・動作確認用。マップを進むよう右移動を多めにする）
+# frames: フレーム数
+# seed: 乱数シード
+def random_inputs(frames: int, seed: int) -> List[int]:
+    rng: random.Random = random.Random(seed)
+    inputs: List[int] = []
+    held: int = 0
+    for _ in range(frames):
+        if rng.random() < 0.1:
+            held = rng.choice([0, 1 << Key.LEFT, 1 << Key.RIGHT, 1 << Key.RIGHT]) | rng.choice([0, 1 << Key.DOWN]) \
+                | rng.choice([0, 1 << Key.SPACE])
+        pressed: int = held & ~(inputs[-1] if inputs else 0) & HELD_MASK
+        inputs.append(held | (pressed << PRESS_SHIFT))
+    return inputs
+
+# ヘッドレスでランダム入力を流し、1秒あたりのフレーム数を表示する
+def main() -> None:
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description="MoveRec headless simulation")
+    parser.add_argument("--resource", default=DEFAULT_RESOURCE_PATH, help=".pyxres file")
+    parser.add_argument("--frames", type=int, default=100000, help="number of frames to simulate")
+    parser.add_argument("--seed", type=int, default=0, help="random input seed")
+    args: argparse.Namespace = parser.parse_args()
+    simulation: HeadlessSimulation = HeadlessSimulation.from_resource(args.resource)
+    inputs: List[int] = random_inputs(args.frames, args.seed)
+    start: float = time.perf_counter()
+    simulation.run(inputs)
+    elapsed: float = time.perf_counter() - start
+    player: Player = simulation.player
+    print(f"frames={args.frames} time={elapsed:.3f}s fps={args.frames / elapsed:.0f}")
+    print(f"final x={player.x} y={player.y} dy={player.dy} jump_count={player.jump_count} "
+          f"scroll_x={simulation.camera_manager.scroll_x}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# coding: utf-8
+# コーディングルール:
+# - すべての変数・関数・戻り値に型アノテーションを必ず付与すること
+# - 定数宣言時は"HOGHOGE"のような文字列は使わない。必ず HOGEHOGE = 1 みたいに宣言する。たくさんある時は enum にする
+# - 1関数につき30行以内を目安に分割
+# - コメントは日本語で記述
+# - 関数宣言したら、関数の機能、引数がある時は引数名と、なんの値を受け取っているかをコメントで書く
+
+import numpy as np
+from tile_grid import TILE_SIZE
+
+# セルキーの構成: キー = セルX * KEY_STRIDE + (セルY + KEY_BIAS)
+# 同じ列のセルはキーが連続するので、列ごとに二分探索1回で縦方向の範囲を取り出せる
+KEY_STRIDE = 1 << 20  # 1列あたりのキー幅
+KEY_BIAS = 1 << 19    # 負のセルYを正にするためのずらし量
+
+# === 空間ハッシュ ===
+class SpatialHash:
+    # 座標をタイル単位のセルに分け、近くにある要素だけを取り出すための一様グリッド
+    # 毎フレーム rebuild で作り直し（配列演算でソートするだけ）、
+    # 問い合わせは範囲に掛かるセルの要素だけを調べるので、全要素数ではなく近くの要素数に比例する
+    def __init__(self, cell_size: int = TILE_SIZE):
+        # cell_size: 1セルの大きさ（ピクセル）
+        self.cell_size: int = cell_size
+        self.keys: np.ndarray = np.zeros(0, dtype=np.int64)      # セルキー（昇順）
+        self.indices: np.ndarray = np.zeros(0, dtype=np.intp)    # keysと同じ並びの要素の添字
+        self.x: np.ndarray = np.zeros(0, dtype=np.float64)       # keysと同じ並びのX座標
+        self.y: np.ndarray = np.zeros(0, dtype=np.float64)       # keysと同じ並びのY座標
+
+    def _cell(self, value: np.ndarray | float) -> np.ndarray | int:
+        # 座標をセル番号に変換する
+        # value: 座標（スカラーまたは配列）
+        return np.floor_divide(value, self.cell_size).astype(np.int64)
+
+    def rebuild(self, x: np.ndarray, y: np.ndarray, alive: np.ndarray) -> None:
+        # 要素の座標から空間ハッシュを作り直す
+        # x, y: 各要素の座標
+        # alive: 各要素の生存フラグ（Falseの要素は登録しない）
+        live: np.ndarray = np.flatnonzero(alive)
+        keys: np.ndarray = self._cell(x[live]) * KEY_STRIDE + self._cell(y[live]) + KEY_BIAS
+        order: np.ndarray = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.indices = live[order]
+        self.x = x[self.indices]
+        self.y = y[self.indices]
+
+    def _candidates(self, left: float, top: float, right: float, bottom: float) -> np.ndarray:
+        # 矩形に掛かるセルに入っている要素の、keys上の位置を返す
+        # left, top, right, bottom: 矩形の範囲（ピクセル）
+        columns: np.ndarray = np.arange(int(self._cell(left)), int(self._cell(right)) + 1, dtype=np.int64)
+        row_top: int = int(self._cell(top)) + KEY_BIAS
+        row_bottom: int = int(self._cell(bottom)) + KEY_BIAS
+        starts: np.ndarray = np.searchsorted(self.keys, columns * KEY_STRIDE + row_top, side="left")
+        ends: np.ndarray = np.searchsorted(self.keys, columns * KEY_STRIDE + row_bottom, side="right")
+        slots: list = [np.arange(start, end) for start, end in zip(starts.tolist(), ends.tolist()) if start < end]
+        return np.concatenate(slots) if slots else np.zeros(0, dtype=np.intp)
+
+    def query_aabb(self, center_x: float, center_y: float, half_width: float, half_height: float) -> np.ndarray:
+        # |x - center_x| < half_width かつ |y - center_y| < half_height の要素の添字を昇順で返す
+        # center_x, center_y: 矩形の中心
+        # half_width, half_height: 矩形の半分の幅と高さ
+        slots: np.ndarray = self._candidates(center_x - half_width, center_y - half_height,
+                                             center_x + half_width, center_y + half_height)
+        inside: np.ndarray = (np.abs(center_x - self.x[slots]) < half_width) & \
+            (np.abs(center_y - self.y[slots]) < half_height)
+        return np.sort(self.indices[slots[inside]])
+
+    def query_radius(self, center_x: float, center_y: float, radius: float) -> np.ndarray:
+        # 中心からの距離が radius 未満の要素の添字を昇順で返す
+        # center_x, center_y: 円の中心
+        # radius: 半径
+        slots: np.ndarray = self._candidates(center_x - radius, center_y - radius,
+                                             center_x + radius, center_y + radius)
+        dx: np.ndarray = center_x - self.x[slots]
+        dy: np.ndarray = center_y - self.y[slots]
+        inside: np.ndarray = dx * dx + dy * dy < radius * radius
+        return np.sort(self.indices[slots[inside]])
@@ -0,0 +1,267 @@
+# coding: utf-8
+# コーディングルール:
+# - すべての変数・関数・戻り値に型アノテーションを必ず付与すること
+# - 定数宣言時は"HOGHOGE"のような文字列は使わない。必ず HOGEHOGE = 1 みたいに宣言する。たくさんある時は enum にする
+# - 1関数につき30行以内を目安に分割
+# - コメントは日本語で記述
+# - 関数宣言したら、関数の機能、引数がある時は引数名と、なんの値を受け取っているかをコメントで書く
+
+# 毎フレームのPlayerの状態とスクロール量を列ごとに記録するテレメトリ（列指向のトレース）
+# 書き込み側は事前確保した型付き配列（array）の1ブロックに1フレーム1行ずつ値を入れるだけで、
+# ブロックが埋まったらバックグラウンドのスレッドに渡して列ごとのファイルの末尾にまとめて書き出す（App.update は待たない）。
+# 読み込み側は列ごとのファイルをメモリマップし、コピーせずにNumPy配列として返すので、百万フレームのトレースもすぐ開ける。
+#   python telemetry.py capture play.mvr trace.mvt        # 記録をヘッドレスで再生してトレースを書き出す
+#   python telemetry.py bench trace.mvt --frames 1000000  # ランダム入力で書き込みのコスト（1フレームあたり）を計測
+#   python telemetry.py summary trace.mvt                 # トレースを開いて各列の最小・最大・平均を表示
+#
+# トレースは1つのディレクトリ:
+#   meta: マジック"MVTL", 形式バージョン(u16), 列の数(u16), 1ブロックのフレーム数(u32)（リトルエンディアン）
+#   <列名>.bin: その列の値をフレーム順に並べただけのファイル（型は COLUMN_TYPES、ネイティブのバイト順）
+
+import argparse
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+import numpy as np
+from array import array
+from enum import IntEnum
+from typing import BinaryIO, Dict, List, Tuple
+from player import Player
+from simulation import HeadlessSimulation, random_inputs, DEFAULT_RESOURCE_PATH
+from recording import Recording
+from tile_grid import TileGrid
+
+TELEMETRY_MAGIC = b"MVTL"          # トレースのマジック
+TELEMETRY_FORMAT_VERSION = 1       # トレースの形式バージョン（列や型を変えたら上げる）
+META_FORMAT = "<4sHHI"
+META_NAME = "meta"                 # トレースのディレクトリ内のメタ情報ファイル名
+COLUMN_SUFFIX = ".bin"             # 列のファイル名の接尾辞
+BLOCK_FRAMES = 65536               # 1ブロック（まとめて書き出す単位）のフレーム数
+SPARE_BLOCKS = 2                   # 書き出し中にも記録を続けるため、最初から確保しておく予備のブロック数
+NS_PER_SECOND = 1_000_000_000
+NS_PER_US = 1000
+
+# 記録する列
+class Column(IntEnum):
+    FRAME = 0          # フレーム番号
+    X = 1              # Player.x
+    Y = 2              # Player.y
+    DX = 3             # Player.dx
+    DY = 4             # Player.dy
+    FLOOR_STATE = 5    # Player.floor_state（FloorStateの値）
+    IS_ON_GROUND = 6   # Player.is_on_ground（0 / 1）
+    COYOTE_TIMER = 7   # Player.coyote_timer
+    JUMP_COUNT = 8     # Player.jump_count
+    SCROLL_X = 9       # CameraManager.scroll_x
+
+# 列ごとの値の型（arrayの型コード。NumPyのdtypeにもそのまま使う）
+COLUMN_TYPES: Dict[Column, str] = {
+    Column.FRAME: "I", Column.X: "i", Column.Y: "i", Column.DX: "h", Column.DY: "h",
+    Column.FLOOR_STATE: "B", Column.IS_ON_GROUND: "B", Column.COYOTE_TIMER: "B", Column.JUMP_COUNT: "B",
+    Column.SCROLL_X: "i",
+}
+
+# 1ブロック分の列のバッファ（Column の順）
+Block = List[array]
+
+# トレースのディレクトリ内の列のファイルのパス
+# path: トレースのディレクトリ
+# column: 列
+def column_path(path: str, column: Column) -> str:
+    return os.path.join(path, column.name.lower() + COLUMN_SUFFIX)
+
+# 1ブロック分の列のバッファを確保する
+# frames: 1ブロックのフレーム数
+def allocate_block(frames: int) -> Block:
+    return [array(COLUMN_TYPES[column], bytes(array(COLUMN_TYPES[column]).itemsize * frames)) for column in Column]
+
+class TelemetryWriter:
+    # 毎フレームの状態を事前確保したブロックに書き込み、埋まったブロックをバックグラウンドのスレッドで書き出すクラス
+    # 書き出し中のブロックは予備のブロックと入れ替えるので、記録の呼び出しがディスクへの書き込みを待つことはない
+    def __init__(self, path: str, block_frames: int = BLOCK_FRAMES) -> None:
+        # path: 書き出すトレースのディレクトリ（無ければ作る。既存の列は上書き）
+        # block_frames: 1ブロックのフレーム数
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, META_NAME), "wb") as meta:
+            meta.write(struct.pack(META_FORMAT, TELEMETRY_MAGIC, TELEMETRY_FORMAT_VERSION, len(Column), block_frames))
+        self.files: List[BinaryIO] = [open(column_path(path, column), "wb") for column in Column]
+        self.block_frames: int = block_frames
+        self.block: Block = allocate_block(block_frames)
+        self.count: int = 0    # 現在のブロックに入っている行数
+        self.frames: int = 0   # これまでに記録したフレーム数
+        self.spare: queue.Queue[Block] = queue.Queue()
+        for _ in range(SPARE_BLOCKS):
+            self.spare.put(allocate_block(block_frames))
+        self.pending: queue.Queue[Tuple[Block, int] | None] = queue.Queue()
+        self.thread: threading.Thread = threading.Thread(target=self._run, name="telemetry-writer", daemon=True)
+        self.thread.start()
+
+    def record(self, frame: int, player: Player, scroll_x: int) -> None:
+        # 1フレーム分の状態を現在のブロックの次の行に入れる（ブロックが埋まったら書き出しに回す）
+        # frame: フレーム番号
+        # player: 記録するプレイヤー
+        # scroll_x: カメラのスクロール量
+        frames, x, y, dx, dy, floor_state, is_on_ground, coyote_timer, jump_count, scroll = self.block
+        row: int = self.count
+        frames[row] = frame
+        x[row] = player.x
+        y[row] = player.y
+        dx[row] = player.dx
+        dy[row] = player.dy
+        floor_state[row] = player.floor_state.value
+        is_on_ground[row] = player.is_on_ground
+        coyote_timer[row] = player.coyote_timer
+        jump_count[row] = player.jump_count
+        scroll[row] = scroll_x
+        self.count = row + 1
+        self.frames += 1
+        if self.count == self.block_frames:
+            self._submit()
+
+    def _submit(self) -> None:
+        # 現在のブロックを書き出しスレッドに渡し、予備のブロックに切り替える（予備が無ければ新しく確保する）
+        self.pending.put((self.block, self.count))
+        try:
+            self.block = self.spare.get_nowait()
+        except queue.Empty:
+            self.block = allocate_block(self.block_frames)
+        self.count = 0
+
+    def _run(self) -> None:
+        # 書き出しスレッドの本体。渡されたブロックの各列を列のファイルの末尾に書き、ブロックを予備に戻す
+        while True:
+            item: Tuple[Block, int] | None = self.pending.get()
+            if item is None:
+                return
+            block, count = item
+            for file, values in zip(self.files, block):
+                file.write(memoryview(values)[:count])
+            self.spare.put(block)
+
+    def close(self) -> None:
+        # 残りの行を書き出し、書き出しスレッドの終了を待ってファイルを閉じる（二重に呼んでもよい）
+        if not self.thread.is_alive():
+            return
+        if self.count:
+            self._submit()
+        self.pending.put(None)
+        self.thread.join()
+        for file in self.files:
+            file.close()
+
+class TelemetryReader:
+    # トレースの列のファイルをメモリマップし、列をコピーせずにNumPy配列として返すクラス
+    # （返した配列を使い終わる前に close しないこと）
+    def __init__(self, path: str) -> None:
+        # path: 読み込むトレースのディレクトリ
+        with open(os.path.join(path, META_NAME), "rb") as meta:
+            magic, version, column_count, block_frames = struct.unpack(META_FORMAT, meta.read())
+        if (magic, version, column_count) != (TELEMETRY_MAGIC, TELEMETRY_FORMAT_VERSION, len(Column)):
+            raise ValueError(f"not a telemetry trace (version {TELEMETRY_FORMAT_VERSION}): {path}")
+        self.block_frames: int = block_frames
+        self.maps: Dict[Column, mmap.mmap] = {}
+        sizes: List[int] = []
+        for column in Column:
+            with open(column_path(path, column), "rb") as file:
+                size: int = os.fstat(file.fileno()).st_size
+                if size:
+                    self.maps[column] = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            sizes.append(size // np.dtype(COLUMN_TYPES[column]).itemsize)
+        self.frames: int = min(sizes)  # 書き出し途中で終わったトレースは、全列がそろっているフレームまで
+
+    def column(self, column: Column) -> np.ndarray:
+        # 列の値をフレーム順に並べた読み取り専用の配列（メモリマップを直接参照する）
+        # column: 読み込む列
+        dtype: np.dtype = np.dtype(COLUMN_TYPES[column])
+        if column not in self.maps:
+            return np.zeros(0, dtype=dtype)
+        return np.frombuffer(self.maps[column], dtype=dtype, count=self.frames)
+
+    def columns(self) -> Dict[Column, np.ndarray]:
+        # すべての列の配列
+        return {column: self.column(column) for column in Column}
+
+    def close(self) -> None:
+        # メモリマップを閉じる
+        for data in self.maps.values():
+            data.close()
+        self.maps.clear()
+
+# 記録ファイルをヘッドレスで再生し、各フレームの状態をトレースに書き出す
+# args: コマンドライン引数
+def capture_command(args: argparse.Namespace) -> None:
+    recording: Recording = Recording.load(args.file)
+    simulation: HeadlessSimulation = HeadlessSimulation(TileGrid.from_resource(args.resource),
+                                                        recording.start_x, recording.start_y)
+    writer: TelemetryWriter = TelemetryWriter(args.trace)
+    for bits in recording.inputs:
+        simulation.step_bits(bits)
+        writer.record(simulation.frame_count, simulation.player, simulation.camera_manager.scroll_x)
+    writer.close()
+    print(f"wrote {writer.frames} frames to {args.trace}")
+
+# ランダム入力のシミュレーションを、記録なしと記録ありで流して1フレームあたりの記録のコストを表示する
+# args: コマンドライン引数
+def bench_command(args: argparse.Namespace) -> None:
+    grid: TileGrid = TileGrid.from_resource(args.resource)
+    inputs: List[int] = random_inputs(args.frames, args.seed)
+    simulation: HeadlessSimulation = HeadlessSimulation(grid)
+    start: int = time.perf_counter_ns()
+    simulation.run(inputs)
+    plain: int = time.perf_counter_ns() - start
+    simulation = HeadlessSimulation(grid)
+    start = time.perf_counter_ns()
+    writer: TelemetryWriter = TelemetryWriter(args.trace)
+    for bits in inputs:
+        simulation.step_bits(bits)
+        writer.record(simulation.frame_count, simulation.player, simulation.camera_manager.scroll_x)
+    recorded: int = time.perf_counter_ns() - start
+    writer.close()
+    closed: int = time.perf_counter_ns() - start
+    print(f"simulation only   {plain / args.frames:10.0f} ns/frame")
+    print(f"with telemetry    {recorded / args.frames:10.0f} ns/frame  "
+          f"(+{(recorded - plain) / args.frames:.0f} ns; final flush {(closed - recorded) / NS_PER_SECOND * 1000:.1f} ms)")
+
+# 各列の最小・最大・平均を表示する（列の配列はこの関数の中だけで使う）
+# reader: 開いたトレース
+def print_columns(reader: TelemetryReader) -> None:
+    for column, values in reader.columns().items():
+        if len(values):
+            print(f"{column.name.lower():14s} min={values.min():8d} max={values.max():8d} mean={values.mean():12.3f}")
+
+# トレースを開き、開くのにかかった時間と各列の最小・最大・平均を表示する
+# args: コマンドライン引数
+def summary_command(args: argparse.Namespace) -> None:
+    start: int = time.perf_counter_ns()
+    reader: TelemetryReader = TelemetryReader(args.trace)
+    reader.columns()
+    opened: float = (time.perf_counter_ns() - start) / NS_PER_US
+    print(f"{reader.frames} frames, opened in {opened:.0f} us")
+    print_columns(reader)
+    reader.close()
+
+# テレメトリのコマンドライン: capture（記録→トレース）/ bench（記録のコスト）/ summary（トレースの集計）
+def main() -> None:
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description="columnar per-frame telemetry")
+    parser.add_argument("--resource", default=DEFAULT_RESOURCE_PATH, help=".pyxres file")
+    commands: argparse._SubParsersAction = parser.add_subparsers(dest="command", required=True)
+    capture_parser: argparse.ArgumentParser = commands.add_parser("capture", help="replay a recording into a trace")
+    capture_parser.add_argument("file")
+    capture_parser.add_argument("trace")
+    capture_parser.set_defaults(handler=capture_command)
+    bench_parser: argparse.ArgumentParser = commands.add_parser("bench", help="measure the per-frame cost")
+    bench_parser.add_argument("trace")
+    bench_parser.add_argument("--frames", type=int, default=1_000_000)
+    bench_parser.add_argument("--seed", type=int, default=0)
+    bench_parser.set_defaults(handler=bench_command)
+    summary_parser: argparse.ArgumentParser = commands.add_parser("summary", help="open a trace and summarize it")
+    summary_parser.add_argument("trace")
+    summary_parser.set_defaults(handler=summary_command)
+    args: argparse.Namespace = parser.parse_args()
+    args.handler(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,379 @@
+# coding: utf-8
+# コーディングルール:
+# - すべての変数・関数・戻り値に型アノテーションを必ず付与すること
+# - 定数宣言時は"HOGHOGE"のような文字列は使わない。必ず HOGEHOGE = 1 みたいに宣言する。たくさんある時は enum にする
+# - 1関数につき30行以内を目安に分割
+# - コメントは日本語で記述
+# - 関数宣言したら、関数の機能、引数がある時は引数名と、なんの値を受け取っているかをコメントで書く
+
+import bisect
+import math
+import pyxel
+import tomllib
+import zipfile
+from typing import Callable, Tuple, List
+from enum import IntEnum
+
+# === 定数 ===
+TILE_SIZE = 8          # タイル1枚の大きさ（ピクセル）
+WALL_TILE_X = 4        # 壁タイルとして扱うタイル画像のu座標の最小値
+TILE_FLOOR = (1, 0)    # ジャンプで通り抜けられる床のイメージ座標
+TILE_SPAWN1 = (0, 1)   # 敵1の出現位置を示すタイル
+TILE_SPAWN2 = (1, 1)   # 敵2の出現位置を示すタイル
+TILE_SPAWN3 = (2, 1)   # 敵3の出現位置を示すタイル
+
+# リソースファイル(.pyxres)関連定数
+RESOURCE_TOML_NAME = "pyxel_resource.toml"  # .pyxres(zip)内のリソース本体のファイル名
+RESOURCE_FORMAT_VERSION = 4                 # 読み込みに対応しているリソース形式のバージョン
+
+# タイル種別（bytearrayに格納するためIntEnum化）
+class TileKind(IntEnum):
+    EMPTY = 0          # 何もない（通過可能）
+    WALL = 1           # 壁・床（u >= WALL_TILE_X）
+    THROUGH_FLOOR = 2  # すり抜け床（TILE_FLOOR）
+    SPAWN1 = 3         # 敵1の出現位置
+    SPAWN2 = 4         # 敵2の出現位置
+    SPAWN3 = 5         # 敵3の出現位置
+
+# タイル画像座標からタイル種別への対応表（壁以外の特殊タイル）
+SPECIAL_TILE_KINDS = {
+    TILE_FLOOR: TileKind.THROUGH_FLOOR,
+    TILE_SPAWN1: TileKind.SPAWN1,
+    TILE_SPAWN2: TileKind.SPAWN2,
+    TILE_SPAWN3: TileKind.SPAWN3,
+}
+
+# === リソースファイルの読み込み ===
+def load_resource_tiles(path: str, tilemap_index: int) -> Tuple[int, int, List[List[int]]]:
+    # pyxel.init / pyxel.load を使わずに、.pyxres からタイルマップのデータを読み込む
+    # path: .pyxres ファイルのパス
+    # tilemap_index: 読み込むタイルマップ番号
+    # 戻り値: (幅, 高さ, 各行の[u0, v0, u1, v1, ...]リスト)
+    with zipfile.ZipFile(path) as archive:
+        resource: dict = tomllib.loads(archive.read(RESOURCE_TOML_NAME).decode("utf-8"))
+    if resource.get("format_version") != RESOURCE_FORMAT_VERSION:
+        raise ValueError(f"unsupported resource format: {resource.get('format_version')}")
+    tilemap: dict = resource["tilemaps"][tilemap_index]
+    width: int = tilemap["width"]
+    height: int = tilemap["height"]
+    return width, height, _expand_rows(tilemap["data"], width * 2, height)
+
+def _expand_rows(rows: List[List[int]], row_length: int, height: int) -> List[List[int]]:
+    # .pyxres は各行の末尾の同じ値の繰り返しと、末尾の同じ行の繰り返しを省略して保存している。
+    # 省略された部分を最後の値・最後の行で埋め戻す
+    # rows: 保存されている行データ
+    # row_length: 1行の要素数
+    # height: 行数
+    expanded: List[List[int]] = []
+    for row in rows[:height]:
+        fill: int = row[-1] if row else 0
+        expanded.append(row + [fill] * (row_length - len(row)))
+    last_row: List[int] = expanded[-1] if expanded else [0] * row_length
+    while len(expanded) < height:
+        expanded.append(last_row)
+    return expanded
+
+# レイキャストの1軸分の初期値 (開始タイル, 進む向き, 最初のタイル境界までのt, 1タイル進むごとのt) を返す
+# start: 始点の座標（ピクセル単位）
+# delta: 線分のその軸方向の長さ（0なら境界に達しない）
+def ray_axis(start: float, delta: float) -> Tuple[int, int, float, float]:
+    tile: int = math.floor(start / TILE_SIZE)
+    if delta > 0:
+        return tile, 1, ((tile + 1) * TILE_SIZE - start) / delta, TILE_SIZE / delta
+    if delta < 0:
+        return tile, -1, (tile * TILE_SIZE - start) / delta, -TILE_SIZE / delta
+    return tile, 0, math.inf, math.inf
+
+# === 衝突判定用タイルインデックス ===
+class TileGrid:
+    # タイルマップの各タイルを種別(TileKind)に分類して1次元のbytearrayに保持するクラス
+    # pyxel.load 後に一度だけ構築し、以降の衝突判定はpyxelを呼ばずに配列参照だけで行う
+    def __init__(self, width: int, height: int, cells: bytearray):
+        # width: タイルマップの幅（タイル単位）
+        # height: タイルマップの高さ（タイル単位）
+        # cells: width * height 要素のタイル種別配列（行優先）
+        self.width: int = width
+        self.height: int = height
+        self.cells: bytearray = cells
+
+    @staticmethod
+    def classify(tile: Tuple[int, int]) -> TileKind:
+        # タイル画像座標(u, v)をタイル種別に分類する
+        # tile: タイルマップから取得した(u, v)座標
+        if tile[0] >= WALL_TILE_X:
+            return TileKind.WALL
+        return SPECIAL_TILE_KINDS.get(tile, TileKind.EMPTY)
+
+    @classmethod
+    def from_tilemap(cls, tilemap: pyxel.Tilemap) -> 'TileGrid':
+        # pyxelのタイルマップ全体を走査してTileGridを構築する
+        # tilemap: 分類対象のタイルマップ（pyxel.tilemap(0) など）
+        width: int = tilemap.width
+        height: int = tilemap.height
+        cells: bytearray = bytearray(width * height)
+        for tile_y in range(height):
+            row: int = tile_y * width
+            for tile_x in range(width):
+                cells[row + tile_x] = cls.classify(tilemap.pget(tile_x, tile_y))
+        return cls(width, height, cells)
+
+    @classmethod
+    def from_resource(cls, path: str, tilemap_index: int = 0) -> 'TileGrid':
+        # pyxel.init なしで .pyxres ファイルから直接TileGridを構築する（ヘッドレス実行用）
+        # path: .pyxres ファイルのパス
+        # tilemap_index: 分類対象のタイルマップ番号
+        width: int
+        height: int
+        rows: List[List[int]]
+        width, height, rows = load_resource_tiles(path, tilemap_index)
+        cells: bytearray = bytearray(width * height)
+        for tile_y, row in enumerate(rows):
+            base: int = tile_y * width
+            for tile_x in range(width):
+                cells[base + tile_x] = cls.classify((row[tile_x * 2], row[tile_x * 2 + 1]))
+        return cls(width, height, cells)
+
+    def kind(self, tile_x: int, tile_y: int) -> int:
+        # 指定タイル座標の種別を返す。範囲外はEMPTY（pyxelのpgetが範囲外で(0, 0)を返すのと同じ扱い）
+        # tile_x: タイルマップ上のX座標（タイル単位）
+        # tile_y: タイルマップ上のY座標（タイル単位）
+        if 0 <= tile_x < self.width and 0 <= tile_y < self.height:
+            return self.cells[tile_y * self.width + tile_x]
+        return TileKind.EMPTY
+
+    def is_wall(self, tile_x: int, tile_y: int) -> bool:
+        # 指定タイル座標が壁タイルかどうかを返す
+        # tile_x: タイルマップ上のX座標（タイル単位）
+        # tile_y: タイルマップ上のY座標（タイル単位）
+        return self.kind(tile_x, tile_y) == TileKind.WALL
+
+    def set_kind(self, tile_x: int, tile_y: int, kind: TileKind) -> int:
+        # 指定タイル座標の種別を書き換え、書き換え前の種別を返す（範囲外は何もせずEMPTYを返す）
+        # tile_x: タイルマップ上のX座標（タイル単位）
+        # tile_y: タイルマップ上のY座標（タイル単位）
+        # kind: 新しい種別
+        if not (0 <= tile_x < self.width and 0 <= tile_y < self.height):
+            return TileKind.EMPTY
+        index: int = tile_y * self.width + tile_x
+        old_kind: int = self.cells[index]
+        self.cells[index] = kind
+        return old_kind
+
+    # === レイキャスト ===
+    # 線分が通過するタイルだけを順に調べる Amanatides–Woo 方式のDDA。壁(WALL)だけを遮蔽物とみなす
+
+    def raycast(self, x0: float, y0: float, x1: float, y1: float) -> float:
+        # (x0, y0) から (x1, y1) への線分が最初に壁タイルに入る位置の割合 t（0.0〜1.0）を返す
+        # 壁に当たらなければ1.0。始点が壁の中なら0.0。当たった座標は (x0 + (x1 - x0) * t, y0 + (y1 - y0) * t)
+        # x0, y0: 始点（ピクセル単位）
+        # x1, y1: 終点（ピクセル単位）
+        tile_x, step_x, t_max_x, t_delta_x = ray_axis(x0, x1 - x0)
+        tile_y, step_y, t_max_y, t_delta_y = ray_axis(y0, y1 - y0)
+        end_x: int = math.floor(x1 / TILE_SIZE)
+        end_y: int = math.floor(y1 / TILE_SIZE)
+        t: float = 0.0
+        while t <= 1.0:
+            if self.kind(tile_x, tile_y) == TileKind.WALL:
+                return t
+            if tile_x == end_x and tile_y == end_y:
+                break
+            if t_max_x < t_max_y:
+                tile_x, t = tile_x + step_x, t_max_x
+                t_max_x += t_delta_x
+            else:
+                tile_y, t = tile_y + step_y, t_max_y
+                t_max_y += t_delta_y
+        return 1.0
+
+    def line_of_sight(self, x0: float, y0: float, x1: float, y1: float) -> bool:
+        # 2点の間に壁タイルがないか
+        # x0, y0, x1, y1: 2点の座標（ピクセル単位）
+        return self.raycast(x0, y0, x1, y1) >= 1.0
+
+    # === 掃引（スイープ）による移動解決 ===
+    # 1ピクセルずつ detect_collision を繰り返す押し戻し処理と完全に同じ結果を、
+    # 移動で通過するタイル列・タイル行を一度ずつ調べるだけで求める。
+    # 当たり判定の範囲は、X方向が (x + hit_left) 〜 (x + hit_right)、Y方向が y 〜 y + TILE_SIZE - 1。
+    # すり抜け床は「下方向へ移動中 かつ y % TILE_SIZE == 1 の位置で、1つ下の行が床」のときだけ衝突する。
+
+    def sweep_x(self, x: int, y: int, dx: int, y_vector: int, hit_left: int, hit_right: int) -> int:
+        # X方向にdxだけ移動させ、最初に衝突する直前のX座標を返す
+        # x, y: 移動前の左上座標（ピクセル単位）
+        # dx: X方向の移動量
+        # y_vector: Y方向の移動量（すり抜け床の判定に使用）
+        # hit_left, hit_right: 当たり判定の左端・右端のxからのオフセット
+        if dx == 0:
+            return x
+        row_top: int = y // TILE_SIZE
+        row_bottom: int = (y + TILE_SIZE - 1) // TILE_SIZE
+        floor_row: int = row_top + 1 if y_vector > 0 and y % TILE_SIZE == 1 else -1
+        if dx > 0:
+            first: int = x + 1
+            last: int = x + dx
+            for column in range((first + hit_left) // TILE_SIZE, (last + hit_right) // TILE_SIZE + 1):
+                if self._column_blocked(column, row_top, row_bottom, floor_row):
+                    return max(first, column * TILE_SIZE - hit_right) - 1
+            return last
+        first = x - 1
+        last = x + dx
+        for column in range((first + hit_right) // TILE_SIZE, (last + hit_left) // TILE_SIZE - 1, -1):
+            if self._column_blocked(column, row_top, row_bottom, floor_row):
+                return min(first, column * TILE_SIZE + TILE_SIZE - 1 - hit_left) + 1
+        return last
+
+    def sweep_y(self, x: int, y: int, dy: int, hit_left: int, hit_right: int) -> int:
+        # Y方向にdyだけ移動させ、最初に衝突する直前のY座標を返す
+        # x, y: 移動前の左上座標（ピクセル単位）
+        # dy: Y方向の移動量（正なら下方向。下方向のときだけすり抜け床に乗る）
+        # hit_left, hit_right: 当たり判定の左端・右端のxからのオフセット
+        if dy == 0:
+            return y
+        column_left: int = (x + hit_left) // TILE_SIZE
+        column_right: int = (x + hit_right) // TILE_SIZE
+        if dy > 0:
+            first: int = y + 1
+            last: int = y + dy
+            for row in range(first // TILE_SIZE, (last + TILE_SIZE - 1) // TILE_SIZE + 1):
+                top: int = row * TILE_SIZE - (TILE_SIZE - 1)  # この行に重なり始めるY座標
+                if self._row_has(row, column_left, column_right, TileKind.WALL):
+                    return max(first, top) - 1
+                if top >= first and self._row_has(row, column_left, column_right, TileKind.THROUGH_FLOOR):
+                    return top - 1
+            return last
+        first = y - 1
+        last = y + dy
+        for row in range((first + TILE_SIZE - 1) // TILE_SIZE, last // TILE_SIZE - 1, -1):
+            if self._row_has(row, column_left, column_right, TileKind.WALL):
+                return min(first, row * TILE_SIZE + TILE_SIZE - 1) + 1
+        return last
+
+    def _column_blocked(self, column: int, row_top: int, row_bottom: int, floor_row: int) -> bool:
+        # タイル列columnが、行row_top〜row_bottomの壁、またはfloor_row行のすり抜け床で塞がれているか
+        # floor_row: すり抜け床を判定する行（判定しない場合は-1。負の行は範囲外で床にならないので同じ扱い）
+        for row in range(row_top, row_bottom + 1):
+            if self.kind(column, row) == TileKind.WALL:
+                return True
+        return floor_row >= 0 and self.kind(column, floor_row) == TileKind.THROUGH_FLOOR
+
+    def _row_has(self, row: int, column_left: int, column_right: int, kind: TileKind) -> bool:
+        # タイル行rowの列column_left〜column_rightに、指定種別kindのタイルがあるか
+        for column in range(column_left, column_right + 1):
+            if self.kind(column, row) == kind:
+                return True
+        return False
+
+# 出現位置1つ分の情報 (種別, X座標, Y座標)。座標はピクセル単位
+SpawnPoint = Tuple[TileKind, int, int]
+
+# タイルマップ上の敵の出現タイル(SPAWN1〜3)を、X座標→Y座標の順に集める
+# grid: 出現タイルを探すタイルインデックス
+# rows: 上から何行分を対象にするか（タイル単位）
+def collect_spawn_points(grid: TileGrid, rows: int) -> List[SpawnPoint]:
+    points: List[SpawnPoint] = []
+    for tile_x in range(grid.width):
+        for tile_y in range(min(rows, grid.height)):
+            kind: int = grid.kind(tile_x, tile_y)
+            if kind in (TileKind.SPAWN1, TileKind.SPAWN2, TileKind.SPAWN3):
+                points.append((TileKind(kind), tile_x * TILE_SIZE, tile_y * TILE_SIZE))
+    return points
+
+# === 敵の出現位置インデックス ===
+class SpawnIndex:
+    # タイルマップ上の敵の出現タイル(SPAWN1〜3)をロード時に一度だけ集め、X座標順に並べて保持するクラス
+    # スクロールで新しく見えた範囲の出現位置を二分探索で取り出し、出現済みかどうかも記録する
+    def __init__(self, grid: TileGrid, rows: int, points: List[SpawnPoint] | None = None):
+        # grid: 出現タイルを探すタイルインデックス
+        # rows: 上から何行分を対象にするか（タイル単位）
+        # points: 集め済みの出現位置（X座標→Y座標順。level_cache のキャッシュから渡す。Noneならgridを走査する）
+        self.rows: int = rows
+        if points is None:
+            points = collect_spawn_points(grid, rows)
+        self.points: List[SpawnPoint] = [point for point in points if point[2] < rows * TILE_SIZE]
+        self.xs: List[int] = [point[1] for point in self.points]  # 二分探索用のX座標列（昇順）
+        self.fired: bytearray = bytearray(len(self.points))       # 出現済みなら1
+
+    def take(self, left_x: int, right_x: int) -> List[SpawnPoint]:
+        # X座標が left_x〜right_x（ピクセル、両端を含む）でまだ出現していない出現位置を、
+        # X座標→Y座標の順に返し、出現済みにする
+        # left_x, right_x: 対象範囲の左端と右端
+        first: int = bisect.bisect_left(self.xs, left_x)
+        last: int = bisect.bisect_right(self.xs, right_x)
+        taken: List[SpawnPoint] = []
+        for index in range(first, last):
+            if not self.fired[index]:
+                self.fired[index] = 1
+                taken.append(self.points[index])
+        return taken
+
+    def restore(self, point: SpawnPoint) -> None:
+        # take で取り出した出現位置を未出現に戻す（敵を生成できなかったときなど）
+        # point: take で返された出現位置
+        index: int = self._position(point[1], point[2])
+        if index < len(self.points) and self.points[index] == point:
+            self.fired[index] = 0
+
+    def update_tile(self, tile_x: int, tile_y: int, kind: int) -> None:
+        # タイルの書き換えに合わせて、その位置の出現位置だけを削除・追加する（全体の再走査はしない）
+        # 追加した出現位置は未出現として扱う
+        # tile_x, tile_y: 書き換えたタイル座標（タイル単位）
+        # kind: 書き換え後のタイル種別
+        x: int = tile_x * TILE_SIZE
+        y: int = tile_y * TILE_SIZE
+        index: int = self._position(x, y)
+        if index < len(self.points) and self.points[index][1:] == (x, y):
+            del self.points[index], self.xs[index], self.fired[index]
+        if kind in (TileKind.SPAWN1, TileKind.SPAWN2, TileKind.SPAWN3) and 0 <= tile_y < self.rows:
+            self.points.insert(index, (TileKind(kind), x, y))
+            self.xs.insert(index, x)
+            self.fired.insert(index, 0)
+
+    def _position(self, x: int, y: int) -> int:
+        # X座標→Y座標の順で (x, y) が入る位置を返す
+        # x, y: 出現位置の座標（ピクセル単位）
+        index: int = bisect.bisect_left(self.xs, x)
+        while index < len(self.points) and self.points[index][1] == x and self.points[index][2] < y:
+            index += 1
+        return index
+
+    def reset(self) -> None:
+        # すべての出現位置を未出現に戻す（ゲームオーバー時など。再走査はしない）
+        self.fired[:] = bytes(len(self.fired))
+
+# タイルが書き換えられたときに呼ばれる関数の型 (tile_x, tile_y, 書き換え前の種別, 書き換え後の種別)
+TileListener = Callable[[int, int, int, int], None]
+
+# === 実行中のタイル書き換え ===
+class TileEditor:
+    # 壊せるブロックや切り替え式のすり抜け床のために、実行中にタイルを書き換えるクラス
+    # pyxelのタイルマップに書き込み、TileGridの該当セルと出現位置インデックスの該当エントリだけを更新する
+    # （1回の書き換えで全体を作り直さない）。ほかのキャッシュは add_listener で変更を受け取れる
+    def __init__(self, grid: TileGrid, tilemap: pyxel.Tilemap | None = None, spawn_index: SpawnIndex | None = None):
+        # grid: 更新する衝突判定用タイルインデックス
+        # tilemap: 描画に使うpyxelのタイルマップ（ヘッドレス実行ではNone）
+        # spawn_index: 更新する出現位置インデックス（使わないならNone）
+        self.grid: TileGrid = grid
+        self.tilemap: pyxel.Tilemap | None = tilemap
+        self.spawn_index: SpawnIndex | None = spawn_index
+        self.listeners: List[TileListener] = []
+
+    def add_listener(self, listener: TileListener) -> None:
+        # タイルの種別が変わったときに呼ぶ関数を登録する
+        # listener: (tile_x, tile_y, 書き換え前の種別, 書き換え後の種別) を受け取る関数
+        self.listeners.append(listener)
+
+    def set_tile(self, tile_x: int, tile_y: int, tile: Tuple[int, int]) -> None:
+        # タイルを書き換える。種別が変わったときだけ出現位置インデックスと登録された関数に知らせる
+        # tile_x, tile_y: 書き換えるタイル座標（タイル単位）
+        # tile: 新しいタイル画像座標(u, v)
+        if not (0 <= tile_x < self.grid.width and 0 <= tile_y < self.grid.height):
+            return
+        if self.tilemap is not None:
+            self.tilemap.pset(tile_x, tile_y, tile)
+        kind: TileKind = TileGrid.classify(tile)
+        old_kind: int = self.grid.set_kind(tile_x, tile_y, kind)
+        if old_kind == kind:
+            return
+        if self.spawn_index is not None:
+            self.spawn_index.update_tile(tile_x, tile_y, kind)
+        for listener in self.listeners:
+            listener(tile_x, tile_y, old_kind, kind)
@@ -0,0 +1,44 @@
+# coding: utf-8
+# コーディングルール:
+# - すべての変数・関数・戻り値に型アノテーションを必ず付与すること
+# - 定数宣言時は"HOGHOGE"のような文字列は使わない。必ず HOGEHOGE = 1 みたいに宣言する。たくさんある時は enum にする
+# - 1関数につき30行以内を目安に分割
+# - コメントは日本語で記述
+# - 関数宣言したら、関数の機能、引数がある時は引数名と、なんの値を受け取っているかをコメントで書く
+
+MAX_STEPS_PER_FRAME = 5  # 1回の描画フレームで進めるシミュレーションステップ数の上限
+SNAP_RATIO = 0.1         # 経過時間がステップ間隔の整数倍からこの割合以内なら、ちょうど整数倍とみなす
+
+# === 固定タイムステップ ===
+class FixedTimestep:
+    # 経過時間を蓄積（アキュムレータ）し、固定間隔のシミュレーションステップを何回進めるかを決めるクラス
+    # 描画が遅れて時間が空いても、上限までまとめてステップを進めて実時間に追いつく
+    def __init__(self, rate: int, max_steps: int = MAX_STEPS_PER_FRAME):
+        # rate: 1秒あたりのシミュレーションステップ数
+        # max_steps: 1回の advance で返すステップ数の上限
+        self.step_seconds: float = 1.0 / rate
+        self.max_steps: int = max_steps
+        self.accumulator: float = 0.0       # まだステップに消費していない経過時間（秒）
+        self.last_time: float | None = None  # 前回 advance を呼んだ時刻（秒）
+
+    def advance(self, now: float) -> int:
+        # 現在時刻までの経過時間を蓄積し、今回進めるステップ数を返す（初回は1ステップ分とみなす）
+        # 上限に達した場合、残りの遅れは捨てる（遅れが際限なく溜まるのを防ぐ）
+        # now: 現在時刻（秒、time.perf_counter など単調増加する時計）
+        elapsed: float = self.step_seconds if self.last_time is None else now - self.last_time
+        self.last_time = now
+        self.accumulator += self._snap(elapsed)
+        steps: int = min(int(self.accumulator / self.step_seconds), self.max_steps)
+        self.accumulator -= steps * self.step_seconds
+        if steps == self.max_steps:
+            self.accumulator = min(self.accumulator, self.step_seconds)
+        return steps
+
+    def _snap(self, elapsed: float) -> float:
+        # 経過時間がステップ間隔の整数倍に十分近ければ整数倍に丸める
+        # （描画とシミュレーションが同じ周期のとき、タイマーの揺れで0回・2回のステップが交互に出ないようにする）
+        # elapsed: 前回からの経過時間（秒）
+        multiple: int = round(elapsed / self.step_seconds)
+        if multiple > 0 and abs(elapsed - multiple * self.step_seconds) < self.step_seconds * SNAP_RATIO:
+            return multiple * self.step_seconds
+        return elapsed